@@ -1,14 +1,14 @@
 #!/usr/bin/env python3
 
-import plotly.io as pio
+from pandas import DataFrame
 
 from src.account.wallet import Wallet
-from src.db.db_utility import establish_connection_mariadb
+from src.db.db_utility import establish_connection
+from src.frontend.pattern_arrays import PatternResults
+from src.simulate.backtest import BTConfig
 from src.utils.backtest_utils import setup_parameters, setup_parameters_inheritance
-from src.frontend.visualization import build_and_create_plot
 from src.utils.utils import time_execution
-
-pio.renderers.default = "chromium"
+from src.utils.memory_utils import MemoryTracker
 
 # Insert config path here:
 CONFIG_PATH = ''
@@ -23,11 +23,14 @@ def main() -> None:
     """
     # Setup configuration for back testing
     config = setup_parameters("../../config/backtest.yaml")
+    memory = MemoryTracker.from_config(config.return_value('memory'))
+    memory.start()
 
     # Setup database information and connect. Get sample data for a single pair from the database
-    db_conn = establish_connection_mariadb(config.return_value('db_path'), database=DATABASE)
+    db_conn = establish_connection(config.return_value('db_path'), database=DATABASE)
     conf = config.return_value('backtest')
     df = db_conn.get_bt_data(conf.get('start_date'), conf.get('end_date'), conf.get('pairs')[0])
+    memory.checkpoint('main:load', len(df), data=df)
 
     # Set up account for backtesting a strategy
     account = Wallet(conf.get('start_capital'), conf.get('currency'), conf.get('commission'))
@@ -38,14 +41,39 @@ def main() -> None:
     #
     # Execute backtest
     backtest = setup_parameters_inheritance("../../config/backtest.yaml", df)
-    backtest.execute()
-
-    # Construct candlestick graph with comprehensive hover text
-    fig = build_and_create_plot(df=df, pattern=backtest.patterns)
+    backtest.execute(memory=memory)
 
-    # Show generated plot
+    # Construct and show the candlestick graph with comprehensive hover text. Plotly is only imported
+    # when the graph is shown, which keeps headless runs fast to start
     if config.return_value('show_output'):
-        fig.show()
+        import plotly.io as pio
+        from src.frontend.visualization import show_plot
+
+        pio.renderers.default = "chromium"
+        show_plot(plot_results(config, df, backtest.results, memory))
+    memory.print_report()
+
+
+def plot_results(config: BTConfig, df: DataFrame, results: PatternResults, memory: MemoryTracker) -> 'go.Figure':
+    """
+    Builds the candlestick graph of a backtest as configured and records its memory checkpoint.
+    :param config: The backtest configuration.
+    :param df: The data of the backtest.
+    :param results: The results of the backtest.
+    :param memory: The memory tracker.
+    :return: The Plotly Figure.
+    """
+    from src.frontend.visualization import build_and_create_plot
+
+    fig = build_and_create_plot(df=df, pattern=results,
+                                compact=bool(config.return_value('compact_hover')),
+                                target_candles=config.return_value('target_candles'),
+                                overlays=bool(config.return_value('overlays')))
+    # Compact traces carry their hover codes in customdata, the others the formatted text
+    candles = fig.data[0]
+    memory.checkpoint('main:plot', len(df), data=df,
+                      hover=candles.customdata if candles.customdata is not None else candles.text)
+    return fig
 
 
 if __name__ == '__main__':
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Command line entry point for headless runs, e.g. from cron.
+    python -m src.cli backtest --config config/backtest.yaml --pairs EURUSD USDJPY --time-frames 15min 1h
+                               --range 20220101:20220131 --out results
+    python -m src.cli ingest source/source=lw-go-events
+    python -m src.cli fetch --database intraday
+    python -m src.cli report --config config/backtest.yaml --out reports
+The heavy modules of every subcommand are imported when it runs, and backtest does not load plotly.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List
+
+import yaml
+
+from src.utils.backtest_utils import BacktestJob
+
+
+def parse_range(value: str) -> tuple:
+    """
+    Parses a date range of the form START:END.
+    :param value: The range, e.g. 20220101:20220131.
+    :return: The start and end date.
+    """
+    start, sep, end = value.partition(':')
+    if not sep or not start or not end:
+        raise argparse.ArgumentTypeError(f"Expected a date range START:END, got '{value}'")
+    return start, end
+
+
+def build_jobs(bt_params: dict, args: argparse.Namespace) -> List[BacktestJob]:
+    """
+    Builds one job for every combination of pair, time frame and date range.
+    Pairs and date ranges default to the backtest section of the config.
+    :param bt_params: The backtest configuration.
+    :param args: The parsed arguments.
+    :return: The jobs.
+    """
+    pairs = args.pairs or bt_params['backtest']['pairs']
+    ranges = args.range or [(None, None)]
+    return [BacktestJob(pair, time_frame, start, end)
+            for pair in pairs for time_frame in args.time_frames or [None] for start, end in ranges]
+
+
+def run_backtest_job(bt_params: dict, job: BacktestJob, out_dir: str, database: str = '') -> dict:
+    """
+    Runs the backtest and the strategy of one job and writes bars.parquet with the per-bar patterns and
+    trades.parquet to <out_dir>/<job name>.
+    :param bt_params: The backtest configuration.
+    :param job: The job.
+    :param out_dir: The output directory.
+    :param database: The name of the database.
+    :return: The metrics of the job.
+    """
+    import pandas as pd
+
+    from src.patterns.pattern import Pattern
+    from src.simulate.backtest import StartBT
+    from src.simulate.result_cache import ResultCache
+    from src.simulate.strategy import PatternStrategy, trade_metrics
+    from src.utils.backtest_utils import job_parameters, load_job_data
+
+    start = time.perf_counter()
+    params = job_parameters(bt_params, job)
+    conf = params['backtest']
+    metrics = {'job': job.name, 'pair': job.pair, 'time_frame': job.time_frame or '',
+               'start_date': conf['start_date'], 'end_date': conf['end_date']}
+    try:
+        data = load_job_data(params, job, database).reset_index(drop=True)
+        # Pool workers are reused across jobs, so the detections of the previous job must go first
+        Pattern.reset()
+        backtest = StartBT(params, data)
+        backtest.execute()
+        patterns = backtest.results.patterns
+        strategy = PatternStrategy.from_config(params)
+
+        # The trade stage is cached on its own, so a new strategy reuses the cached patterns
+        cache = ResultCache.from_config(params.get('cache'))
+        trade_key = cache.trade_key(backtest.cache_key, [strategy.to_dict(), conf['start_capital']]) if cache else None
+        cached = cache.load_trades(trade_key) if cache else None
+        if cached is not None:
+            trades, trade_stats = cached
+        else:
+            trades = strategy.trades(data, patterns)
+            trade_stats = trade_metrics(trades, float(conf['start_capital']))
+            if cache is not None:
+                cache.store_trades(trade_key, trades, trade_stats)
+
+        job_dir = Path(out_dir) / job.name
+        job_dir.mkdir(parents=True, exist_ok=True)
+        bars = pd.concat([data[['DT', 'OPEN', 'HIGH', 'LOW', 'CLOSE', 'VOL']], patterns.set_axis(data.index)], axis=1)
+        bars.to_parquet(job_dir / 'bars.parquet', index=False)
+        trades.to_parquet(job_dir / 'trades.parquet', index=False)
+        metrics.update(bars=len(data), **trade_stats, error='')
+    except Exception as e:
+        metrics.update(bars=0, error=f"{type(e).__name__}: {e}")
+    metrics['seconds'] = time.perf_counter() - start
+    return metrics
+
+
+def backtest(args: argparse.Namespace) -> None:
+    """
+    Runs the backtest jobs in a process pool and writes metrics.parquet with one row per job.
+    """
+    import pandas as pd
+
+    bt_params = load_config(args.config)
+    jobs = build_jobs(bt_params, args)
+    Path(args.out).mkdir(parents=True, exist_ok=True)
+    start, rows = time.perf_counter(), []
+    with ProcessPoolExecutor(max_workers=args.processes) as pool:
+        futures = [pool.submit(run_backtest_job, bt_params, job, args.out, args.database) for job in jobs]
+        for future in as_completed(futures):
+            metrics = future.result()
+            rows.append(metrics)
+            if metrics['error']:
+                print(f"Backtest {metrics['job']} failed after {metrics['seconds']:.2f}s: {metrics['error']}")
+            else:
+                print(f"Backtest {metrics['job']}: {metrics['bars']} bars, {metrics['trades']} trades "
+                      f"in {metrics['seconds']:.2f}s")
+    pd.DataFrame(rows).sort_values('job').to_parquet(Path(args.out) / 'metrics.parquet', index=False)
+    print(f"Ran {sum(not row['error'] for row in rows)}/{len(jobs)} backtests in {time.perf_counter() - start:.2f}s, "
+          f"results in {args.out}")
+    if any(row['error'] for row in rows):
+        sys.exit(1)
+
+
+def ingest(args: argparse.Namespace) -> None:
+    """
+    Loads an event dump into the configured backend. The database is named after the source folder,
+    e.g. source=lw-go-events.
+    """
+    from src.db.db_utility import establish_connection
+    from src.load_data.event_to_mariadb import load_data_parallel
+    from src.load_data.manifest import IngestManifest
+
+    source = Path(args.source)
+    database = args.database or source.name.split('=')[-1]
+    db_connector = establish_connection(args.db_config, database=database)
+    manifest = IngestManifest(source / "_ingest_manifest.jsonl")
+    load_data_parallel(source, db_connector=db_connector, workers=args.workers, writers=args.writers,
+                       manifest=manifest)
+
+
+def fetch(args: argparse.Namespace) -> None:
+    """
+    Incrementally refreshes the intraday bars of the symbol universe. Reads the API key from ALPHAVANTAGE_KEY.
+    """
+    from src.db.db_utility import establish_connection
+    from src.fetch_data.async_fetcher import AsyncFetcher, load_symbols
+
+    symbols = load_symbols(Path(args.config_dir))
+    if args.symbols:
+        symbols = [symbol for symbol in symbols if symbol.symbol in args.symbols]
+    db = establish_connection(args.db_config, database=args.database)
+    AsyncFetcher(os.environ["ALPHAVANTAGE_KEY"], concurrency=args.concurrency, interval=args.interval).refresh(symbols,
+                                                                                                              db)
+
+
+def report(args: argparse.Namespace) -> None:
+    """
+    Renders the HTML reports of the jobs, see src.frontend.reports.
+    """
+    from src.frontend.reports import generate_reports
+
+    bt_params = load_config(args.config)
+    results = generate_reports(bt_params, build_jobs(bt_params, args), args.out, database=args.database,
+                               processes=args.processes)
+    if any(result.error for result in results):
+        sys.exit(1)
+
+
+def load_config(path: str) -> dict:
+    with open(path) as stream:
+        return yaml.safe_load(stream)
+
+
+def add_job_arguments(parser: argparse.ArgumentParser, out: str) -> None:
+    """
+    Adds the arguments that select the jobs of backtest and report.
+    """
+    parser.add_argument('--config', default='config/backtest.yaml', help="The backtest configuration.")
+    parser.add_argument('--pairs', nargs='+', help="The pairs, defaults to the pairs of the config.")
+    parser.add_argument('--time-frames', nargs='+', help="Pandas offset aliases to resample to, e.g. 15min 1h.")
+    parser.add_argument('--range', type=parse_range, action='append',
+                        help="A date range START:END, repeatable. Defaults to the dates of the config.")
+    parser.add_argument('--database', default='', help="The name of the database.")
+    parser.add_argument('--processes', type=int, help="The number of worker processes, defaults to the CPU count.")
+    parser.add_argument('--out', default=out, help="The output directory.")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='investment-tooling', description="Headless backtests, ingests and fetches.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    backtest_parser = subparsers.add_parser('backtest', help="Run backtests and write Parquet results.")
+    add_job_arguments(backtest_parser, 'results')
+    backtest_parser.set_defaults(func=backtest)
+
+    ingest_parser = subparsers.add_parser('ingest', help="Load an event dump into the configured database.")
+    ingest_parser.add_argument('source', help="The folder of the event dump.")
+    ingest_parser.add_argument('--db-config', default='config/mariadb.yaml', help="The database configuration.")
+    ingest_parser.add_argument('--database', help="The name of the database, defaults to the source folder.")
+    ingest_parser.add_argument('--workers', type=int, help="The number of reader processes.")
+    ingest_parser.add_argument('--writers', type=int, default=2, help="The number of writer threads.")
+    ingest_parser.set_defaults(func=ingest)
+
+    fetch_parser = subparsers.add_parser('fetch', help="Refresh the intraday bars of the symbol universe.")
+    fetch_parser.add_argument('--config-dir', default='config', help="The folder of the symbol configs.")
+    fetch_parser.add_argument('--db-config', default='config/mariadb.yaml', help="The database configuration.")
+    fetch_parser.add_argument('--database', default='intraday', help="The name of the database.")
+    fetch_parser.add_argument('--symbols', nargs='+', help="Only refresh these symbols.")
+    fetch_parser.add_argument('--interval', default='1min', help="The bar interval.")
+    fetch_parser.add_argument('--concurrency', type=int, default=8, help="The maximum number of open requests.")
+    fetch_parser.set_defaults(func=fetch)
+
+    report_parser = subparsers.add_parser('report', help="Render HTML reports with an index page.")
+    add_job_arguments(report_parser, 'reports')
+    report_parser.set_defaults(func=report)
+    return parser
+
+
+def main(argv: List[str] = None) -> None:
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
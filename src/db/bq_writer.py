@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Buffered, batched writes to BigQuery.
+Rows are accumulated in memory and flushed with insert_rows_json from a background thread once a row
+count, a byte size or a time interval is reached. Rows that BigQuery rejects are retried with
+exponential backoff. The writer only uses client.insert_rows_json, so any object with that method,
+e.g. a local fake client, can stand in for the BigQuery client.
+"""
+import json
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import pandas as pd
+
+
+class BufferedBQWriter(object):
+    """
+    Accumulates rows for one table and flushes them in batches.
+    Use it as a context manager, or call close() to flush the remaining rows and stop the thread.
+    """
+
+    def __init__(self, client: Any, table_uri: str, schema_names: Optional[List[str]] = None, max_rows: int = 500,
+                 max_bytes: int = 5 * 1024 ** 2, flush_interval: float = 1.0, max_retries: int = 5,
+                 backoff: float = 0.5) -> None:
+        self.client = client
+        self.table_uri = table_uri
+        self.schema_names = schema_names
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.batch_sizes: List[int] = []
+        self.flush_latencies: List[float] = []
+        self.failed_rows: List[Dict[str, Any]] = []
+        self._rows: List[Dict[str, Any]] = []
+        self._bytes = 0
+        self._last_flush = time.monotonic()
+        self._closed = False
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> 'BufferedBQWriter':
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def add_row(self, row: Dict[str, Any]) -> None:
+        """
+        Buffers a single row.
+        :param row: The row as a JSON-serializable dict.
+        :return: None.
+        """
+        self._add([row], len(json.dumps(row, default=str)))
+
+    def add_dataframe(self, df: pd.DataFrame) -> None:
+        """
+        Buffers every row of a DataFrame. The frame is converted in one vectorized to_json call,
+        restricted to the columns of the table schema if it is known.
+        :param df: The data.
+        :return: None.
+        """
+        if self.schema_names is not None:
+            df = df[[c for c in self.schema_names if c in df.columns]]
+        payload = df.to_json(orient='records', date_format='iso')
+        self._add(json.loads(payload), len(payload))
+
+    def flush(self) -> None:
+        """
+        Sends the buffered rows now.
+        :return: None.
+        """
+        with self._condition:
+            rows, self._rows, self._bytes = self._rows, [], 0
+            self._last_flush = time.monotonic()
+        if rows:
+            with self._flush_lock:
+                self._send(rows)
+
+    def close(self) -> None:
+        """
+        Flushes the remaining rows and stops the background thread.
+        :return: None.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self.flush()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the flush statistics.
+        :return: A dictionary with the number of flushes, rows, mean batch size, latencies and failed rows.
+        """
+        latencies = sorted(self.flush_latencies)
+        return {'flushes': len(self.batch_sizes),
+                'rows': sum(self.batch_sizes),
+                'mean_batch_size': sum(self.batch_sizes) / len(self.batch_sizes) if self.batch_sizes else 0.0,
+                'mean_flush_latency': sum(latencies) / len(latencies) if latencies else 0.0,
+                'max_flush_latency': latencies[-1] if latencies else 0.0,
+                'failed_rows': len(self.failed_rows)}
+
+    def _add(self, rows: List[Dict[str, Any]], size: int) -> None:
+        """
+        Appends rows to the buffer and wakes up the flush thread if a threshold is reached.
+        :param rows: The rows.
+        :param size: Their approximate size in bytes.
+        :return: None.
+        """
+        with self._condition:
+            assert not self._closed, "Writer is closed!"
+            self._rows.extend(rows)
+            self._bytes += size
+            if len(self._rows) >= self.max_rows or self._bytes >= self.max_bytes:
+                self._condition.notify()
+
+    def _run(self) -> None:
+        """
+        Background loop that flushes on row count, byte size or interval.
+        :return: None.
+        """
+        while True:
+            with self._condition:
+                if self._closed:
+                    return
+                due = self._last_flush + self.flush_interval - time.monotonic()
+                full = len(self._rows) >= self.max_rows or self._bytes >= self.max_bytes
+                if not full and (due > 0 or not self._rows):
+                    self._condition.wait(timeout=max(due, 0.01) if self._rows else self.flush_interval)
+                    continue
+            self.flush()
+
+    def _chunks(self, rows: List[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Splits rows into chunks of at most max_rows and max_bytes. A single row above max_bytes is sent alone.
+        :param rows: The rows.
+        :return: An iterator of chunks.
+        """
+        chunk, size = [], 0
+        for row in rows:
+            row_size = len(json.dumps(row, default=str))
+            if chunk and (len(chunk) >= self.max_rows or size + row_size > self.max_bytes):
+                yield chunk
+                chunk, size = [], 0
+            chunk.append(row)
+            size += row_size
+        if chunk:
+            yield chunk
+
+    def _send(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Inserts a batch in chunks of at most max_rows and max_bytes and retries the rejected rows with backoff.
+        :param rows: The rows to insert.
+        :return: None.
+        """
+        for chunk in self._chunks(rows):
+            batch = chunk
+            start = time.perf_counter()
+            for attempt in range(self.max_retries + 1):
+                try:
+                    errors = self.client.insert_rows_json(self.table_uri, batch)
+                    batch = [batch[error['index']] for error in errors]
+                except Exception as e:
+                    print(f"Insertion into {self.table_uri} failed: {e}")
+                if not batch:
+                    break
+                if attempt < self.max_retries:
+                    time.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
+            if batch:
+                print(f"Giving up on {len(batch)} rows for {self.table_uri}")
+                self.failed_rows.extend(batch)
+            self.batch_sizes.append(len(chunk))
+            self.flush_latencies.append(time.perf_counter() - start)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Batched bulk inserts over any DB-API connection.
+Only cursor.executemany, commit and rollback are used, so the same path runs against MariaDB and
+against local stand-ins such as sqlite3 (with a '?' placeholder query).
+"""
+import os
+import tempfile
+import time
+from typing import Any, List
+
+import pandas as pd
+
+
+def executemany_batches(connection: Any, query: str, data: pd.DataFrame, schema: list,
+                        batch_size: int = 10000, commit: bool = True) -> float:
+    """
+    Inserts a DataFrame in batches with executemany. Each batch is committed as one transaction, unless
+    commit is False, in which case the caller commits or rolls back all batches together.
+    Values are sent as strings, in the same way as MARIADB.insert_data has always done, and missing
+    values as NULL.
+    :param connection: A DB-API connection.
+    :param query: The parameterized insert query, with one placeholder per column in schema.
+    :param data: The data in form of a Pandas DataFrame.
+    :param schema: The column names as list, in the order of the placeholders.
+    :param batch_size: The number of rows per batch.
+    :param commit: Whether each batch is committed.
+    :return: The insert rate in rows per second.
+    """
+    start = time.perf_counter()
+    autocommit = getattr(connection, 'autocommit', None)
+    if autocommit:
+        connection.autocommit = False
+    cursor = connection.cursor()
+    # The rows are converted once, every batch is a slice of them
+    rows = list(zip(*(data[col].astype(str).astype(object).where(data[col].notna(), None).tolist()
+                      for col in schema)))
+    try:
+        for offset in range(0, len(rows), batch_size):
+            cursor.executemany(query, rows[offset:offset + batch_size])
+            if commit:
+                connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+        if autocommit:
+            connection.autocommit = True
+    return report_rate(len(data), time.perf_counter() - start)
+
+
+def write_temporary_csv(data: pd.DataFrame, schema: list) -> str:
+    """
+    Writes the given columns to a temporary CSV file without header and index.
+    Missing values are written as \\N, which LOAD DATA reads as NULL.
+    The caller is responsible for removing the file.
+    :param data: The data in form of a Pandas DataFrame.
+    :param schema: The column names as list.
+    :return: The path to the CSV file.
+    """
+    handle, path = tempfile.mkstemp(suffix='.csv')
+    with os.fdopen(handle, 'w', newline='') as stream:
+        data[schema].to_csv(stream, header=False, index=False, na_rep='\\N')
+    return path
+
+
+def load_data_infile_query(path: str, table_name: str, schema: List[str]) -> str:
+    """
+    Builds the LOAD DATA LOCAL INFILE statement for a CSV written by write_temporary_csv.
+    :param path: The path to the CSV file.
+    :param table_name: The table to load into.
+    :param schema: The column names as list, in file order.
+    :return: The statement.
+    """
+    return (f"LOAD DATA LOCAL INFILE '{path}' INTO TABLE {table_name} "
+            "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' LINES TERMINATED BY '\\n' "
+            f"({', '.join(schema)})")
+
+
+def report_rate(rows: int, seconds: float) -> float:
+    """
+    Prints and returns the insert rate.
+    :param rows: The number of inserted rows.
+    :param seconds: The elapsed time.
+    :return: The rate in rows per second.
+    """
+    rate = rows / seconds if seconds > 0 else float('inf')
+    # round() of an infinite rate raises, which would fail an insert that already succeeded
+    print(f"Inserted {rows} rows in {round(seconds, 2)} seconds ({round(rate) if seconds > 0 else rate} rows/sec)")
+    return rate
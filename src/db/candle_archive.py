@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped columnar archive for candles.
+Every column is stored as a raw, fixed-width binary file next to a small JSON header:
+    <directory>/header.json
+    <directory>/DT.bin      int64 nanoseconds since epoch, sorted
+    <directory>/OPEN.bin    float64 (or float32)
+    ...
+Opening an archive maps the files with numpy.memmap, so no data is read up front, and a date range
+is sliced by a binary search on the timestamp column. Slices are views into the mapped files.
+"""
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+ARCHIVE_VERSION = 1
+PRICE_COLUMNS = ['BUY', 'SELL', 'OPEN', 'CLOSE', 'HIGH', 'LOW', 'VOL']
+
+
+def write_archive(df: pd.DataFrame, directory: Union[str, Path], float_dtype: str = 'float64') -> None:
+    """
+    Writes a backtest frame as a columnar archive.
+    :param df: A frame with DT and the price columns.
+    :param directory: The archive directory. Existing column files are overwritten.
+    :param float_dtype: The dtype of the price columns, float64 or float32.
+    :return: None.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    df = df.sort_values('DT')
+    columns = {'DT': 'int64'}
+    np.ascontiguousarray(pd.to_datetime(df['DT']).values.astype('datetime64[ns]').view('int64')) \
+        .tofile(directory / 'DT.bin')
+    for column in [c for c in PRICE_COLUMNS if c in df.columns]:
+        np.ascontiguousarray(df[column].values, dtype=float_dtype).tofile(directory / f'{column}.bin')
+        columns[column] = float_dtype
+    header = {'version': ARCHIVE_VERSION,
+              'rows': len(df),
+              'columns': columns,
+              'first': str(df['DT'].iloc[0]) if len(df) else None,
+              'last': str(df['DT'].iloc[-1]) if len(df) else None}
+    with open(directory / 'header.json', 'w') as stream:
+        json.dump(header, stream, indent=2)
+
+
+def to_epoch_ns(dt: Union[datetime, str, np.datetime64]) -> int:
+    """
+    Converts a datetime to nanoseconds since epoch, as stored in the DT column.
+    :param dt: A datetime, a numpy datetime64 or a string that numpy can parse.
+    :return: The timestamp as int.
+    """
+    return int(np.datetime64(dt, 'ns').astype('int64'))
+
+
+class CandleArchive(object):
+    """
+    A read-only, memory-mapped view of an archive written by write_archive.
+    """
+
+    def __init__(self, directory: Union[str, Path]) -> None:
+        self.directory = Path(directory)
+        with open(self.directory / 'header.json') as stream:
+            self.header = json.load(stream)
+        assert self.header['version'] == ARCHIVE_VERSION, "Unsupported candle archive version!"
+        self.rows = self.header['rows']
+        self.columns = {name: self._map(name, dtype) for name, dtype in self.header['columns'].items()}
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def _map(self, name: str, dtype: str) -> np.ndarray:
+        """
+        Maps a column file. numpy cannot map empty files, so empty archives get empty arrays.
+        :param name: The column name.
+        :param dtype: The dtype of the column.
+        :return: The mapped column.
+        """
+        if self.rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self.directory / f'{name}.bin', dtype=dtype, mode='r', shape=(self.rows,))
+
+    def bounds(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> (int, int):
+        """
+        Finds the row positions of a closed datetime range with a binary search on DT.
+        :param start: The start of the range, or None for the first row.
+        :param end: The end of the range, or None for the last row.
+        :return: A tuple (first, stop) of row positions, usable as a slice.
+        """
+        timestamps = self.columns['DT']
+        first = 0 if start is None else int(np.searchsorted(timestamps, to_epoch_ns(start), side='left'))
+        stop = self.rows if end is None else int(np.searchsorted(timestamps, to_epoch_ns(end), side='right'))
+        return first, max(first, stop)
+
+    def slice(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[str, np.ndarray]:
+        """
+        Returns the columns of a closed datetime range as zero-copy views. DT is viewed as datetime64[ns].
+        :param start: The start of the range, or None for the first row.
+        :param end: The end of the range, or None for the last row.
+        :return: A dictionary from column name to array.
+        """
+        first, stop = self.bounds(start, end)
+        arrays = {name: column[first:stop] for name, column in self.columns.items()}
+        arrays['DT'] = arrays['DT'].view('datetime64[ns]')
+        return arrays
+
+    def to_frame(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> pd.DataFrame:
+        """
+        Returns a closed datetime range as a backtest frame. Only the rows in the range are read.
+        :param start: The start of the range, or None for the first row.
+        :param end: The end of the range, or None for the last row.
+        :return: A Pandas DataFrame with the same columns as get_bt_data.
+        """
+        return pd.DataFrame(self.slice(start, end))
+
+    def iter_chunks(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                    chunk_size: int = 100000) -> Iterator[pd.DataFrame]:
+        """
+        Yields a closed datetime range in frames of a fixed number of rows, e.g. for StartBT.execute_chunks.
+        :param start: The start of the range, or None for the first row.
+        :param end: The end of the range, or None for the last row.
+        :param chunk_size: The number of rows per chunk.
+        :return: An iterator of Pandas DataFrames.
+        """
+        first, stop = self.bounds(start, end)
+        for offset in range(first, stop, chunk_size):
+            arrays = {name: column[offset:min(offset + chunk_size, stop)] for name, column in self.columns.items()}
+            arrays['DT'] = arrays['DT'].view('datetime64[ns]')
+            yield pd.DataFrame(arrays)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Read-through Parquet cache for candle tables.
+Candles are stored locally partitioned by pair, year and month:
+    <root>/pair=EURUSD/year=2022/month=01/data.parquet
+    <root>/pair=EURUSD/year=2022/month=01/coverage.json
+The coverage file lists the closed datetime intervals of the partition that have been fetched, so
+only the missing parts of a requested range go to the database.
+"""
+import json
+import shutil
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Iterator, List, Tuple
+
+import pandas as pd
+
+Interval = Tuple[datetime, datetime]
+
+
+def month_partitions(start: datetime, end: datetime) -> Iterator[Tuple[int, int, datetime, datetime]]:
+    """
+    Splits a closed datetime range into the parts that fall into each calendar month.
+    :param start: The start of the range.
+    :param end: The end of the range.
+    :return: An iterator of (year, month, start, end) with the range clipped to the month.
+    """
+    year, month = start.year, start.month
+    while datetime(year, month, 1) <= end:
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        month_end = datetime(next_year, next_month, 1) - timedelta(microseconds=1)
+        yield year, month, max(start, datetime(year, month, 1)), min(end, month_end)
+        year, month = next_year, next_month
+
+
+def missing_intervals(start: datetime, end: datetime, covered: List[Interval]) -> List[Interval]:
+    """
+    Subtracts the covered intervals from a closed range.
+    The boundaries of the gaps are included, as the fetched rows are de-duplicated on DT anyway.
+    :param start: The start of the range.
+    :param end: The end of the range.
+    :param covered: The sorted, non-overlapping covered intervals.
+    :return: The intervals of the range that are not covered.
+    """
+    missing, cursor, complete = [], start, False
+    for low, high in covered:
+        if high < cursor:
+            continue
+        if low > end:
+            break
+        if low > cursor:
+            missing.append((cursor, low))
+        if high >= end:
+            complete = True
+            break
+        cursor = high
+    if not complete:
+        missing.append((cursor, end))
+    return missing
+
+
+def merge_intervals(intervals: List[Interval]) -> List[Interval]:
+    """
+    Merges overlapping or touching intervals.
+    :param intervals: The intervals.
+    :return: The sorted, non-overlapping intervals.
+    """
+    merged = []
+    for low, high in sorted(intervals):
+        if merged and low <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], high))
+        else:
+            merged.append((low, high))
+    return merged
+
+
+class CandleCache(object):
+    """
+    Local Parquet cache in front of the candle tables.
+    get() serves a range from the cached partitions and fetches only the missing date ranges from
+    the database, which are then merged into their partitions.
+    """
+
+    def __init__(self, root: str, lag: timedelta = timedelta(hours=1), report: bool = False) -> None:
+        """
+        :param root: The cache folder.
+        :param lag: How long recent rows may still be written to the database. Ranges younger than this
+                    are never marked as covered, so they are fetched again.
+        :param report: Whether get() prints the hit statistics.
+        """
+        self.root = Path(root)
+        self.lag = lag
+        self.report = report
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def get(self, pair: str, start: datetime, end: datetime,
+            fetch: Callable[[str, datetime, datetime], pd.DataFrame]) -> pd.DataFrame:
+        """
+        Returns the candles of a pair in a closed datetime range.
+        :param pair: The currency pair.
+        :param start: The start of the range.
+        :param end: The end of the range.
+        :param fetch: A function (pair, start, end) that fetches a closed range from the database.
+        :return: A Pandas DataFrame sorted by DT.
+        """
+        frames = []
+        for year, month, part_start, part_end in month_partitions(start, end):
+            folder = self._partition(pair, year, month)
+            covered = self._read_coverage(folder)
+            data = pd.read_parquet(folder / 'data.parquet') if (folder / 'data.parquet').exists() else None
+            missing = missing_intervals(part_start, part_end, covered)
+            fetched_bytes = 0
+            if missing:
+                self.misses += 1
+                fetched = [fetch(pair, low, high) for low, high in missing]
+                fetched_bytes = sum(int(df.memory_usage(deep=True).sum()) for df in fetched)
+                data = pd.concat(([data] if data is not None else []) + fetched, ignore_index=True)
+                data = data.drop_duplicates('DT', keep='last').sort_values('DT').reset_index(drop=True)
+                # Recent rows may still be written, so coverage stops the lag before the fetch
+                settled = datetime.now() - self.lag
+                covered = merge_intervals(covered + [(low, min(high, settled)) for low, high in missing
+                                                     if low <= settled])
+                self._write(folder, data, covered)
+            else:
+                self.hits += 1
+            part = data[(data.DT >= part_start) & (data.DT <= part_end)]
+            self.bytes_saved += max(0, int(part.memory_usage(deep=True).sum()) - fetched_bytes)
+            frames.append(part)
+        df = pd.concat(frames, ignore_index=True)
+        if self.report:
+            print(f"Candle cache for {pair}: {self.hits} hits, {self.misses} misses, "
+                  f"{round(self.bytes_saved / 1024 ** 2, 2)} MB saved")
+        return df
+
+    def invalidate(self, pair: str, year: int = None, month: int = None) -> None:
+        """
+        Removes cached partitions of a pair. Without year and month, the whole pair is removed.
+        :param pair: The currency pair.
+        :param year: The year of the partitions to remove.
+        :param month: The month of the partition to remove. Requires year.
+        :return: None.
+        """
+        folder = self.root / f'pair={pair}'
+        if year is not None:
+            folder = folder / f'year={year}'
+            if month is not None:
+                folder = folder / f'month={month:02d}'
+        shutil.rmtree(folder, ignore_errors=True)
+
+    def stats(self) -> dict:
+        """
+        Returns the cache statistics.
+        :return: A dictionary with hits, misses and bytes saved.
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'bytes_saved': self.bytes_saved}
+
+    def _partition(self, pair: str, year: int, month: int) -> Path:
+        """
+        Returns the folder of a partition.
+        :param pair: The currency pair.
+        :param year: The year.
+        :param month: The month.
+        :return: The path to the partition folder.
+        """
+        return self.root / f'pair={pair}' / f'year={year}' / f'month={month:02d}'
+
+    @staticmethod
+    def _read_coverage(folder: Path) -> List[Interval]:
+        """
+        Reads the covered intervals of a partition.
+        :param folder: The partition folder.
+        :return: The covered intervals, empty if the partition is not cached.
+        """
+        path = folder / 'coverage.json'
+        if not path.exists() or not (folder / 'data.parquet').exists():
+            return []
+        with open(path) as stream:
+            return [(datetime.fromisoformat(low), datetime.fromisoformat(high)) for low, high in json.load(stream)]
+
+    @staticmethod
+    def _write(folder: Path, data: pd.DataFrame, covered: List[Interval]) -> None:
+        """
+        Writes the data and coverage of a partition. The data is written first, so a partition
+        never claims coverage for rows it does not contain.
+        :param folder: The partition folder.
+        :param data: The merged data of the partition.
+        :param covered: The covered intervals.
+        :return: None.
+        """
+        folder.mkdir(parents=True, exist_ok=True)
+        data.to_parquet(folder / 'data.parquet', engine='pyarrow', index=False)
+        with open(folder / 'coverage.json', 'w') as stream:
+            json.dump([(low.isoformat(), high.isoformat()) for low, high in covered], stream)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Bounded connection pools for MariaDB.
+The pools wrap mariadb.ConnectionPool with a checkout timeout, a health check on checkout and
+usage statistics. One pool is kept per (host, port, user, database), so every MARIADB object
+in the process that points to the same database shares its connections.
+"""
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple
+
+import mariadb
+
+
+class PoolTimeout(ConnectionError):
+    """
+    Raised when no connection could be checked out of a pool before the timeout.
+    """
+
+
+class ConnectionPool(object):
+    """
+    A bounded pool of MariaDB connections.
+    Checkouts beyond the pool size wait until a connection is released or the timeout is reached.
+    Connections are pinged on checkout and reconnected if the server dropped them.
+    """
+
+    def __init__(self, pool_name: str, pool_size: int = 5, timeout: float = 30.0, **connection_info) -> None:
+        self.pool_name = pool_name
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._pool = mariadb.ConnectionPool(pool_name=pool_name, pool_size=pool_size, **connection_info)
+        self._condition = threading.Condition()
+        self.in_use = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.reconnects = 0
+
+    def get_connection(self, timeout: float = None) -> mariadb.Connection:
+        """
+        Checks out a connection from the pool.
+        :param timeout: Seconds to wait for a free connection. Defaults to the pool timeout.
+        :return: A healthy connection. Release it with release() when done.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        with self._condition:
+            if self.in_use >= self.pool_size:
+                self.waits += 1
+                start = time.perf_counter()
+                available = self._condition.wait_for(lambda: self.in_use < self.pool_size, timeout=timeout)
+                self.wait_time += time.perf_counter() - start
+                if not available:
+                    raise PoolTimeout(f"No connection available in pool '{self.pool_name}' after {timeout} seconds")
+            self.in_use += 1
+            self.checkouts += 1
+        try:
+            connection = self._pool.get_connection()
+            try:
+                connection.ping()
+            except mariadb.Error:
+                connection.reconnect()
+                self.reconnects += 1
+            return connection
+        except Exception:
+            self._checkin()
+            raise
+
+    def release(self, connection: mariadb.Connection) -> None:
+        """
+        Returns a connection to the pool.
+        :param connection: The connection that was checked out.
+        :return: None.
+        """
+        try:
+            connection.close()
+        finally:
+            self._checkin()
+
+    @contextmanager
+    def connection(self, timeout: float = None) -> Iterator[mariadb.Connection]:
+        """
+        Context manager that checks out a connection and releases it afterwards.
+        :param timeout: Seconds to wait for a free connection. Defaults to the pool timeout.
+        :return: An iterator yielding the connection.
+        """
+        connection = self.get_connection(timeout)
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the usage statistics of the pool.
+        :return: A dictionary with size, in-use, checkouts, waits, total wait time and reconnects.
+        """
+        with self._condition:
+            return {'pool_size': self.pool_size,
+                    'in_use': self.in_use,
+                    'checkouts': self.checkouts,
+                    'waits': self.waits,
+                    'wait_time': round(self.wait_time, 4),
+                    'reconnects': self.reconnects}
+
+    def close(self) -> None:
+        """
+        Closes all connections in the pool.
+        :return: None.
+        """
+        self._pool.close()
+
+    def _checkin(self) -> None:
+        """
+        Marks a connection as released and wakes up one waiting checkout.
+        :return: None.
+        """
+        with self._condition:
+            self.in_use -= 1
+            self._condition.notify()
+
+
+_POOLS: Dict[Tuple[str, int, str, str], ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(host: str, port: int, user: str, password: str, database: str,
+             pool_size: int = 5, timeout: float = 30.0, local_infile: bool = False) -> ConnectionPool:
+    """
+    Returns the shared pool for a database, creating it on first use.
+    :param host: The database host.
+    :param port: The database port.
+    :param user: The database user.
+    :param password: The password of the user.
+    :param database: The database to connect to.
+    :param pool_size: The maximum number of connections, used when the pool is created.
+    :param timeout: The checkout timeout in seconds, used when the pool is created.
+    :param local_infile: Whether LOAD DATA LOCAL INFILE is enabled, used when the pool is created.
+    :return: The ConnectionPool for the database.
+    """
+    key = (host, port, user, database)
+    with _POOLS_LOCK:
+        if key not in _POOLS:
+            # mariadb limits pool names in length and characters, so the key is hashed
+            pool_name = 'pool_' + hashlib.md5(repr(key).encode()).hexdigest()[:16]
+            _POOLS[key] = ConnectionPool(pool_name, pool_size=pool_size, timeout=timeout,
+                                         host=host, port=port, user=user, password=password,
+                                         database=database, autocommit=True, local_infile=local_infile)
+        return _POOLS[key]
+
+
+def pool_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Returns the statistics of every pool in the process.
+    :return: A dictionary from 'user@host:port/database' to the pool statistics.
+    """
+    with _POOLS_LOCK:
+        return {f"{user}@{host}:{port}/{database}": pool.stats()
+                for (host, port, user, database), pool in _POOLS.items()}
+
+
+def close_pools() -> None:
+    """
+    Closes and forgets every pool in the process.
+    :return: None.
+    """
+    with _POOLS_LOCK:
+        for pool in _POOLS.values():
+            pool.close()
+        _POOLS.clear()
@@ -1,13 +1,60 @@
 #!/usr/bin/env python3
 """
-
+Connects to the storage backends. The backend modules are imported on first use only, so a MariaDB run
+does not load the BigQuery or DuckDB drivers, and importing this module stays cheap.
 """
+import importlib
+from typing import TYPE_CHECKING, Dict, Tuple, Type
+
 import yaml
-from src.db.io_mariadb import MARIADB
-from src.db.io_bigquery import BQ
+from src.db.storage_backend import StorageBackend
+
+if TYPE_CHECKING:
+    from src.db.io_bigquery import BQ
+    from src.db.io_mariadb import MARIADB
+
+# Maps the 'backend' value of a dbinfo section to the module and the class of the backend
+BACKENDS: Dict[str, Tuple[str, str]] = {'mariadb': ('src.db.io_mariadb', 'MARIADB'),
+                                        'duckdb': ('src.db.io_duckdb', 'DUCKDB')}
+
+
+def register_backend(name: str, module: str, class_name: str) -> None:
+    """
+    Registers a storage backend that is imported on first use.
+    :param name: The 'backend' value of the dbinfo section.
+    :param module: The dotted path of the module that defines the backend.
+    :param class_name: The name of the StorageBackend subclass in the module.
+    :return: None.
+    """
+    BACKENDS[name] = (module, class_name)
+
+
+def load_backend(name: str) -> Type[StorageBackend]:
+    """
+    Imports the class of a registered storage backend.
+    :param name: The 'backend' value of the dbinfo section.
+    :return: The StorageBackend subclass.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown storage backend '{name}', expected one of {list(BACKENDS)}")
+    module, class_name = BACKENDS[name]
+    return getattr(importlib.import_module(module), class_name)
+
+
+def establish_connection(config: str, database: str) -> StorageBackend:
+    """
+    Establishes the connection to the storage backend selected by 'backend' in the dbinfo section
+    of the config file. Defaults to MariaDB.
+    :param config: The relative path to the config file.
+    :param database: The initial database to connect to.
+    :return: The storage backend object that holds the connection.
+    """
+    with open(config) as stream:
+        db_info = yaml.safe_load(stream)
+    return load_backend(db_info.get('dbinfo', {}).get('backend', 'mariadb'))(db_info, initial_database=database)
 
 
-def establish_connection_mariadb(config: str, database: str) -> MARIADB:
+def establish_connection_mariadb(config: str, database: str) -> 'MARIADB':
     """
     Establishes the connection to the MariaDB
     along necessary functions to communicate with the instance.
@@ -16,14 +63,15 @@ def establish_connection_mariadb(config: str, database: str) -> MARIADB:
     :return: a Maria DB object that holds the connection.
     """
     with open(config) as stream:
-        return MARIADB(yaml.safe_load(stream), initial_database=database)
+        return load_backend('mariadb')(yaml.safe_load(stream), initial_database=database)
 
 
-def establish_connection_bigquery(config: str) -> BQ:
+def establish_connection_bigquery(config: str) -> 'BQ':
     """
     Sets up the bigquery client.
     :param config: The relative path to the config file
     :return: A bigquery client object.
     """
+    from src.db.io_bigquery import BQ
     with open(config) as stream:
         return BQ(yaml.safe_load(stream))
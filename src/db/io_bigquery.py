@@ -7,6 +7,8 @@ import pandas as pd
 from google.cloud import bigquery as bq
 from google.oauth2 import service_account as sa
 
+from src.db.bq_writer import BufferedBQWriter
+
 
 class BQ(object):
     """
@@ -48,6 +50,15 @@ class BQ(object):
         :return: None, as the table is set directly.
         """
         self.table = self.client.get_table(f"{self.project}.{self.dataset}.{table}")
+        self._schema_names = [column.name for column in self.table.schema]
+
+    @property
+    def schema_names(self) -> List[str]:
+        """
+        The column names of the active table, cached when the table is initiated.
+        :return: The column names.
+        """
+        return self._schema_names
 
     def insert_row(self, row: List[Dict[str, Any]], table) -> bool:
         """
@@ -68,7 +79,18 @@ class BQ(object):
         :return: A dictionary with columns as keys and data as values.
         """
         try:
-            return {column.name: value for column, value in zip(self.table.schema, data)}
+            return dict(zip(self.schema_names, data))
         except AttributeError:
             print("Row is malformed!")
             return {}
+
+    def buffered_writer(self, table: str, **kwargs) -> BufferedBQWriter:
+        """
+        Creates a buffered writer for a table, restricted to the columns of its schema.
+        :param table: The designated table to insert data into.
+        :param kwargs: The flush thresholds and retry settings of BufferedBQWriter.
+        :return: The BufferedBQWriter.
+        """
+        self._initiate_table(table)
+        bq_uri = '.'.join((self.project, self.dataset, table))
+        return BufferedBQWriter(self.client, bq_uri, schema_names=self.schema_names, **kwargs)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Embedded columnar storage backend on DuckDB.
+Needs no database server, so research and CI boxes can run backtests from a local file. Range scans
+are returned as Arrow tables or NumPy arrays straight from the columnar engine, without materializing
+DB-API rows in Python.
+"""
+import os
+from typing import Dict, Optional
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from src.db.schema import enforce_schema
+from src.db.storage_backend import (BT_COLUMNS, StorageBackend, checked_table_name, deduplicate_bars,
+                                    parse_date_range)
+
+
+class DUCKDB(StorageBackend):
+    """
+    Database connector class for handling data in an embedded DuckDB file.
+    Every database is its own file <db_dir>/<database>.duckdb. Without a database name the
+    connection is in-memory.
+    """
+
+    def __init__(self, db_info: dict, initial_database: str) -> None:
+        self.db_info = db_info.get('dbinfo')
+        self._db_dir = self.db_info.get("db_dir", ".")
+        self._read_only = self.db_info.get("read_only", False)
+        self._threads = self.db_info.get("threads")
+        self._downcast = self.db_info.get("downcast_prices", False)
+        self._price_decimals = self.db_info.get("price_decimals", 5)
+        self._db = initial_database
+        self.connector = None
+        assert self.test_connection(), "Connection to local database could not be established"
+
+    @property
+    def path(self) -> str:
+        """
+        The database file of the current database.
+        :return: The path, or ':memory:' without a database name.
+        """
+        return os.path.join(self._db_dir, f"{self._db}.duckdb") if self._db else ':memory:'
+
+    def update_database(self, database: str) -> None:
+        """
+        Updates the database that is connected to.
+        :param database: The database name.
+        :return: None.
+        """
+        self.close()
+        self._db = database
+        self.test_connection()
+
+    def test_connection(self) -> bool:
+        """
+        Opens the database file if needed and runs a trivial query.
+        :return: True if connection is established
+        """
+        try:
+            if self.connector is None:
+                self._set_connector()
+            return self.connector.execute('SELECT 1').fetchone()[0] == 1
+        except duckdb.Error:
+            return False
+
+    def _set_connector(self) -> None:
+        """
+        Sets the database connection
+        :return: None
+        """
+        config = {'threads': self._threads} if self._threads else {}
+        self.connector = duckdb.connect(self.path, read_only=self._read_only, config=config)
+
+    def close(self) -> None:
+        """
+        Closes the database file.
+        :return: None
+        """
+        if self.connector is not None:
+            self.connector.close()
+            self.connector = None
+
+    def _range_query(self, start: str, end: str, pair: str) -> duckdb.DuckDBPyConnection:
+        """
+        Executes the backtest range scan with the dates bound as parameters.
+        :param start: The start date
+        :param end: The end date
+        :param pair: The corresponding currency pair
+        :return: The connection holding the pending result
+        """
+        start_dt, end_dt = parse_date_range(start, end)
+        q = f'SELECT {", ".join(BT_COLUMNS)} FROM {checked_table_name(pair)} WHERE DT BETWEEN ? AND ? ORDER BY DT'
+        return self.connector.execute(q, [start_dt, end_dt])
+
+    def get_bt_arrow(self, start: str, end: str, pair: str) -> pa.Table:
+        """
+        Gets the backtest view as an Arrow table.
+        :param start: The start date
+        :param end: The end date
+        :param pair: The corresponding currency pair
+        :return: An Arrow table with the BT_COLUMNS
+        """
+        return self._range_query(start, end, pair).fetch_arrow_table()
+
+    def get_bt_numpy(self, start: str, end: str, pair: str) -> Dict[str, np.ndarray]:
+        """
+        Gets the backtest view as one NumPy array per column.
+        :param start: The start date
+        :param end: The end date
+        :param pair: The corresponding currency pair
+        :return: A dict from column name to array
+        """
+        columns = self._range_query(start, end, pair).fetchnumpy()
+        return {column: np.asarray(values) for column, values in columns.items()}
+
+    def get_bt_data(self, start: str, end: str, pair: str) -> pd.DataFrame:
+        """
+        Gets the backtest view of a pair between two dates, converted from Arrow.
+        :param start: The start date
+        :param end: The end date
+        :param pair: The corresponding currency pair
+        :return: A Pandas DataFrame that contains the data
+        """
+        df = self.get_bt_arrow(start, end, pair).to_pandas()
+        return enforce_schema(df, downcast=self._downcast, decimals=self._price_decimals)
+
+    def get_entire_table(self, table_name: str) -> pd.DataFrame:
+        """
+        Gets every row of a table.
+        :param table_name: The table name to extract data from
+        :return: A Pandas DataFrame that contains the data
+        """
+        assert self.check_if_table_exists(table_name), "table name does not exist"
+        return self.connector.execute(f'SELECT * FROM {checked_table_name(table_name)}').fetch_arrow_table().to_pandas()
+
+    def pd_insert_data(self, data: pd.DataFrame, table_name: str, schema: list = None,
+                       chunks: int = 200000, mode: str = 'append') -> None:
+        """
+        Inserts a Pandas DataFrame by scanning it in place, matching the columns by name.
+        Runs on its own cursor, so the frame registration does not clash with inserts of other threads.
+        :param data: The data in form of a Pandas DataFrame
+        :param table_name: The table name to insert into
+        :param schema: The DuckDB schema of the table, defaults to main
+        :param chunks: Unused, DuckDB scans the frame without chunking
+        :param mode: 'append', 'replace' or 'fail' if the table exists
+        :return: None
+        """
+        assert mode in ('append', 'replace', 'fail'), "mode must be 'append', 'replace' or 'fail'!"
+        name = checked_table_name(table_name)
+        if schema is not None:
+            name = f"{checked_table_name(schema)}.{name}"
+        print(f"Inserting data into: {table_name}")
+        cursor = self.connector.cursor()
+        try:
+            cursor.register('_insert_frame', data)
+            exists = cursor.execute('SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?',
+                                    [table_name]).fetchone()[0] >= 1
+            if mode == 'fail' and exists:
+                raise ValueError(f"Table '{table_name}' already exists.")
+            if mode == 'replace' or not exists:
+                cursor.execute(f'CREATE OR REPLACE TABLE {name} AS SELECT * FROM _insert_frame')
+            else:
+                cursor.execute(f'INSERT INTO {name} BY NAME SELECT * FROM _insert_frame')
+        finally:
+            cursor.close()
+
+    def create_table(self, query: str, table_name: str) -> None:
+        """
+        Creates a table in the database
+        :param query: The corresponding query with schema
+        :param table_name: Table name for the new table
+        :return: None
+        """
+        print(f"Creating table: {table_name}")
+        try:
+            self.connector.execute(query)
+        except duckdb.Error as error:
+            print(f"Could not create table {table_name}.. {error}")
+
+    def check_if_table_exists(self, table_name: str) -> bool:
+        """
+        Checks if a table exists in the database.
+        :param table_name: Name of the table we want to check
+        :return: True if found, False otherwise
+        """
+        q = 'SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?'
+        return self.connector.execute(q, [table_name]).fetchone()[0] >= 1
+
+    def get_last_timestamp(self, table_name: str) -> Optional[pd.Timestamp]:
+        """
+        Gets the most recent DT stored in a table.
+        :param table_name: The table name, e.g. a currency pair
+        :return: The last DT, or None if the table does not exist or is empty
+        """
+        if not self.check_if_table_exists(table_name):
+            return None
+        last = self.connector.execute(f'SELECT MAX(DT) FROM {checked_table_name(table_name)}').fetchone()[0]
+        return None if last is None else pd.Timestamp(last)
+
+    def upsert_bars(self, data: pd.DataFrame, table_name: str) -> int:
+        """
+        Writes bars idempotently. Stored bars in the DT range of the new bars are replaced within one
+        transaction. The table is created if it does not exist.
+        :param data: The bars with a DT column
+        :param table_name: The table name, e.g. a currency pair
+        :return: The number of written bars
+        """
+        data = deduplicate_bars(data)
+        if data.empty:
+            return 0
+        if not self.check_if_table_exists(table_name):
+            self.pd_insert_data(data, table_name)
+            return len(data)
+        name = checked_table_name(table_name)
+        self.connector.register('_upsert_frame', data)
+        try:
+            self.connector.execute('BEGIN TRANSACTION')
+            self.connector.execute(f'DELETE FROM {name} WHERE DT BETWEEN ? AND ?',
+                                   [data.DT.iloc[0].to_pydatetime(), data.DT.iloc[-1].to_pydatetime()])
+            self.connector.execute(f'INSERT INTO {name} BY NAME SELECT * FROM _upsert_frame')
+            self.connector.execute('COMMIT')
+        except duckdb.Error:
+            self.connector.execute('ROLLBACK')
+            raise
+        finally:
+            self.connector.unregister('_upsert_frame')
+        return len(data)
@@ -1,14 +1,41 @@
 #!/usr/bin/env python3
+import os
 import string
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence, Union
 
 import pandas as pd
 import mariadb
 import sqlalchemy
 
+from src.db.bulk_insert import executemany_batches, load_data_infile_query, report_rate, write_temporary_csv
+from src.db.candle_cache import CandleCache
+from src.db.connection_pool import ConnectionPool, get_pool
+from src.db.schema import enforce_schema
+from src.db.storage_backend import (BT_COLUMNS, StorageBackend, checked_table_name, deduplicate_bars,
+                                    parse_date_range)
 from src.utils.utils import reformat_str_to_dt_format as reformat
 
 
-class MARIADB(object):
+def records_to_frame(rows: Sequence[tuple], columns: List[str] = None, downcast: bool = False,
+                     decimals: int = 5) -> pd.DataFrame:
+    """
+    Builds a typed backtest frame from fetched rows. DT arrives as native datetimes, so no string
+    parsing is needed, and the frame is cast to the candle schema.
+    :param rows: The rows as returned by cursor.fetchall()
+    :param columns: The column names, defaults to BT_COLUMNS
+    :param downcast: Whether prices are downcast to float32 where precision allows
+    :param decimals: The number of decimals that downcasting must preserve
+    :return: A Pandas DataFrame
+    """
+    df = pd.DataFrame.from_records(rows, columns=columns or BT_COLUMNS)
+    return enforce_schema(df, downcast=downcast, decimals=decimals, report=False)
+
+
+class MARIADB(StorageBackend):
     """
     Database connector class for handling data in a MariaDB.
     The MariaDB module handles the connection between Python and the database. This class wraps
@@ -22,10 +49,16 @@ class MARIADB(object):
         self._host = self.db_info.get("dbaddr")
         self._port = self.db_info.get("port")
         self._pwd = self.db_info.get("dbpwd")
+        self._pool_size = self.db_info.get("pool_size", 5)
+        self._pool_timeout = self.db_info.get("pool_timeout", 30.0)
+        self._local_infile = self.db_info.get("local_infile", False)
+        self._downcast = self.db_info.get("downcast_prices", False)
+        self._price_decimals = self.db_info.get("price_decimals", 5)
+        self.cache = CandleCache(self.db_info["cache_dir"],
+                                 lag=timedelta(minutes=self.db_info.get("cache_lag_minutes", 60)),
+                                 report=self.db_info.get("cache_report", False)) if self.db_info.get("cache_dir") else None
         self._db = initial_database
         self.engine = None
-        self.connector = None
-        self.cursor = None
         assert self.test_connection(), "Connection to local database could not be established"
 
     def update_database(self, database: str) -> None:
@@ -35,6 +68,7 @@ class MARIADB(object):
         :return: None.
         """
         try:
+            self.close()
             self._db = database
             self.test_connection()
         except mariadb.Error as e:
@@ -47,29 +81,46 @@ class MARIADB(object):
         :return: True if connection is established
         """
         try:
-            mariadb.connect(port=self._port,
-                            host=self._host,
-                            user=self._user,
-                            password=self._pwd,
-                            database=self._db,
-                            autocommit=True)
-            return True
+            with self.connection():
+                return True
         except ConnectionError:
             return False
 
-    def _set_connector(self) -> None:
+    def _get_pool(self) -> ConnectionPool:
         """
-        Sets the database connection
-        :return: None
+        Returns the shared connection pool of the current database.
+        :return: The ConnectionPool.
         """
+        return get_pool(host=self._host, port=self._port, user=self._user, password=self._pwd,
+                        database=self._db, pool_size=self._pool_size, timeout=self._pool_timeout,
+                        local_infile=self._local_infile)
 
-        self.connector = mariadb.connect(port=self._port,
-                                         host=self._host,
-                                         user=self._user,
-                                         password=self._pwd,
-                                         database=self._db,
-                                         autocommit=True)
-        self.cursor = self.connector.cursor()
+    @contextmanager
+    def connection(self) -> Iterator[mariadb.Connection]:
+        """
+        Checks out a connection from the pool of the current database and returns it afterwards.
+        Use this for work that must not share the connector, e.g. concurrent queries.
+        :return: An iterator yielding the connection.
+        """
+        with self._get_pool().connection() as connection:
+            yield connection
+
+    def pool_stats(self) -> Dict[str, float]:
+        """
+        Returns the usage statistics of the pool of the current database.
+        :return: A dictionary with in-use connections, checkouts, waits and wait time.
+        """
+        return self._get_pool().stats()
+
+    def close(self) -> None:
+        """
+        Disposes the sqlAlchemy engine. Pooled connections are checked out per operation and returned
+        right after it, so no connection is held between operations.
+        :return: None
+        """
+        if self.engine is not None:
+            self.engine.dispose()
+            self.engine = None
 
     def run_simple_query(self, sql: str) -> bool:
         """
@@ -77,10 +128,11 @@ class MARIADB(object):
         :param sql: The query.
         :return: A boolean to determine whether the query was successful.
         """
-        if self.connector is None:
-            self._set_connector()
         try:
-            self.cursor.execute(sql)
+            with self.connection() as connector:
+                cursor = connector.cursor()
+                cursor.execute(sql)
+                cursor.close()
             return True
         except mariadb.Error as e:
             print(f"Error with query: {sql}\n\n error was: {e}")
@@ -93,34 +145,126 @@ class MARIADB(object):
         :param query: The query to get the data
         :return: The data in form of a Pandas DataFrame
         """
-        if self.connector is None:
-            self._set_connector()
-        return pd.read_sql(query, self.connector)
+        with self.connection() as connector:
+            return pd.read_sql(query, connector)
 
     def get_bt_data(self, start: str, end: str, pair: str) -> pd.DataFrame:
         """
         Gets a view from the database based on a query with
         parameters. Start and end date are converted to fit the requirements from
         the WHERE-clause.
+        If a cache_dir is configured in dbinfo, the local Parquet cache is consulted first and
+        only the missing date ranges are fetched from the database.
         :param start: The start date
         :param end: The end date
         :param pair: The corresponding currency pair
         :return: A Pandas DataFrame that contains the data
         """
-        if self.connector is None:
-            self._set_connector()
+        if self.cache is not None:
+            start_dt, end_dt = parse_date_range(start, end)
+            df = self.cache.get(checked_table_name(pair), start_dt, end_dt, fetch=self._fetch_pair)
+            return enforce_schema(df, downcast=self._downcast, decimals=self._price_decimals)
         assert len(str(start)) == 8 and start.isdigit(), "Start date is not well-formed!"
         assert len(str(end)) == 8 and end.isdigit(), "End date is not well-formed!"
         assert end > start, "End date is prior or equals to start date!"
         q = f'SELECT DT, BUY, SELL, OPEN, CLOSE, HIGH, LOW, VOL FROM {pair} ' + \
             f'WHERE DT BETWEEN {reformat(start)} AND {reformat(end)}'
         try:
-            df = pd.read_sql_query(q, self.connector)
-            df['DT'] = pd.to_datetime(df['DT'], dayfirst=True)
-            return df
+            with self.connection() as connector:
+                df = pd.read_sql_query(q, connector)
+            return enforce_schema(df, downcast=self._downcast, decimals=self._price_decimals)
         except ConnectionError:
             return pd.empty
 
+    def get_bt_data_multi(self, pairs: List[str], start: str, end: str, concurrent: bool = True,
+                          long_format: bool = False) -> Union[Dict[str, pd.DataFrame], pd.DataFrame]:
+        """
+        Gets the backtest view for several pairs over the same date range.
+        The range is bound as native DATETIME parameters. With concurrent=True every pair is fetched on
+        its own pooled connection in parallel, otherwise all pairs are fetched in one UNION ALL round-trip.
+        :param pairs: The currency pairs
+        :param start: The start date
+        :param end: The end date
+        :param concurrent: Whether to fetch the pairs in parallel rather than in one batched query
+        :param long_format: Whether to return a single frame with a PAIR column instead of a dict
+        :return: A dict from pair to DataFrame, or a single long-format DataFrame
+        """
+        start_dt, end_dt = parse_date_range(start, end)
+        pairs = [checked_table_name(pair) for pair in pairs]
+        if concurrent:
+            with ThreadPoolExecutor(max_workers=max(1, min(len(pairs), self._pool_size))) as executor:
+                frames = dict(zip(pairs, executor.map(lambda p: self._fetch_pair(p, start_dt, end_dt), pairs)))
+        else:
+            frames = self._fetch_pairs_batched(pairs, start_dt, end_dt)
+        if long_format:
+            df = pd.concat([df.assign(PAIR=pair) for pair, df in frames.items()], ignore_index=True)
+            return df.astype({'PAIR': 'category'})
+        return frames
+
+    def _fetch_pair(self, pair: str, start: datetime, end: datetime) -> pd.DataFrame:
+        """
+        Fetches the backtest view of a single pair on a pooled connection.
+        :param pair: The validated pair
+        :param start: The start datetime
+        :param end: The end datetime
+        :return: A Pandas DataFrame
+        """
+        with self.connection() as connector:
+            cursor = connector.cursor()
+            cursor.execute(f'SELECT {", ".join(BT_COLUMNS)} FROM {pair} WHERE DT BETWEEN ? AND ? ORDER BY DT',
+                           (start, end))
+            rows = cursor.fetchall()
+            cursor.close()
+        return records_to_frame(rows, downcast=self._downcast, decimals=self._price_decimals)
+
+    def _fetch_pairs_batched(self, pairs: List[str], start: datetime, end: datetime) -> Dict[str, pd.DataFrame]:
+        """
+        Fetches the backtest view of several pairs in one UNION ALL query.
+        :param pairs: The validated pairs
+        :param start: The start datetime
+        :param end: The end datetime
+        :return: A dict from pair to DataFrame
+        """
+        q = ' UNION ALL '.join(f'SELECT ? AS PAIR, {", ".join(BT_COLUMNS)} FROM {pair} WHERE DT BETWEEN ? AND ?'
+                               for pair in pairs) + ' ORDER BY PAIR, DT'
+        params = tuple(value for pair in pairs for value in (pair, start, end))
+        with self.connection() as connector:
+            cursor = connector.cursor()
+            cursor.execute(q, params)
+            rows = cursor.fetchall()
+            cursor.close()
+        df = records_to_frame(rows, columns=['PAIR'] + BT_COLUMNS, downcast=self._downcast,
+                              decimals=self._price_decimals)
+        return {pair: df.loc[df.PAIR == pair, BT_COLUMNS].reset_index(drop=True) for pair in pairs}
+
+    def stream_bt_data(self, start: str, end: str, pair: str, chunk_size: int = 100000) -> Iterator[pd.DataFrame]:
+        """
+        Streams the same view as get_bt_data in chunks of a fixed number of rows.
+        A pooled connection with an unbuffered cursor is used, so the server sends rows as they are
+        fetched and peak memory is bounded by the chunk size rather than the date range.
+        :param start: The start date
+        :param end: The end date
+        :param pair: The corresponding currency pair
+        :param chunk_size: The number of rows per chunk
+        :return: An iterator of Pandas DataFrames with DT as datetime64 and the prices as float64
+        """
+        assert len(str(start)) == 8 and start.isdigit(), "Start date is not well-formed!"
+        assert len(str(end)) == 8 and end.isdigit(), "End date is not well-formed!"
+        assert end > start, "End date is prior or equals to start date!"
+        q = f'SELECT {", ".join(BT_COLUMNS)} FROM {pair} ' + \
+            f'WHERE DT BETWEEN {reformat(start)} AND {reformat(end)} ORDER BY DT'
+        with self.connection() as connector:
+            cursor = connector.cursor(buffered=False)
+            try:
+                cursor.execute(q)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield records_to_frame(rows, downcast=self._downcast, decimals=self._price_decimals)
+            finally:
+                cursor.close()
+
     def get_entire_table(self, table_name: str) -> pd.DataFrame:
         """
         Gets a view from the database based on a query with
@@ -129,12 +273,10 @@ class MARIADB(object):
         :param table_name: The table name to extract data from
         :return: A Pandas DataFrame that contains the data
         """
-        if self.connector is None:
-            self._set_connector()
         assert self.check_if_table_exists(table_name), "table name does not exist"
         try:
-            df = pd.read_sql_query(f'SELECT * FROM {table_name}', self.connector)
-            return df
+            with self.connection() as connector:
+                return pd.read_sql_query(f'SELECT * FROM {table_name}', connector)
         except ConnectionError:
             return pd.empty
 
@@ -144,26 +286,45 @@ class MARIADB(object):
         :param query: The query to execute
         :return: None
         """
-        if self.connector is None:
-            self._set_connector()
-        cursor = self.connector.cursor()
-        cursor.execute(query)
+        with self.connection() as connector:
+            cursor = connector.cursor()
+            cursor.execute(query)
+            cursor.close()
 
-    def insert_data(self, query: str, data: pd.DataFrame, schema: list) -> None:
+    def insert_data(self, query: str, data: pd.DataFrame, schema: list, batch_size: int = 10000) -> float:
         """
-        Inserts data in the database in correspondence with the given query
+        Inserts data in the database in correspondence with the given query.
+        Rows are sent from the column arrays in executemany batches, each committed as one transaction.
         :param self: Contains database connection information
         :param query: The query to insert the corresponding data
         :param data: The data in form of a Pandas DataFrame
         :param schema: The column names as list
-        :return: None
+        :param batch_size: The number of rows per batch
+        :return: The insert rate in rows per second
         """
-        if self.connector is None:
-            self._set_connector()
-        cursor = self.connector.cursor()
-        for _, row in data.iterrows():
-            tuple([str(row[col]) for col in schema])
-            cursor.execute(query, tuple([str(row[col]) for col in schema]))
+        with self.connection() as connector:
+            return executemany_batches(connector, query, data, schema, batch_size=batch_size)
+
+    def insert_data_infile(self, data: pd.DataFrame, table_name: str, schema: list) -> float:
+        """
+        Inserts very large frames with LOAD DATA LOCAL INFILE from a temporary CSV file.
+        Requires local_infile: True in the dbinfo config and on the server.
+        :param data: The data in form of a Pandas DataFrame
+        :param table_name: The table name to insert into
+        :param schema: The column names as list
+        :return: The insert rate in rows per second
+        """
+        start = time.perf_counter()
+        path = write_temporary_csv(data, schema)
+        try:
+            with self.connection() as connector:
+                cursor = connector.cursor()
+                cursor.execute(load_data_infile_query(path, table_name, schema))
+                connector.commit()
+                cursor.close()
+        finally:
+            os.remove(path)
+        return report_rate(len(data), time.perf_counter() - start)
 
     def pd_insert_data(self, data: pd.DataFrame, table_name: str, schema: list = None,
                        chunks: int = 200000, mode: str = 'append') -> None:
@@ -192,11 +353,11 @@ class MARIADB(object):
         :return: None
         """
         print(f"Creating table: {table_name}")
-        if self.connector is None:
-            self._set_connector()
         try:
-            cursor = self.connector.cursor()
-            cursor.execute(query)
+            with self.connection() as connector:
+                cursor = connector.cursor()
+                cursor.execute(query)
+                cursor.close()
         except ConnectionError as error:
             print(f"Could not create table {table_name}.. {error}")
 
@@ -207,13 +368,71 @@ class MARIADB(object):
         :param table_name: Name of the table we want to check
         :return: True if found, False otherwise
         """
-        if self.connector is None:
-            self._set_connector()
-        cursor = self.connector.cursor()
-        cursor.execute(f" SELECT COUNT(*) FROM information_schema.tables WHERE table_name = '{table_name}'")
-        if cursor.fetchone()[0] == 1:
-            return True
-        return False
+        with self.connection() as connector:
+            cursor = connector.cursor()
+            cursor.execute(f" SELECT COUNT(*) FROM information_schema.tables WHERE table_name = '{table_name}'")
+            found = cursor.fetchone()[0] == 1
+            cursor.close()
+        return found
+
+    def get_last_timestamp(self, table_name: str) -> Optional[pd.Timestamp]:
+        """
+        Gets the most recent DT stored in a table.
+        :param table_name: The table name, e.g. a currency pair
+        :return: The last DT, or None if the table does not exist or is empty
+        """
+        table_name = checked_table_name(table_name)
+        if not self.check_if_table_exists(table_name):
+            return None
+        with self.connection() as connector:
+            cursor = connector.cursor()
+            cursor.execute(f'SELECT MAX(DT) FROM {table_name}')
+            last = cursor.fetchone()[0]
+            cursor.close()
+        return None if last is None else pd.Timestamp(last)
+
+    def upsert_bars(self, data: pd.DataFrame, table_name: str) -> int:
+        """
+        Writes bars idempotently. Stored bars in the DT range of the new bars are deleted and the new
+        bars are inserted in executemany batches, all within one transaction. The table is created if it does not exist.
+        :param data: The bars with a DT column
+        :param table_name: The table name, e.g. a currency pair
+        :return: The number of written bars
+        """
+        table_name = checked_table_name(table_name)
+        data = deduplicate_bars(data)
+        if data.empty:
+            return 0
+        if not self.check_if_table_exists(table_name):
+            self.pd_insert_data(data, table_name)
+            return len(data)
+        columns = list(data.columns)
+        query = f'INSERT INTO {table_name} ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})'
+        with self.connection() as connector:
+            # The delete and the inserts are one transaction, so a failed insert keeps the stored bars
+            autocommit = connector.autocommit
+            connector.autocommit = False
+            cursor = connector.cursor()
+            try:
+                cursor.execute(f'DELETE FROM {table_name} WHERE DT BETWEEN ? AND ?',
+                               (data.DT.iloc[0].to_pydatetime(), data.DT.iloc[-1].to_pydatetime()))
+                executemany_batches(connector, query, data, columns, commit=False)
+                connector.commit()
+            except Exception:
+                connector.rollback()
+                raise
+            finally:
+                cursor.close()
+                connector.autocommit = autocommit
+        return len(data)
+
+    def prepare_concurrent_writes(self) -> None:
+        """
+        Creates the sqlAlchemy engine once, so writer threads share its connection pool.
+        :return: None.
+        """
+        if self.engine is None:
+            self._set_engine()
 
     def _set_engine(self) -> None:
         """
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Typed loading of candle frames.
+The declared schema is enforced on every frame that leaves the database layer. DT is parsed with an
+explicit format (or taken as-is when the driver returns native datetimes), prices can be downcast
+to float32 where the precision of the instrument allows it, and string columns such as the pair or
+the pattern names are stored as categoricals.
+"""
+from typing import Dict, Iterable
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype
+
+CANDLE_SCHEMA: Dict[str, str] = {'DT': 'datetime64[ns]',
+                                 'BUY': 'float64',
+                                 'SELL': 'float64',
+                                 'OPEN': 'float64',
+                                 'CLOSE': 'float64',
+                                 'HIGH': 'float64',
+                                 'LOW': 'float64',
+                                 'VOL': 'float64'}
+PRICE_COLUMNS = ('OPEN', 'HIGH', 'LOW', 'CLOSE')
+CATEGORICAL_COLUMNS = ('PAIR', 'SIGNAL', 'SINGLE_PATTERN', 'DUAL_PATTERN', 'TRIPLE_PATTERN', 'EXTREMA')
+DT_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def parse_datetimes(values: pd.Series, fmt: str = DT_FORMAT) -> pd.Series:
+    """
+    Parses a DT column without falling back to per-element format inference.
+    :param values: The DT column, as datetimes, datetime objects or strings.
+    :param fmt: The explicit format of string timestamps.
+    :return: The column as datetime64[ns].
+    """
+    if is_datetime64_any_dtype(values):
+        return values.astype('datetime64[ns]')
+    if len(values) and isinstance(values.iloc[0], str):
+        try:
+            parsed = pd.to_datetime(values, format=fmt)
+        except ValueError:
+            # Timestamps that do not follow the format are parsed the way get_bt_data always did
+            parsed = pd.to_datetime(values, dayfirst=True)
+    else:
+        parsed = pd.to_datetime(values)
+    return parsed.astype('datetime64[ns]')
+
+
+def can_downcast(values: pd.Series, decimals: int) -> bool:
+    """
+    Tests whether a float column survives a float32 round-trip at the precision of the instrument.
+    :param values: The float column.
+    :param decimals: The number of decimals that must be preserved, e.g. 5 for most FX pairs.
+    :return: True if the largest round-trip error is below half a unit in the last decimal.
+    """
+    original = values.to_numpy(dtype='float64')
+    error = np.abs(original.astype('float32').astype('float64') - original)
+    return bool(np.nanmax(error, initial=0.0) < 0.5 * 10 ** -decimals)
+
+
+def enforce_schema(df: pd.DataFrame, schema: Dict[str, str] = None, downcast: bool = False, decimals: int = 5,
+                   categoricals: Iterable[str] = CATEGORICAL_COLUMNS, report: bool = True) -> pd.DataFrame:
+    """
+    Casts a frame to the declared schema.
+    :param df: The frame as loaded from the database.
+    :param schema: The column dtypes, defaults to CANDLE_SCHEMA. All columns in the schema must be present.
+    :param downcast: Whether float columns are downcast to float32 where precision allows. The PRICE_COLUMNS
+                     are downcast only if all of them allow it.
+    :param decimals: The number of decimals that downcasting must preserve.
+    :param categoricals: The string columns to store as categoricals, if present.
+    :param report: Whether to print the memory usage before and after.
+    :return: The typed frame.
+    """
+    schema = schema or CANDLE_SCHEMA
+    missing = [column for column in schema if column not in df.columns]
+    if missing:
+        raise ValueError(f"Frame does not match the schema, missing columns: {missing}")
+    before = int(df.memory_usage(deep=True).sum())
+    df = df.copy()
+    # The prices of a bar are compared with each other, so they are downcast all together or not at all
+    prices = [column for column in PRICE_COLUMNS if column in schema and schema[column].startswith('float')]
+    downcast_prices = downcast and all(can_downcast(df[column], decimals) for column in prices)
+    for column, dtype in schema.items():
+        if column == 'DT' or dtype.startswith('datetime64'):
+            df[column] = parse_datetimes(df[column])
+        elif column in prices:
+            df[column] = df[column].astype('float32' if downcast_prices else dtype)
+        elif dtype.startswith('float') and downcast and can_downcast(df[column], decimals):
+            df[column] = df[column].astype('float32')
+        else:
+            df[column] = df[column].astype(dtype)
+    for column in [c for c in categoricals if c in df.columns]:
+        df[column] = df[column].astype('category')
+    if report:
+        after = int(df.memory_usage(deep=True).sum())
+        print(f"Typed load of {len(df)} rows: {round(before / 1024 ** 2, 2)} MB -> {round(after / 1024 ** 2, 2)} MB")
+    return df
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+The interface that every storage backend implements.
+main.py and the loaders only rely on these methods, so the MariaDB server can be swapped for an
+embedded database by changing the backend in the dbinfo config.
+"""
+import re
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Optional, Tuple
+
+import pandas as pd
+
+BT_COLUMNS = ['DT', 'BUY', 'SELL', 'OPEN', 'CLOSE', 'HIGH', 'LOW', 'VOL']
+TABLE_NAME = re.compile(r'^[A-Za-z0-9_]+$')
+
+
+def parse_date_range(start: str, end: str) -> Tuple[datetime, datetime]:
+    """
+    Validates a yyyymmdd date range and converts it to datetimes for parameter binding.
+    :param start: The start date
+    :param end: The end date
+    :return: A tuple with the start and end datetime
+    """
+    assert len(str(start)) == 8 and start.isdigit(), "Start date is not well-formed!"
+    assert len(str(end)) == 8 and end.isdigit(), "End date is not well-formed!"
+    assert end > start, "End date is prior or equals to start date!"
+    return datetime.strptime(start, '%Y%m%d'), datetime.strptime(end, '%Y%m%d')
+
+
+def checked_table_name(table_name: str) -> str:
+    """
+    Table names cannot be bound as parameters, so they are validated before being put into a query.
+    :param table_name: The table name, e.g. a currency pair
+    :return: The table name if it is a plain identifier
+    """
+    if not TABLE_NAME.match(table_name):
+        raise ValueError(f"'{table_name}' is not a valid table name")
+    return table_name
+
+
+def deduplicate_bars(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Prepares bars for an upsert: duplicate timestamps keep their last bar and rows are sorted by DT.
+    Missing BT_COLUMNS, e.g. BUY and SELL of fetched bars, are added as NaN, so the stored table can be
+    read by get_bt_data.
+    :param data: The bars with a DT column.
+    :return: The deduplicated bars with the BT_COLUMNS first.
+    """
+    data = data.drop_duplicates('DT', keep='last').sort_values('DT').reset_index(drop=True)
+    data = data.assign(**{column: float('nan') for column in BT_COLUMNS if column not in data.columns})
+    return data[BT_COLUMNS + [column for column in data.columns if column not in BT_COLUMNS]]
+
+
+class StorageBackend(ABC):
+    """
+    Abstract storage backend for candle and event data.
+    """
+
+    @abstractmethod
+    def get_bt_data(self, start: str, end: str, pair: str) -> pd.DataFrame:
+        """
+        Gets the backtest view of a pair between two dates.
+        :param start: The start date as yyyymmdd
+        :param end: The end date as yyyymmdd
+        :param pair: The corresponding currency pair
+        :return: A Pandas DataFrame with the candle schema
+        """
+
+    @abstractmethod
+    def get_entire_table(self, table_name: str) -> pd.DataFrame:
+        """
+        Gets every row of a table.
+        :param table_name: The table name to extract data from
+        :return: A Pandas DataFrame that contains the data
+        """
+
+    @abstractmethod
+    def pd_insert_data(self, data: pd.DataFrame, table_name: str, schema: list = None,
+                       chunks: int = 200000, mode: str = 'append') -> None:
+        """
+        Inserts a Pandas DataFrame into a table, creating the table if it does not exist.
+        :param data: The data in form of a Pandas DataFrame
+        :param table_name: The table name to insert into
+        :param schema: The table schema
+        :param chunks: Defined chunk size to write at a time
+        :param mode: 'append', 'replace' or 'fail' if the table exists
+        :return: None
+        """
+
+    @abstractmethod
+    def create_table(self, query: str, table_name: str) -> None:
+        """
+        Creates a table from a CREATE TABLE query.
+        :param query: The corresponding query with schema
+        :param table_name: Table name for the new table
+        :return: None
+        """
+
+    @abstractmethod
+    def check_if_table_exists(self, table_name: str) -> bool:
+        """
+        Checks if a table exists in the database.
+        :param table_name: Name of the table we want to check
+        :return: True if found, False otherwise
+        """
+
+    @abstractmethod
+    def get_last_timestamp(self, table_name: str) -> Optional[pd.Timestamp]:
+        """
+        Gets the most recent DT stored in a table.
+        :param table_name: The table name, e.g. a currency pair
+        :return: The last DT, or None if the table does not exist or is empty
+        """
+
+    def prepare_concurrent_writes(self) -> None:
+        """
+        Prepares the backend for pd_insert_data calls from several threads, e.g. by creating a shared
+        connection pool up front. Backends that need nothing leave this as is.
+        :return: None
+        """
+
+    @abstractmethod
+    def upsert_bars(self, data: pd.DataFrame, table_name: str) -> int:
+        """
+        Writes bars idempotently. Stored bars in the DT range of the new bars are replaced, so an
+        overlapping or repeated refresh never creates duplicates. The table is created if needed.
+        :param data: The bars with a DT column
+        :param table_name: The table name, e.g. a currency pair
+        :return: The number of written bars
+        """
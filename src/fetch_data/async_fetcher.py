@@ -0,0 +1,307 @@
+"""
+Fetches intraday bars for the whole symbol universe concurrently.
+The universe is read from config/crypto.yaml, fx_pairs.yaml and stocks.yaml. Requests share one
+pooled aiohttp session, are paced by a token bucket to respect the API rate limit, and are retried
+with jittered exponential backoff. Every parsed symbol is handed to a sink as soon as it arrives,
+so bars are written to storage while the remaining symbols are still being fetched.
+"""
+# Global imports
+import asyncio
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import aiohttp
+import numpy as np
+import pandas as pd
+import yaml
+
+# Local imports
+from src.db.storage_backend import StorageBackend
+from src.fetch_data.incremental import api_now, bars_since, choose_outputsize
+
+ALPHAVANTAGE_URL = 'https://www.alphavantage.co/query'
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class Symbol(NamedTuple):
+    """
+    A symbol of the universe. Stocks have no market.
+    """
+    kind: str
+    symbol: str
+    market: Optional[str] = None
+
+    @property
+    def table(self) -> str:
+        return f"{self.symbol}{self.market or ''}"
+
+
+class FetchError(Exception):
+    """
+    Raised when a response is an API error. Rate limit notes are retryable.
+    """
+
+    def __init__(self, message: str, retryable: bool = False) -> None:
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def load_symbols(config_dir: Path) -> List[Symbol]:
+    """
+    Reads the symbol universe from the config files.
+    Crypto eur_pairs are quoted in EUR, FX pairs in the currency of their section and stocks as is.
+    :param config_dir: The config folder.
+    :return: The list of symbols.
+    """
+    symbols = []
+    with open(Path(config_dir) / 'crypto.yaml') as stream:
+        symbols += [Symbol('crypto', s, 'EUR') for s in yaml.safe_load(stream).get('eur_pairs') or []]
+    with open(Path(config_dir) / 'fx_pairs.yaml') as stream:
+        fx = yaml.safe_load(stream)
+    for section, market in (('usd_pairs', 'USD'), ('eur_pairs', 'EUR')):
+        symbols += [Symbol('fx', s, market) for s in fx.get(section) or []]
+    with open(Path(config_dir) / 'stocks.yaml') as stream:
+        for section in yaml.safe_load(stream).values():
+            symbols += [Symbol('stock', s) for s in section or []]
+    return symbols
+
+
+def query_params(symbol: Symbol, api_key: str, interval: str, outputsize: str) -> Dict[str, str]:
+    """
+    Builds the query parameters of the intraday endpoint of a symbol.
+    :param symbol: The symbol.
+    :param api_key: The API key.
+    :param interval: The bar interval, e.g. '1min'.
+    :param outputsize: 'compact' or 'full'.
+    :return: The query parameters.
+    """
+    params = {'interval': interval, 'outputsize': outputsize, 'apikey': api_key}
+    if symbol.kind == 'fx':
+        params.update(function='FX_INTRADAY', from_symbol=symbol.symbol, to_symbol=symbol.market)
+    elif symbol.kind == 'crypto':
+        params.update(function='CRYPTO_INTRADAY', symbol=symbol.symbol, market=symbol.market)
+    else:
+        params.update(function='TIME_SERIES_INTRADAY', symbol=symbol.symbol)
+    return params
+
+
+def parse_bars(payload: dict) -> pd.DataFrame:
+    """
+    Parses an intraday response into bars.
+    :param payload: The decoded JSON response.
+    :return: A DataFrame with DT, OPEN, HIGH, LOW, CLOSE and VOL, sorted by DT. The API has no BUY and
+             SELL, upsert_bars stores them as NULL.
+    """
+    if 'Error Message' in payload:
+        raise FetchError(payload['Error Message'])
+    if 'Note' in payload or 'Information' in payload:
+        raise FetchError(payload.get('Note') or payload.get('Information'), retryable=True)
+    key = next((k for k in payload if k.startswith('Time Series')), None)
+    if key is None:
+        raise FetchError(f"No time series in response with keys {list(payload)}")
+    df = pd.DataFrame.from_dict(payload[key], orient='index')
+    # '1. open' -> 'OPEN', '5. volume' -> 'VOL'
+    df.columns = [c.split(' ', 1)[-1].upper().replace('VOLUME', 'VOL') for c in df.columns]
+    df = df.astype('float64')
+    if 'VOL' not in df.columns:
+        df['VOL'] = 0.0
+    df.insert(0, 'DT', pd.to_datetime(df.index, format='%Y-%m-%d %H:%M:%S'))
+    return df[['DT', 'OPEN', 'HIGH', 'LOW', 'CLOSE', 'VOL']].sort_values('DT').reset_index(drop=True)
+
+
+class TokenBucket(object):
+    """
+    Async token bucket. Tokens are refilled continuously at a fixed rate up to the capacity.
+    """
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """
+        Waits until a token is available and takes it.
+        :return: None.
+        """
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AsyncFetcher(object):
+    """
+    Concurrent intraday fetcher for a symbol universe.
+    """
+
+    def __init__(self, api_key: str, base_url: str = ALPHAVANTAGE_URL, rate: float = 5 / 60, burst: int = 5,
+                 concurrency: int = 8, retries: int = 4, backoff: float = 1.0, timeout: float = 30.0,
+                 interval: str = '1min', outputsize: str = 'full') -> None:
+        self.api_key = api_key
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.interval = interval
+        self.outputsize = outputsize
+        self.bucket = TokenBucket(rate, burst)
+        self.latencies: List[float] = []
+        self.failed: Dict[Symbol, str] = {}
+        self.outputsizes: Counter = Counter()
+
+    async def fetch_symbol(self, session: aiohttp.ClientSession, symbol: Symbol,
+                           outputsize: Optional[str] = None) -> pd.DataFrame:
+        """
+        Fetches and parses the bars of one symbol, retrying transient failures with jitter.
+        :param session: The shared session.
+        :param symbol: The symbol.
+        :param outputsize: Overrides the outputsize of the fetcher.
+        :return: The parsed bars.
+        """
+        params = query_params(symbol, self.api_key, self.interval, outputsize or self.outputsize)
+        for attempt in range(self.retries + 1):
+            await self.bucket.acquire()
+            start = time.perf_counter()
+            try:
+                async with session.get(self.base_url, params=params) as response:
+                    if response.status in RETRY_STATUS:
+                        raise FetchError(f"HTTP {response.status}", retryable=True)
+                    response.raise_for_status()
+                    payload = await response.json(content_type=None)
+                self.latencies.append(time.perf_counter() - start)
+                return parse_bars(payload)
+            except (aiohttp.ClientError, asyncio.TimeoutError, FetchError) as e:
+                if (isinstance(e, FetchError) and not e.retryable) or attempt == self.retries:
+                    raise
+                await asyncio.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    async def run(self, symbols: List[Symbol], sink: Callable[[Symbol, pd.DataFrame], None],
+                  backend: Optional[StorageBackend] = None) -> None:
+        """
+        Fetches every symbol and passes the bars to the sink in order of arrival.
+        The sink runs in a single writer thread, so slow storage does not stall the event loop and
+        writes to the backend connection are never concurrent.
+        With a backend the refresh is incremental: the last stored DT of every symbol decides between
+        the compact and the full output, and only the bars from that DT onwards reach the sink.
+        :param symbols: The universe.
+        :param sink: Called with the symbol and its bars.
+        :param backend: The backend to look up the last stored DT in, if the refresh is incremental.
+        :return: None.
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        writer = ThreadPoolExecutor(max_workers=1)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            async def fetch_and_store(symbol: Symbol) -> None:
+                last_dt, outputsize = None, self.outputsize
+                if backend is not None:
+                    try:
+                        last_dt = await loop.run_in_executor(writer, backend.get_last_timestamp, symbol.table)
+                    except Exception as e:
+                        print(f"Encountered {e} while reading the last DT of {symbol.table}")
+                        self.failed[symbol] = str(e)
+                        return
+                    outputsize = choose_outputsize(last_dt, self.interval, now=api_now(symbol.kind))
+                async with semaphore:
+                    try:
+                        bars = bars_since(await self.fetch_symbol(session, symbol, outputsize), last_dt)
+                    except Exception as e:
+                        print(f"Encountered {e} while fetching {symbol.table}")
+                        self.failed[symbol] = str(e)
+                        return
+                self.outputsizes[outputsize] += 1
+                try:
+                    await loop.run_in_executor(writer, sink, symbol, bars)
+                except Exception as e:
+                    print(f"Encountered {e} while storing {symbol.table}")
+                    self.failed[symbol] = str(e)
+
+            try:
+                await asyncio.gather(*(fetch_and_store(symbol) for symbol in symbols))
+            finally:
+                writer.shutdown()
+
+    def fetch(self, symbols: List[Symbol], sink: Callable[[Symbol, pd.DataFrame], None],
+              backend: Optional[StorageBackend] = None) -> Dict[str, float]:
+        """
+        Runs the fetcher to completion and prints the latency report.
+        :param symbols: The universe.
+        :param sink: Called with the symbol and its bars.
+        :param backend: The backend to look up the last stored DT in, if the refresh is incremental.
+        :return: The latency report.
+        """
+        start = time.perf_counter()
+        asyncio.run(self.run(symbols, sink, backend))
+        report = self.report()
+        print(f"Fetched {len(symbols) - len(self.failed)}/{len(symbols)} symbols in "
+              f"{round(time.perf_counter() - start, 2)} seconds ({dict(self.outputsizes)}). "
+              f"Latency p50: {report['p50']}s, p90: {report['p90']}s, p99: {report['p99']}s")
+        return report
+
+    def refresh(self, symbols: List[Symbol], backend: StorageBackend) -> Dict[str, float]:
+        """
+        Incrementally refreshes the stored bars of every symbol.
+        :param symbols: The universe.
+        :param backend: The storage backend.
+        :return: The latency report.
+        """
+        return self.fetch(symbols, upsert_sink(backend), backend=backend)
+
+    def report(self) -> Dict[str, float]:
+        """
+        Summarizes the latencies of the successful requests.
+        :return: A dictionary with the request count and the p50, p90, p99 and max latency in seconds.
+        """
+        if not self.latencies:
+            return {'requests': 0, 'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'max': 0.0}
+        p50, p90, p99 = np.percentile(self.latencies, [50, 90, 99])
+        return {'requests': len(self.latencies), 'p50': round(float(p50), 4), 'p90': round(float(p90), 4),
+                'p99': round(float(p99), 4), 'max': round(max(self.latencies), 4)}
+
+
+def storage_sink(backend: StorageBackend) -> Callable[[Symbol, pd.DataFrame], None]:
+    """
+    Creates a sink that appends the bars of every symbol to its table.
+    :param backend: The storage backend.
+    :return: The sink.
+    """
+    def sink(symbol: Symbol, bars: pd.DataFrame) -> None:
+        backend.pd_insert_data(data=bars, table_name=symbol.table)
+    return sink
+
+
+def upsert_sink(backend: StorageBackend) -> Callable[[Symbol, pd.DataFrame], None]:
+    """
+    Creates a sink that upserts the bars of every symbol into its table.
+    :param backend: The storage backend.
+    :return: The sink.
+    """
+    def sink(symbol: Symbol, bars: pd.DataFrame) -> None:
+        print(f"{symbol.table}: upserted {backend.upsert_bars(bars, symbol.table)} bars")
+    return sink
+
+
+if __name__ == '__main__':
+    from src.db.db_utility import establish_connection
+
+    project_root = Path.cwd().parent.parent
+    universe = load_symbols(project_root / "config")
+    db = establish_connection(str(project_root / "config" / "mariadb.yaml"), database="intraday")
+    AsyncFetcher(os.environ["ALPHAVANTAGE_KEY"]).refresh(universe, db)
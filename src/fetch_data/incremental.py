@@ -0,0 +1,64 @@
+"""
+Helpers for incremental refreshes of intraday bars.
+Given the last DT stored for a symbol, only the compact output is requested when it reaches back far
+enough, and only the bars from the last stored DT onwards are kept. The last stored bar is included
+again, as it may have been written while still in progress.
+The API stamps FX and crypto bars in UTC and stock bars in US/Eastern, without a timezone, so the last
+stored DT is compared with the current time in that timezone.
+"""
+# Global imports
+from typing import Optional
+
+import pandas as pd
+
+COMPACT_BARS = 100
+API_TIMEZONES = {'fx': 'UTC', 'crypto': 'UTC'}
+STOCK_TIMEZONE = 'US/Eastern'
+
+
+def api_now(kind: str) -> pd.Timestamp:
+    """
+    Gets the current time in the timezone of the API timestamps of a symbol kind.
+    :param kind: The symbol kind, 'fx', 'crypto' or anything else for stocks.
+    :return: The current time, without timezone like the stored DT.
+    """
+    return pd.Timestamp.now(tz=API_TIMEZONES.get(kind, STOCK_TIMEZONE)).tz_localize(None)
+
+
+def interval_length(interval: str) -> pd.Timedelta:
+    """
+    Converts an Alpha Vantage interval to a duration.
+    :param interval: The interval, e.g. '1min' or '60min'.
+    :return: The duration of one bar.
+    """
+    assert interval.endswith('min') and interval[:-3].isdigit(), f"Unsupported interval '{interval}'!"
+    return pd.Timedelta(minutes=int(interval[:-3]))
+
+
+def choose_outputsize(last_dt: Optional[pd.Timestamp], interval: str, now: Optional[pd.Timestamp] = None,
+                      compact_bars: int = COMPACT_BARS) -> str:
+    """
+    Chooses the smallest output that still overlaps the stored bars.
+    :param last_dt: The last stored DT, or None if nothing is stored yet.
+    :param interval: The bar interval.
+    :param now: The current time in the timezone of the API timestamps, see api_now. Defaults to UTC.
+    :param compact_bars: The number of bars in the compact output.
+    :return: 'compact' if the compact output reaches back to last_dt, 'full' otherwise.
+    """
+    if last_dt is None:
+        return 'full'
+    now = now if now is not None else api_now('fx')
+    return 'compact' if now - last_dt < (compact_bars - 1) * interval_length(interval) else 'full'
+
+
+def bars_since(bars: pd.DataFrame, last_dt: Optional[pd.Timestamp]) -> pd.DataFrame:
+    """
+    Keeps the bars from the last stored DT onwards, without duplicate timestamps.
+    :param bars: The fetched bars with a DT column.
+    :param last_dt: The last stored DT, or None to keep every bar.
+    :return: The delta to upsert.
+    """
+    bars = bars.drop_duplicates('DT', keep='last')
+    if last_dt is not None:
+        bars = bars[bars.DT >= last_dt]
+    return bars.sort_values('DT').reset_index(drop=True)
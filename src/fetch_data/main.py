@@ -2,10 +2,13 @@ from alpha_vantage.foreignexchange import ForeignExchange
 from google.cloud import bigquery
 from pprint import pprint
 import json, os
+import pandas as pd
+
+from src.fetch_data.incremental import api_now, choose_outputsize
 
 
 class BQHandler:
-    def __init__(self, api_key, from_curr, to_curr):
+    def __init__(self, api_key, from_curr, to_curr, incremental=False):
         self.key = api_key
         self.exchange = ForeignExchange(key=self.key)
         self.interval = "1min"
@@ -17,14 +20,36 @@ class BQHandler:
         self.table_id = "major_intraday_1min"
         self.table_ref = self.client.dataset(self.dataset_id).table(self.table_id)
         self.table = self.client.get_table(self.table_ref)
+        self.incremental = incremental
+
+    def get_last_timestamp(self):
+        """
+        Gets the last stored DT of the pair, or None if the pair has no rows yet.
+        """
+        query = (f"SELECT MAX(DT) AS LAST_DT FROM `{self.dataset_id}.{self.table_id}` "
+                 "WHERE FROM_CURR = @from_curr AND TO_CURR = @to_curr")
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter("from_curr", "STRING", self.from_curr),
+            bigquery.ScalarQueryParameter("to_curr", "STRING", self.to_curr)])
+        rows = list(self.client.query(query, job_config=job_config).result())
+        return pd.Timestamp(rows[0].LAST_DT).tz_localize(None) if rows and rows[0].LAST_DT is not None else None
 
     # def write_to_BQ():
     def get_intraday_data(self):
+        """
+        In incremental mode only the compact output is requested when it reaches back to the last
+        stored bar, and only the bars from that bar onwards are returned.
+        """
+        last_dt = self.get_last_timestamp() if self.incremental else None
+        outputsize = choose_outputsize(last_dt, self.interval, now=api_now('fx')) if self.incremental \
+            else self.outputsize
         response = self.exchange.get_currency_exchange_intraday(from_symbol=self.from_curr
                                                                 , to_symbol=self.to_curr
                                                                 , interval=self.interval
-                                                                , outputsize=self.outputsize)
-        return response[0]
+                                                                , outputsize=outputsize)
+        if last_dt is None:
+            return response[0]
+        return {ts: bar for ts, bar in response[0].items() if pd.Timestamp(ts) >= last_dt}
 
 
 def invoke(msg, _):
@@ -32,16 +57,18 @@ def invoke(msg, _):
     api_key = msg['attributes'].get("Key")
     from_curr = msg['attributes'].get("from_curr")
     to_curr = msg['attributes'].get("to_curr")
+    incremental = str(msg['attributes'].get("incremental", "false")).lower() == "true"
 
-    api_handler = BQHandler(api_key, from_curr, to_curr)
+    api_handler = BQHandler(api_key, from_curr, to_curr, incremental=incremental)
     return api_handler.get_intraday_data()
 
 
-with open("example.json") as f:
-    data = json.load(f)
-    meta_key = list(data.keys())[0]
-    timestamps = list(data[meta_key].keys())
-    keys = list(data[meta_key][timestamps[0]].keys())
-    vals = list(data[meta_key][timestamps[0]].values())
-    print(list(zip(keys,vals)))
-    #print(list(data[meta_key][timestamps[0]].values()))
+if __name__ == '__main__':
+    with open("example.json") as f:
+        data = json.load(f)
+        meta_key = list(data.keys())[0]
+        timestamps = list(data[meta_key].keys())
+        keys = list(data[meta_key][timestamps[0]].keys())
+        vals = list(data[meta_key][timestamps[0]].values())
+        print(list(zip(keys,vals)))
+        #print(list(data[meta_key][timestamps[0]].values()))
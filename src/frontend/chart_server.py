@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Local web server for exploring a backtest.
+Serves a candlestick page and a /range endpoint that returns the bars, patterns and trendlines of a
+time window at the level of detail that fits the screen, read from a precomputed LODPyramid. The page
+requests a new window whenever the chart is panned or zoomed, so only a few thousand candles are ever
+sent. Per-request latencies are available on /stats. Uses the standard library only; plotly.js is
+served from the installed plotly package.
+"""
+import json
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from src.frontend.lod import LODPyramid, lod_hover_text
+from src.frontend.pattern_arrays import trendline_frame
+from src.patterns.pattern import Pattern
+from src.simulate.result_cache import ResultCache
+
+DT_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>Backtest</title><script src="/plotly.js"></script></head>
+<body style="margin:0">
+<div id="chart" style="width:100vw;height:100vh"></div>
+<script>
+var gd = document.getElementById('chart'), pending = null, listening = false;
+function onRelayout(e) {
+    clearTimeout(pending);
+    if (e['xaxis.autorange']) { pending = setTimeout(load, 150); }
+    else if (e['xaxis.range[0]'] !== undefined) {
+        pending = setTimeout(function () { load(e['xaxis.range[0]'], e['xaxis.range[1]']); }, 150);
+    }
+}
+function load(start, end) {
+    var query = '/range?target=' + Math.max(200, Math.round(gd.clientWidth / 2));
+    if (start && end) { query += '&start=' + encodeURIComponent(start) + '&end=' + encodeURIComponent(end); }
+    fetch(query).then(function (r) { return r.json(); }).then(function (w) {
+        var c = w.candles, x = [], y = [];
+        w.trendlines.forEach(function (t) { x.push(t.DT0, t.DT1, null); y.push(t.Y0, t.Y1, null); });
+        var data = [
+            {type: 'candlestick', name: 'Candles', x: c.DT, open: c.OPEN, high: c.HIGH, low: c.LOW, close: c.CLOSE,
+             text: c.TEXT, hoverinfo: 'text'},
+            {type: 'scatter', mode: 'markers', name: 'Patterns', x: w.patterns.DT, y: w.patterns.HIGH,
+             text: w.patterns.PATTERN, hoverinfo: 'text', marker: {symbol: 'triangle-down', size: 8}},
+            {type: 'scatter', mode: 'lines', name: 'Trendlines', x: x, y: y, hoverinfo: 'skip'}];
+        var layout = {title: w.bars_per_candle + ' bar(s) per candle', uirevision: 'keep',
+                      xaxis: {rangeslider: {visible: false}}};
+        if (start && end) { layout.xaxis.range = [start, end]; }
+        Plotly.react(gd, data, layout);
+        if (!listening) { gd.on('plotly_relayout', onRelayout); listening = true; }
+    });
+}
+load();
+</script>
+</body>
+</html>
+"""
+
+
+def window_payload(pyramid: LODPyramid, trendlines: pd.DataFrame, start: Optional[pd.Timestamp],
+                   end: Optional[pd.Timestamp], target_candles: int) -> dict:
+    """
+    Collects everything the page draws for a time window.
+    :param pyramid: The LODPyramid of the data.
+    :param trendlines: The trendlines as returned by trendline_frame.
+    :param start: The start of the window, or None for the first bar.
+    :param end: The end of the window, or None for the last bar.
+    :param target_candles: The maximum number of candles.
+    :return: A JSON-serializable dict with candles, patterns, trendlines and the bars per candle.
+    """
+    candles = pyramid.window(start, end, target_candles)
+    found = candles[candles.LEVEL > 0]
+    if len(candles):
+        first, last = candles.DT.iloc[0], candles.DT.iloc[-1]
+        visible = trendlines[(trendlines.DT1 >= first) & (trendlines.DT0 <= last)]
+    else:
+        visible = trendlines.iloc[:0]
+    return {'candles': {'DT': candles.DT.dt.strftime(DT_FORMAT).tolist(),
+                        'OPEN': candles.OPEN.tolist(),
+                        'HIGH': candles.HIGH.tolist(),
+                        'LOW': candles.LOW.tolist(),
+                        'CLOSE': candles.CLOSE.tolist(),
+                        'TEXT': lod_hover_text(candles).tolist()},
+            'patterns': {'DT': found.DT.dt.strftime(DT_FORMAT).tolist(),
+                         'HIGH': found.HIGH.tolist(),
+                         'PATTERN': found.PATTERN.tolist()},
+            'trendlines': [{'KIND': row.KIND, 'DT0': row.DT0.strftime(DT_FORMAT), 'Y0': row.Y0,
+                            'DT1': row.DT1.strftime(DT_FORMAT), 'Y1': row.Y1, 'SLOPE': row.SLOPE}
+                           for row in visible.itertuples()],
+            'bars_per_candle': int(candles.BARS.max()) if len(candles) else 0}
+
+
+class ChartServer(object):
+    """
+    Serves the candlestick page of one dataset on a ThreadingHTTPServer.
+    """
+
+    def __init__(self, pyramid: LODPyramid, trendlines: pd.DataFrame = None, host: str = '127.0.0.1',
+                 port: int = 8050, target_candles: int = 2000) -> None:
+        self.pyramid = pyramid
+        self.trendlines = trendlines if trendlines is not None else trendline_frame(Pattern)
+        self.target_candles = target_candles
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self._plotlyjs = None
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @classmethod
+    def from_backtest(cls, df: pd.DataFrame, pattern: Pattern, cache_dir: Path = None,
+                      detector_config: Optional[dict] = None, **kwargs) -> 'ChartServer':
+        """
+        Creates a server for a finished backtest. With a cache_dir the pyramid and the trendlines are
+        stored as Parquet in a subdirectory keyed by the digest of the data and the detector config, and
+        loaded from there if they already exist.
+        :param df: The data of the backtest.
+        :param pattern: The Pattern class or instance holding the detected Points.
+        :param cache_dir: The directory of the cached columnar results.
+        :param detector_config: The config the patterns were detected with, part of the cache key.
+        :param kwargs: Passed on to ChartServer.
+        :return: The ChartServer.
+        """
+        if cache_dir is not None:
+            cache_dir = Path(cache_dir) / ResultCache.pattern_key(df, detector_config)
+            # The trendlines are written last, so they mark a complete entry
+            if (cache_dir / 'trendlines.parquet').exists():
+                return cls.from_cache(cache_dir, **kwargs)
+        pyramid, trendlines = LODPyramid.build(df, pattern), trendline_frame(pattern)
+        if cache_dir is not None:
+            pyramid.to_parquet(cache_dir)
+            trendlines.to_parquet(cache_dir / 'trendlines.parquet', index=False)
+        return cls(pyramid, trendlines, **kwargs)
+
+    @classmethod
+    def from_cache(cls, cache_dir: Path, **kwargs) -> 'ChartServer':
+        """
+        Creates a server from the cached columnar results of from_backtest.
+        :param cache_dir: The directory of the cached columnar results.
+        :param kwargs: Passed on to ChartServer.
+        :return: The ChartServer.
+        """
+        trendlines = pd.read_parquet(Path(cache_dir) / 'trendlines.parquet')
+        return cls(LODPyramid.from_parquet(cache_dir), trendlines, **kwargs)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def plotlyjs(self) -> bytes:
+        """
+        Returns the plotly.js bundle of the installed plotly package, read once.
+        :return: The script.
+        """
+        if self._plotlyjs is None:
+            from plotly.offline import get_plotlyjs
+            self._plotlyjs = get_plotlyjs().encode()
+        return self._plotlyjs
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Summarizes the request latencies per endpoint.
+        :return: A dictionary from path to the request count and the p50, p90, p99 and max latency in ms.
+        """
+        with self._lock:
+            latencies = {path: list(values) for path, values in self.latencies.items()}
+        summary = {}
+        for path, values in latencies.items():
+            p50, p90, p99 = np.percentile(values, [50, 90, 99]) * 1000
+            summary[path] = {'requests': len(values), 'p50_ms': round(float(p50), 2), 'p90_ms': round(float(p90), 2),
+                             'p99_ms': round(float(p99), 2), 'max_ms': round(max(values) * 1000, 2)}
+        return summary
+
+    def start(self) -> None:
+        """
+        Serves in a background thread.
+        :return: None.
+        """
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        print(f"Serving the chart on {self.url}")
+
+    def serve_forever(self) -> None:
+        """
+        Serves in the calling thread until interrupted.
+        :return: None.
+        """
+        print(f"Serving the chart on {self.url}")
+        try:
+            self.httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+    def shutdown(self) -> None:
+        """
+        Stops the server and prints the latency summary.
+        :return: None.
+        """
+        if self._thread is not None:
+            self.httpd.shutdown()
+            self._thread.join()
+        self.httpd.server_close()
+        for path, summary in self.stats().items():
+            print(f"{path}: {summary}")
+
+    def _range(self, query: Dict[str, List[str]]) -> dict:
+        """
+        Answers a /range request.
+        :param query: The parsed query string with optional start, end and target.
+        :return: The window payload.
+        """
+        start = pd.Timestamp(query['start'][0]) if 'start' in query else None
+        end = pd.Timestamp(query['end'][0]) if 'end' in query else None
+        target = int(query['target'][0]) if 'target' in query else self.target_candles
+        return window_payload(self.pyramid, self.trendlines, start, end, min(target, self.target_candles))
+
+    def _handler(self) -> type:
+        """
+        Creates the request handler class bound to this server.
+        :return: The handler class.
+        """
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self) -> None:
+                start = time.perf_counter()
+                url = urlparse(self.path)
+                try:
+                    if url.path == '/':
+                        self._send(200, 'text/html; charset=utf-8', PAGE.encode())
+                    elif url.path == '/plotly.js':
+                        self._send(200, 'application/javascript', server.plotlyjs())
+                    elif url.path == '/range':
+                        self._send(200, 'application/json', json.dumps(server._range(parse_qs(url.query))).encode())
+                    elif url.path == '/stats':
+                        self._send(200, 'application/json', json.dumps(server.stats()).encode())
+                    else:
+                        self._send(404, 'text/plain', b'Not found')
+                except (ValueError, KeyError) as e:
+                    self._send(400, 'text/plain', str(e).encode())
+                with server._lock:
+                    server.latencies[url.path].append(time.perf_counter() - start)
+
+            def _send(self, status: int, content_type: str, body: bytes) -> None:
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_) -> None:
+                pass
+
+        return Handler
+
+
+if __name__ == '__main__':
+    ChartServer.from_cache(Path(sys.argv[1])).serve_forever()
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
 from src.patterns.pattern import Pattern
 
@@ -95,3 +96,39 @@ def hover_content_by_object_list_comprehension(dt: datetime,
                         low_price=low_price, signal=signal, single_pattern=single_pattern, dual_pattern=dual_pattern,
                         extrema=extrema)
     return standard
+
+
+def format_timestamps(dts: pd.Series) -> pd.Series:
+    """
+    Formats timestamps as str() does for every single timestamp.
+    :param dts: The DT column.
+    :return: The formatted timestamps.
+    """
+    values = dts.to_numpy(dtype='datetime64[ns]').astype('int64')
+    if (values % 10 ** 9 == 0).all():
+        # Without fractional seconds, the column-wise format equals str() of every timestamp
+        return dts.astype(str)
+    return pd.Series([str(dt) for dt in dts], index=dts.index)
+
+
+def hover_text_columnwise(df: pd.DataFrame, patterns: pd.DataFrame) -> pd.Series:
+    """
+    Builds the hover text of every candle column-wise from the price columns and the pattern columns
+    of src.frontend.pattern_arrays.pattern_frame. The text is identical to st_hover, row by row.
+    :param df: The data with DT, OPEN, CLOSE, HIGH and LOW columns.
+    :param patterns: The per-bar SIGNAL, SINGLE_PATTERN, DUAL_PATTERN and EXTREMA columns.
+    :return: A Series of hover strings aligned with df.
+    """
+    # Prices are formatted as float64, as the rows of the mixed-dtype frame always were
+    prices = {column: np.array(list(map(str, df[column].to_numpy(dtype='float64').tolist())), dtype=object)
+              for column in ('OPEN', 'CLOSE', 'HIGH', 'LOW')}
+    text = format_timestamps(df.DT).to_numpy(dtype=object) + '<br>Open: ' + prices['OPEN'] + \
+        '<br>Close: ' + prices['CLOSE'] + '<br>High: ' + prices['HIGH'] + '<br>Low: ' + prices['LOW']
+    for column, label, missing in (('SIGNAL', 'Signal', 'None'),
+                                   ('SINGLE_PATTERN', 'Single Pattern', 'None'),
+                                   ('DUAL_PATTERN', 'Dual Pattern', 'None'),
+                                   ('EXTREMA', 'Extrema', '')):
+        values = patterns[column].to_numpy(dtype=object)
+        shown = values != missing
+        text[shown] = text[shown] + ('<br>' + label + ': ') + values[shown]
+    return pd.Series(text, index=df.index)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Level-of-detail pyramid for candlestick charts.
+Level 0 holds the bars, every further level merges a fixed number of candles of the level below into
+one OHLC candle. A candle keeps the strongest pattern among the bars it covers (triple over dual over
+single, the earliest on ties), so detections stay visible at every zoom level. The pyramid is built
+once per dataset; a window query only picks a level and slices it.
+"""
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.frontend.pattern_arrays import pattern_frame
+from src.patterns.pattern import Pattern
+
+LOD_COLUMNS = ['DT', 'OPEN', 'HIGH', 'LOW', 'CLOSE', 'VOL', 'BARS', 'LEVEL', 'PATTERN', 'PATTERN_DT']
+PATTERN_LEVELS = {0: 'None', 1: 'Single', 2: 'Dual', 3: 'Triple'}
+
+
+def strongest_patterns(patterns: pd.DataFrame) -> pd.DataFrame:
+    """
+    Picks the strongest pattern of every bar.
+    :param patterns: The per-bar columns as returned by pattern_frame.
+    :return: A DataFrame with LEVEL (0 none, 1 single, 2 dual, 3 triple) and the PATTERN label.
+    """
+    conditions = [patterns.TRIPLE_PATTERN != 'None',
+                  patterns.DUAL_PATTERN != 'None',
+                  patterns.SINGLE_PATTERN != 'None']
+    level = np.select(conditions, [3, 2, 1], 0)
+    label = np.select(conditions, [patterns.TRIPLE_PATTERN, patterns.DUAL_PATTERN, patterns.SINGLE_PATTERN], 'None')
+    return pd.DataFrame({'LEVEL': level.astype(np.int8), 'PATTERN': label.astype(object)}, index=patterns.index)
+
+
+def base_level(df: pd.DataFrame, pattern: Pattern) -> pd.DataFrame:
+    """
+    Builds level 0 of the pyramid from the bars and the detected patterns.
+    :param df: The data with DT, OPEN, HIGH, LOW, CLOSE and VOL columns.
+    :param pattern: The Pattern class or instance holding the detected Points.
+    :return: The bars with the LOD_COLUMNS.
+    """
+    strongest = strongest_patterns(pattern_frame(df, pattern))
+    level = df[['DT', 'OPEN', 'HIGH', 'LOW', 'CLOSE', 'VOL']].reset_index(drop=True)
+    level = level.assign(BARS=np.ones(len(df), dtype=np.int64),
+                         LEVEL=strongest.LEVEL.to_numpy(),
+                         PATTERN=strongest.PATTERN.to_numpy(),
+                         PATTERN_DT=df.DT.to_numpy())
+    return level[LOD_COLUMNS]
+
+
+def lod_hover_text(candles: pd.DataFrame) -> pd.Series:
+    """
+    Builds the hover text of LOD candles column-wise: the OHLC values, the number of merged bars and
+    the strongest pattern.
+    :param candles: Candles with the LOD_COLUMNS.
+    :return: A Series of hover strings.
+    """
+    text = candles.DT.astype(str).to_numpy(dtype=object) + '<br>Open: ' + candles.OPEN.astype(str).to_numpy(object) + \
+        '<br>Close: ' + candles.CLOSE.astype(str).to_numpy(object) + '<br>High: ' + \
+        candles.HIGH.astype(str).to_numpy(object) + '<br>Low: ' + candles.LOW.astype(str).to_numpy(object)
+    merged = candles.BARS.to_numpy() > 1
+    text[merged] = text[merged] + '<br>Bars: ' + candles.BARS.astype(str).to_numpy(object)[merged]
+    found = candles.LEVEL.to_numpy() > 0
+    kinds = np.array([PATTERN_LEVELS[k] for k in range(len(PATTERN_LEVELS))], dtype=object)
+    text[found] = text[found] + '<br>' + kinds[candles.LEVEL.to_numpy()[found]] + ' Pattern: ' + \
+        candles.PATTERN.to_numpy(object)[found]
+    return pd.Series(text, index=candles.index)
+
+
+def aggregate(level: pd.DataFrame, factor: int) -> pd.DataFrame:
+    """
+    Merges every factor consecutive candles into one with np.ufunc.reduceat.
+    :param level: A level with the LOD_COLUMNS.
+    :param factor: The number of candles per merged candle.
+    :return: The coarser level with the LOD_COLUMNS.
+    """
+    n = len(level)
+    starts = np.arange(0, n, factor)
+    ends = np.r_[starts[1:], n] - 1
+    # The strongest pattern wins, the earliest on ties: encode the level and the reversed position
+    # in one score, so a single maximum.reduceat finds the winning candle of every bucket
+    score = level.LEVEL.to_numpy(dtype=np.int64) * (n + 1) + (n - np.arange(n))
+    winner = n - np.maximum.reduceat(score, starts) % (n + 1)
+    return pd.DataFrame({'DT': level.DT.to_numpy()[starts],
+                         'OPEN': level.OPEN.to_numpy()[starts],
+                         'HIGH': np.maximum.reduceat(level.HIGH.to_numpy(), starts),
+                         'LOW': np.minimum.reduceat(level.LOW.to_numpy(), starts),
+                         'CLOSE': level.CLOSE.to_numpy()[ends],
+                         'VOL': np.add.reduceat(level.VOL.to_numpy(), starts),
+                         'BARS': np.add.reduceat(level.BARS.to_numpy(), starts),
+                         'LEVEL': level.LEVEL.to_numpy()[winner],
+                         'PATTERN': level.PATTERN.to_numpy()[winner],
+                         'PATTERN_DT': level.PATTERN_DT.to_numpy()[winner]})
+
+
+class LODPyramid(object):
+    """
+    Precomputed aggregation levels of one dataset.
+    """
+
+    def __init__(self, levels: List[pd.DataFrame]) -> None:
+        self.levels = levels
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, pattern: Pattern, factor: int = 4, min_candles: int = 500) -> 'LODPyramid':
+        """
+        Builds the pyramid. Every level is aggregated from the level below it.
+        :param df: The data with DT, OPEN, HIGH, LOW, CLOSE and VOL columns.
+        :param pattern: The Pattern class or instance holding the detected Points.
+        :param factor: The number of candles merged per level.
+        :param min_candles: No further level is built once a level has at most this many candles.
+        :return: The LODPyramid.
+        """
+        levels = [base_level(df, pattern)]
+        while len(levels[-1]) > min_candles:
+            levels.append(aggregate(levels[-1], factor))
+        return cls(levels)
+
+    def window(self, start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None,
+               target_candles: int = 2000) -> pd.DataFrame:
+        """
+        Returns the candles of a time window at the finest level that fits the target candle count.
+        :param start: The start of the window, defaults to the first bar.
+        :param end: The end of the window, defaults to the last bar.
+        :param target_candles: The maximum number of candles to return, unless even the coarsest level has more.
+        :return: The candles with the LOD_COLUMNS.
+        """
+        for level in self.levels:
+            dts = level.DT.to_numpy()
+            # Include the candle that covers the start of the window
+            first = max(np.searchsorted(dts, np.datetime64(start), side='right') - 1, 0) if start is not None else 0
+            last = np.searchsorted(dts, np.datetime64(end), side='right') if end is not None else len(dts)
+            if last - first <= target_candles or level is self.levels[-1]:
+                return level.iloc[first:last].reset_index(drop=True)
+
+    def to_parquet(self, directory: Path) -> None:
+        """
+        Stores every level as level=<k>.parquet.
+        :param directory: The target directory.
+        :return: None.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for k, level in enumerate(self.levels):
+            level.to_parquet(directory / f"level={k}.parquet", index=False)
+
+    @classmethod
+    def from_parquet(cls, directory: Path) -> 'LODPyramid':
+        """
+        Loads a pyramid stored with to_parquet.
+        :param directory: The directory.
+        :return: The LODPyramid.
+        """
+        paths = sorted(Path(directory).glob("level=*.parquet"), key=lambda p: int(p.stem.split('=')[1]))
+        return cls([pd.read_parquet(path) for path in paths])
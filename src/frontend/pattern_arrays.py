@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Per-bar pattern arrays.
+The detectors record Points in the Pattern lists, possibly several times and in any order. Every bar
+is matched to the first Point with its timestamp in one index lookup on DT, instead of scanning the
+lists once per bar. Free of plotly, so it can be used by headless batch jobs.
+"""
+from typing import Callable, Dict, List, NamedTuple, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.patterns.pattern import Pattern
+from src.patterns.point import Point
+from src.patterns.utils import eval_bullish_bearish, eval_extrema
+
+PATTERN_COLUMNS = ['SIGNAL', 'SINGLE_PATTERN', 'DUAL_PATTERN', 'TRIPLE_PATTERN', 'EXTREMA']
+UNDETERMINED_SIGNAL = 'Could not be determined'
+
+
+class PatternResults(NamedTuple):
+    """
+    The detections of a backtest as columns, e.g. loaded from the result cache instead of the Pattern lists.
+    patterns holds the PATTERN_COLUMNS aligned with the bars, trendlines the columns of trendline_frame.
+    """
+    patterns: pd.DataFrame
+    trendlines: pd.DataFrame
+
+
+def first_match(points: list, dts: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the first Point of a list for every timestamp.
+    :param points: The Points, e.g. Pattern.single_patterns.
+    :param dts: The timestamps of the bars.
+    :return: The positions in points of the first Point of every distinct timestamp, and for every bar
+             the number of its timestamp among these, or -1 if no Point has it.
+    """
+    ts = pd.DatetimeIndex([p.ts for p in points])
+    unique = ~ts.duplicated(keep='first')
+    return np.flatnonzero(unique), ts[unique].get_indexer(pd.DatetimeIndex(dts))
+
+
+def attribute_array(points: list, match: Tuple[np.ndarray, np.ndarray], attribute: Callable[[Point], str],
+                    default: str) -> np.ndarray:
+    """
+    Reads an attribute of the matched Points. Every distinct timestamp is read once.
+    :param points: The Points.
+    :param match: The first Points and the bar codes as returned by first_match.
+    :param attribute: A function from a Point to a string.
+    :param default: The value for bars without a match or with a missing attribute.
+    :return: An object array with one string per bar.
+    """
+    first, codes = match
+    values = [attribute(points[position]) for position in first]
+    values = np.array([default if value is None else value for value in values] + [default], dtype=object)
+    # Bars without a match have code -1 and pick the default at the end
+    return values[codes]
+
+
+def pattern_frame(df: pd.DataFrame, pattern: Union[Pattern, PatternResults]) -> pd.DataFrame:
+    """
+    Builds the per-bar signal, pattern and extrema columns of a backtest.
+    Follows the row lookups of Pattern: the signal and extrema come from the first single pattern
+    Point of the bar, the patterns from the first Point of the bar in each list.
+    :param df: The data with a DT column.
+    :param pattern: The Pattern class or instance holding the detected Points, or PatternResults of df.
+    :return: A DataFrame with the PATTERN_COLUMNS, aligned with df.
+    """
+    if isinstance(pattern, PatternResults):
+        assert len(pattern.patterns) == len(df), "The pattern results do not belong to the data!"
+        return pattern.patterns[PATTERN_COLUMNS].set_axis(df.index)
+    single = first_match(pattern.single_patterns, df.DT)
+    dual = first_match(pattern.dual_patterns, df.DT)
+    triple = first_match(pattern.triple_patterns, df.DT)
+    return pd.DataFrame({'SIGNAL': attribute_array(pattern.single_patterns, single, eval_bullish_bearish,
+                                                   UNDETERMINED_SIGNAL),
+                         'SINGLE_PATTERN': attribute_array(pattern.single_patterns, single,
+                                                           lambda p: p.single_pattern, 'None'),
+                         'DUAL_PATTERN': attribute_array(pattern.dual_patterns, dual, lambda p: p.dual_pattern, 'None'),
+                         'TRIPLE_PATTERN': attribute_array(pattern.triple_patterns, triple,
+                                                           lambda p: p.triple_pattern, 'None'),
+                         'EXTREMA': attribute_array(pattern.single_patterns, single, eval_extrema, '')},
+                        index=df.index)
+
+
+def pattern_codes(patterns: pd.DataFrame, columns: List[str]) -> Tuple[np.ndarray, Dict[str, List[str]]]:
+    """
+    Encodes pattern columns as small integer codes.
+    :param patterns: The per-bar columns as returned by pattern_frame.
+    :param columns: The columns to encode.
+    :return: A (bars x columns) code array and the code-to-label list of every column.
+    """
+    codes, codebooks = [], {}
+    for column in columns:
+        column_codes, labels = pd.factorize(patterns[column])
+        codes.append(column_codes)
+        codebooks[column] = [str(label) for label in labels]
+    dtype = np.int8 if max(len(labels) for labels in codebooks.values()) < 128 else np.int32
+    return np.column_stack(codes).astype(dtype), codebooks
+
+
+def trendline_frame(pattern: Union[Pattern, PatternResults]) -> pd.DataFrame:
+    """
+    Converts the detected trendlines into columns. Uptrends connect lows, downtrends connect highs.
+    :param pattern: The Pattern class or instance holding the trendlines as (kind, first, last, slope),
+                    or PatternResults.
+    :return: A DataFrame with KIND, DT0, Y0, DT1, Y1 and SLOPE, one row per trendline.
+    """
+    if isinstance(pattern, PatternResults):
+        return pattern.trendlines
+    rows = [(kind, first.ts, first.low if kind == 'uptrend' else first.high,
+             last.ts, last.low if kind == 'uptrend' else last.high, slope)
+            for kind, first, last, slope in pattern.trendlines]
+    df = pd.DataFrame(rows, columns=['KIND', 'DT0', 'Y0', 'DT1', 'Y1', 'SLOPE'])
+    return df.astype({'DT0': 'datetime64[ns]', 'DT1': 'datetime64[ns]', 'Y0': 'float64', 'Y1': 'float64',
+                      'SLOPE': 'float64'})
+
+
+def hit_positions(patterns: pd.DataFrame, column: str, missing: str = 'None') -> np.ndarray:
+    """
+    Finds the bars on which a pattern column holds a detection.
+    :param patterns: The per-bar columns as returned by pattern_frame.
+    :param column: The column, e.g. 'SINGLE_PATTERN'.
+    :param missing: The label of bars without a detection.
+    :return: The positions of the bars with a detection.
+    """
+    return np.flatnonzero(patterns[column].to_numpy(dtype=object) != missing)
+
+
+def extrema_positions(patterns: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the bars that are local minima and local maxima.
+    :param patterns: The per-bar columns as returned by pattern_frame.
+    :return: The positions of the minima and the positions of the maxima.
+    """
+    extrema = patterns.EXTREMA.to_numpy(dtype=object)
+    both = extrema == 'Both local minima and maxima'
+    return np.flatnonzero(both | (extrema == 'Local minima')), np.flatnonzero(both | (extrema == 'Local maxima'))
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Headless batch reports.
+Runs the backtest and renders one HTML report per pair and time frame in a process pool, and writes an
+index page that links them. The reports reference one shared plotly.min.js next to them instead of
+inlining the bundle in every file. Every worker loads its own data, so a DuckDB backend must be
+configured with read_only: true to be opened by several processes.
+"""
+import html
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+import pandas as pd
+import yaml
+from plotly.offline import get_plotlyjs
+
+from src.frontend.visualization import build_and_create_plot, render_html
+from src.patterns.pattern import Pattern
+from src.simulate.backtest import StartBT
+from src.utils.backtest_utils import BacktestJob, job_parameters, load_job_data
+
+
+# A report covers the same pair, time frame and date range as a backtest job
+ReportJob = BacktestJob
+
+
+class ReportResult(NamedTuple):
+    job: ReportJob
+    path: Optional[str]
+    bars: int
+    single_patterns: int
+    dual_patterns: int
+    triple_patterns: int
+    seconds: float
+    error: Optional[str] = None
+
+
+def render_report(bt_params: dict, job: ReportJob, out_dir: str, database: str = '',
+                  data: Optional[pd.DataFrame] = None) -> ReportResult:
+    """
+    Runs the backtest of one job and writes its report. Loads the data from the database unless given.
+    :param bt_params: The backtest configuration, as loaded from the YAML file.
+    :param job: The pair, time frame and date range.
+    :param out_dir: The output directory.
+    :param database: The name of the database.
+    :param data: Optional bars of the job, e.g. for jobs that share one load.
+    :return: The ReportResult.
+    """
+    start = time.perf_counter()
+    params = job_parameters(bt_params, job)
+    if data is None:
+        data = load_job_data(params, job, database)
+    # Pool workers are reused across jobs, so the detections of the previous job must go first
+    Pattern.reset()
+    backtest = StartBT(params, data)
+    backtest.execute()
+    fig = build_and_create_plot(df=data, pattern=backtest.results, compact=True, overlays=True)
+    conf = params['backtest']
+    fig.update_layout(title=f"{job.pair} {job.time_frame or ''} {conf['start_date']} - {conf['end_date']}")
+    path = os.path.join(out_dir, f"{job.name}.html")
+    render_html(fig, path, include_plotlyjs='directory')
+    hits = (backtest.results.patterns[['SINGLE_PATTERN', 'DUAL_PATTERN', 'TRIPLE_PATTERN']] != 'None').sum()
+    return ReportResult(job, path, len(data), int(hits.SINGLE_PATTERN), int(hits.DUAL_PATTERN),
+                        int(hits.TRIPLE_PATTERN), time.perf_counter() - start)
+
+
+def _render_report_safe(bt_params: dict, job: ReportJob, out_dir: str, database: str) -> ReportResult:
+    """
+    Wraps render_report for the pool, so one failing job does not cancel the batch.
+    """
+    start = time.perf_counter()
+    try:
+        return render_report(bt_params, job, out_dir, database)
+    except Exception as e:
+        return ReportResult(job, None, 0, 0, 0, 0, time.perf_counter() - start, f"{type(e).__name__}: {e}")
+
+
+def write_index(results: List[ReportResult], out_dir: str) -> str:
+    """
+    Writes index.html with one row per report.
+    :param results: The results of the jobs.
+    :param out_dir: The output directory.
+    :return: The path of the index page.
+    """
+    rows = []
+    for r in sorted(results, key=lambda r: r.job.name):
+        link = f'<a href="{html.escape(os.path.basename(r.path))}">{html.escape(r.job.name)}</a>' if r.path \
+            else html.escape(r.job.name)
+        status = html.escape(r.error) if r.error else 'OK'
+        rows.append(f"<tr><td>{link}</td><td>{r.bars}</td><td>{r.single_patterns}</td><td>{r.dual_patterns}</td>"
+                    f"<td>{r.triple_patterns}</td><td>{r.seconds:.2f}</td><td>{status}</td></tr>")
+    page = ('<!DOCTYPE html>\n<html>\n<head><meta charset="utf-8"><title>Backtest reports</title></head>\n<body>\n'
+            '<table border="1" cellpadding="4">\n<tr><th>Report</th><th>Bars</th><th>Single</th><th>Dual</th>'
+            '<th>Triple</th><th>Seconds</th><th>Status</th></tr>\n' + '\n'.join(rows) + '\n</table>\n</body>\n</html>\n')
+    path = os.path.join(out_dir, 'index.html')
+    with open(path, 'w') as stream:
+        stream.write(page)
+    return path
+
+
+def generate_reports(bt_params: dict, jobs: List[ReportJob], out_dir: str, database: str = '',
+                     processes: Optional[int] = None) -> List[ReportResult]:
+    """
+    Renders the reports of all jobs in a process pool and writes the shared plotly.min.js and the index page.
+    :param bt_params: The backtest configuration, as loaded from the YAML file.
+    :param jobs: The jobs.
+    :param out_dir: The output directory.
+    :param database: The name of the database.
+    :param processes: The number of worker processes, defaults to the number of CPUs.
+    :return: The ReportResults in order of completion.
+    """
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    with open(os.path.join(out_dir, 'plotly.min.js'), 'w', encoding='utf-8') as stream:
+        stream.write(get_plotlyjs())
+    start, results = time.perf_counter(), []
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(_render_report_safe, bt_params, job, out_dir, database) for job in jobs]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if result.error:
+                print(f"Report {result.job.name} failed after {result.seconds:.2f}s: {result.error}")
+            else:
+                print(f"Report {result.job.name}: {result.bars} bars in {result.seconds:.2f}s")
+    index = write_index(results, out_dir)
+    print(f"Rendered {sum(r.error is None for r in results)}/{len(jobs)} reports in "
+          f"{time.perf_counter() - start:.2f}s, see {index}")
+    return results
+
+
+if __name__ == '__main__':
+    # Usage: reports.py <backtest.yaml> <out_dir> [time frame ...]
+    with open(sys.argv[1]) as config:
+        params = yaml.safe_load(config)
+    time_frames = sys.argv[3:] or [None]
+    generate_reports(params, [ReportJob(pair, time_frame) for pair in params['backtest']['pairs']
+                              for time_frame in time_frames], sys.argv[2])
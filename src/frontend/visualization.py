@@ -2,12 +2,47 @@
 """
 
 """
+import numpy
 import pandas
 import plotly.graph_objects as go
+import plotly.io as pio
 from typing import List
 
 from src.patterns.pattern import Pattern
-from src.frontend.hover_content import hover_content_by_object_list_comprehension
+from src.frontend.hover_content import hover_text_columnwise
+from src.frontend.lod import LODPyramid, lod_hover_text
+from src.frontend.pattern_arrays import extrema_positions, hit_positions, pattern_codes, pattern_frame, trendline_frame
+
+# The hover lines of the compact mode, in the order of st_hover, with the label that hides a line
+HOVER_LINES = [('SIGNAL', 'Signal', 'None'),
+               ('SINGLE_PATTERN', 'Single Pattern', 'None'),
+               ('DUAL_PATTERN', 'Dual Pattern', 'None'),
+               ('EXTREMA', 'Extrema', '')]
+
+# The overlay trace of every pattern family: the pattern column, the trace name and the marker symbol
+OVERLAY_FAMILIES = [('SINGLE_PATTERN', 'Single patterns', 'circle'),
+                    ('DUAL_PATTERN', 'Dual patterns', 'diamond'),
+                    ('TRIPLE_PATTERN', 'Triple patterns', 'star')]
+
+# Formats the hover text of compact candlestick traces in the browser, like st_hover does in Python
+DECODE_HOVER_JS = """
+var gd = document.getElementById('{plot_id}');
+var fmt = function (v) { return Number.isInteger(v) ? v.toFixed(1) : String(v); };
+gd._fullData.forEach(function (trace, t) {
+    if (!trace.meta || !trace.meta.codebooks) { return; }
+    var books = trace.meta.codebooks, lines = trace.meta.lines, text = new Array(trace.x.length);
+    for (var i = 0; i < trace.x.length; i++) {
+        var s = String(trace.x[i]).replace('T', ' ') + '<br>Open: ' + fmt(trace.open[i]) +
+            '<br>Close: ' + fmt(trace.close[i]) + '<br>High: ' + fmt(trace.high[i]) + '<br>Low: ' + fmt(trace.low[i]);
+        for (var k = 0; k < lines.length; k++) {
+            var label = books[k][trace.customdata[i][k]];
+            if (label !== lines[k][1]) { s += '<br>' + lines[k][0] + ': ' + label; }
+        }
+        text[i] = s;
+    }
+    Plotly.restyle(gd, {text: [text], hoverinfo: 'text'}, [trace.index]);
+});
+"""
 
 
 def create_plot(df: pandas.DataFrame, hover_text: List) -> go.Figure:
@@ -26,24 +61,170 @@ def create_plot(df: pandas.DataFrame, hover_text: List) -> go.Figure:
                                          hoverinfo='text'))
 
 
-def create_hover_text(df: pandas.DataFrame, pattern: Pattern) -> List:
+def create_plot_compact(df: pandas.DataFrame, pattern: Pattern) -> go.Figure:
+    """
+    Creates the candlestick plot without formatted hover text. Signals and patterns are sent as integer
+    codes in customdata with their labels in meta, and DECODE_HOVER_JS formats the text in the browser,
+    so render the figure with render_html or show_plot.
+    :param df: The dataframe that contains the data
+    :param pattern: The pattern class
+    :return: A Plotly Figure
     """
+    codes, codebooks = pattern_codes(pattern_frame(df, pattern), [column for column, _, _ in HOVER_LINES])
+    return go.Figure(data=go.Candlestick(x=df.DT,
+                                         open=df.OPEN,
+                                         high=df.HIGH,
+                                         low=df.LOW,
+                                         close=df.CLOSE,
+                                         customdata=codes,
+                                         meta={'codebooks': list(codebooks.values()),
+                                               'lines': [[label, hidden] for _, label, hidden in HOVER_LINES]},
+                                         hoverinfo='text'))
 
-    :param df:
-    :param pattern:
-    :return:
+
+def create_plot_lod(pyramid: LODPyramid, target_candles: int = 2000, start=None, end=None) -> go.Figure:
     """
-    return df.apply(lambda x: hover_content_by_object_list_comprehension(x[0], x[1], x[2], x[3], x[4], x[5], x[6], x[7],
-                                                                         pattern), axis=1)
+    Creates the candlestick plot of a time window at the level of detail that fits the target candle
+    count, with a marker on every candle that holds a pattern.
+    :param pyramid: The precomputed LODPyramid of the data
+    :param target_candles: The maximum number of candles on screen
+    :param start: The start of the window, defaults to the first bar
+    :param end: The end of the window, defaults to the last bar
+    :return: A Plotly Figure
+    """
+    candles = pyramid.window(start, end, target_candles)
+    found = candles[candles.LEVEL > 0]
+    return go.Figure(data=[go.Candlestick(x=candles.DT,
+                                          open=candles.OPEN,
+                                          high=candles.HIGH,
+                                          low=candles.LOW,
+                                          close=candles.CLOSE,
+                                          text=lod_hover_text(candles),
+                                          hoverinfo='text',
+                                          name='Candles'),
+                           go.Scatter(x=found.DT,
+                                      y=found.HIGH,
+                                      mode='markers',
+                                      marker={'symbol': 'triangle-down', 'size': found.LEVEL * 3 + 4},
+                                      text=found.PATTERN,
+                                      hoverinfo='text',
+                                      name='Patterns')])
 
 
-def build_and_create_plot(df: pandas.DataFrame, pattern: Pattern) -> go.Figure:
+def create_overlay_traces(df: pandas.DataFrame, pattern: Pattern) -> List[go.Scatter]:
+    """
+    Creates the overlay traces of the detections: one marker trace per pattern family, a zigzag line
+    through the local extrema and the trendline segments. Every trace is indexed by the positions of
+    the hits only, so its size is proportional to the number of detections.
+    :param df: The dataframe that contains the data
+    :param pattern: The pattern class
+    :return: A list of Plotly Scatter traces
+    """
+    patterns = pattern_frame(df, pattern)
+    dts, highs, lows = df.DT.to_numpy(), df.HIGH.to_numpy(), df.LOW.to_numpy()
+    traces = []
+    for column, name, symbol in OVERLAY_FAMILIES:
+        hits = hit_positions(patterns, column)
+        traces.append(go.Scatter(x=dts[hits],
+                                 y=highs[hits],
+                                 mode='markers',
+                                 marker={'symbol': symbol, 'size': 8},
+                                 text=patterns[column].to_numpy()[hits],
+                                 hoverinfo='text',
+                                 name=name))
+    # Minima sit on the low and maxima on the high, a bar that is both gets its low first
+    minima, maxima = extrema_positions(patterns)
+    positions = numpy.concatenate([minima, maxima])
+    order = numpy.lexsort((numpy.r_[numpy.zeros(len(minima)), numpy.ones(len(maxima))], positions))
+    traces.append(go.Scatter(x=dts[positions[order]],
+                             y=numpy.concatenate([lows[minima], highs[maxima]])[order],
+                             mode='lines+markers',
+                             line={'width': 1, 'dash': 'dot'},
+                             marker={'size': 4},
+                             hoverinfo='skip',
+                             name='Extrema'))
+    # One trace for all trendlines, the segments are separated by None
+    trendlines = trendline_frame(pattern)
+    x = numpy.full((len(trendlines), 3), None, dtype=object)
+    y = numpy.full((len(trendlines), 3), None, dtype=object)
+    x[:, 0], x[:, 1] = trendlines.DT0.to_numpy(dtype=object), trendlines.DT1.to_numpy(dtype=object)
+    y[:, 0], y[:, 1] = trendlines.Y0.to_numpy(), trendlines.Y1.to_numpy()
+    traces.append(go.Scatter(x=x.ravel(),
+                             y=y.ravel(),
+                             mode='lines',
+                             line={'width': 1},
+                             hoverinfo='skip',
+                             name='Trendlines'))
+    return traces
+
+
+def create_hover_text(df: pandas.DataFrame, pattern: Pattern) -> List:
+    """
+    Builds the hover text of every candle column-wise from the per-bar pattern arrays.
+    :param df: The dataframe that contains the data
+    :param pattern: The pattern class
+    :return: A Series with one hover string per candle
+    """
+    return hover_text_columnwise(df, pattern_frame(df, pattern))
+
+
+def build_and_create_plot(df: pandas.DataFrame, pattern: Pattern, compact: bool = False,
+                          target_candles: int = None, overlays: bool = False) -> go.Figure:
     """
     Wrapper function to construct the candlestick plot with comprehensive hover text
     :param df: The dataframe that contains the data
     :param pattern: The pattern class
+    :param compact: Whether the hover text is formatted in the browser, see create_plot_compact
+    :param target_candles: If given and the data has more bars, the bars are aggregated to this many candles
+    :param overlays: Whether the pattern, extrema and trendline overlays are drawn, see create_overlay_traces
     :return: A Plotly Figure
     """
-    hover_text = create_hover_text(df=df, pattern=pattern)
-    fig = create_plot(df=df, hover_text=hover_text)
+    if target_candles and len(df) > target_candles:
+        return create_plot_lod(LODPyramid.build(df, pattern), target_candles=target_candles)
+    if compact:
+        fig = create_plot_compact(df=df, pattern=pattern)
+    else:
+        hover_text = create_hover_text(df=df, pattern=pattern)
+        fig = create_plot(df=df, hover_text=hover_text)
+    if overlays:
+        fig.add_traces(create_overlay_traces(df=df, pattern=pattern))
     return fig
+
+
+def render_html(fig: go.Figure, path: str = None, include_plotlyjs='cdn') -> str:
+    """
+    Renders a figure to HTML, with the hover decoding of compact traces, and reports the payload size.
+    :param fig: The figure
+    :param path: If given, the HTML is written to this file
+    :param include_plotlyjs: How plotly.js is included, see plotly.io.to_html
+    :return: The HTML
+    """
+    html = pio.to_html(fig, include_plotlyjs=include_plotlyjs, post_script=DECODE_HOVER_JS)
+    report_payload(fig, html)
+    if path is not None:
+        with open(path, 'w') as stream:
+            stream.write(html)
+    return html
+
+
+def report_payload(fig: go.Figure, html: str) -> None:
+    """
+    Prints the number of candles and the sizes of the figure JSON and of the HTML.
+    :param fig: The figure
+    :param html: The HTML of the figure
+    :return: None
+    """
+    payload = len(fig.to_json().encode())
+    print(f"Rendered {sum(len(trace.x) for trace in fig.data if trace.type == 'candlestick')} candles: "
+          f"figure {round(payload / 1024 ** 2, 2)} MB, HTML {round(len(html.encode()) / 1024 ** 2, 2)} MB")
+
+
+def show_plot(fig: go.Figure) -> None:
+    """
+    Shows a figure with the default renderer, with the hover decoding of compact traces, and reports the
+    payload size. The HTML size is the one of a page with plotly.js inlined, as the browser renderers show it.
+    :param fig: The figure
+    :return: None
+    """
+    report_payload(fig, pio.to_html(fig, include_plotlyjs=True, post_script=DECODE_HOVER_JS))
+    fig.show(post_script=DECODE_HOVER_JS)
@@ -0,0 +1,92 @@
+"""
+Flattens nested event tables on the Arrow schema.
+Struct fields are unnested into 'parent.child' columns, column names are shortened to fit MariaDB and
+list columns are dropped or serialized. Every decision is made from the schema, so the data is never
+inspected cell by cell or routed through JSON.
+"""
+# Global imports
+import hashlib
+import json
+from typing import Dict, List
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# MariaDB allows 64 characters. The loaders have always kept names below 64, so existing tables keep matching.
+MAX_COLUMN_NAME = 63
+
+
+def flatten_structs(table: pa.Table) -> pa.Table:
+    """
+    Unnests struct columns until no struct columns are left.
+    :param table: The Arrow table.
+    :return: The table with 'parent.child' columns instead of structs.
+    """
+    while any(pa.types.is_struct(field.type) for field in table.schema):
+        table = table.flatten()
+    return table
+
+
+def shorten_names(names: List[str], limit: int = MAX_COLUMN_NAME) -> List[str]:
+    """
+    Shortens column names deterministically.
+    As long as any name is too long, the leading segment is stripped from every dotted name, which is
+    how the loaders have always named columns. Names that are still too long, or that collide, are
+    truncated and suffixed with a hash of the full name.
+    :param names: The flattened column names.
+    :param limit: The maximum length of a name.
+    :return: The shortened names, in the same order.
+    """
+    full_names, names = names, list(names)
+    while any(len(name) > limit for name in names) and any('.' in name for name in names):
+        names = [".".join(name.split('.')[1:]) if "." in name else name for name in names]
+    seen: Dict[str, int] = {}
+    for name in names:
+        seen[name] = seen.get(name, 0) + 1
+    shortened = []
+    for full_name, name in zip(full_names, names):
+        if len(name) > limit or seen[name] > 1:
+            digest = hashlib.md5(full_name.encode()).hexdigest()[:8]
+            name = f"{name[:limit - 9]}_{digest}"
+        shortened.append(name)
+    return shortened
+
+
+def is_list_like(data_type: pa.DataType) -> bool:
+    """
+    Tests whether a column type holds several values per row.
+    :param data_type: The Arrow type.
+    :return: True for list, large list, fixed size list and map types.
+    """
+    return (pa.types.is_list(data_type) or pa.types.is_large_list(data_type)
+            or pa.types.is_fixed_size_list(data_type) or pa.types.is_map(data_type))
+
+
+def flatten_event_table(table: pa.Table, lists: str = 'drop') -> pd.DataFrame:
+    """
+    Flattens an event table into a frame that can be inserted into MariaDB.
+    Timestamps and dates become epoch milliseconds, as they did when events went through JSON.
+    :param table: The event as Arrow table.
+    :param lists: 'drop' to drop list columns or 'json' to serialize them as JSON strings.
+    :return: The flattened event as Pandas DataFrame.
+    """
+    assert lists in ('drop', 'json'), "lists must be either 'drop' or 'json'!"
+    table = flatten_structs(table)
+    # Names are shortened over every flattened column, list columns included, as the loaders always did
+    columns, names = [], []
+    for field, column, name in zip(table.schema, table.columns, shorten_names(table.schema.names)):
+        if is_list_like(field.type):
+            if lists == 'drop':
+                continue
+            column = pa.array([None if value is None else json.dumps(value, default=str)
+                               for value in column.to_pylist()], type=pa.string())
+        elif pa.types.is_timestamp(field.type):
+            column = pc.cast(pc.cast(column, pa.timestamp('ms', tz=field.type.tz), safe=False), pa.int64())
+        elif pa.types.is_date32(field.type):
+            column = pc.multiply(pc.cast(pc.cast(column, pa.int32()), pa.int64()), 86400000)
+        elif pa.types.is_date64(field.type):
+            column = pc.cast(column, pa.int64())
+        columns.append(column)
+        names.append(name)
+    return pa.Table.from_arrays(columns, names=names).to_pandas()
@@ -3,17 +3,25 @@ Fetches required data sources for the hackathon.
 Inserts the data into MariaDB.
 """
 # Global imports
-import json
+import os
+import queue
 import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
 
-import mariadb
 import pandas as pd
+import pyarrow.parquet as pq
 
-from src.db.db_utility import establish_connection_mariadb
+from src.db.db_utility import establish_connection
 
 # Local imports
-from src.db.io_mariadb import MARIADB
+from src.db.storage_backend import StorageBackend
+from src.load_data.arrow_flatten import flatten_event_table
+from src.load_data.manifest import FAILED, LOADED, IngestManifest
 
 # Global scope
 PROJECT_ROOT = Path.cwd().parent.parent
@@ -27,47 +35,210 @@ def main() -> None:
     integrationevents_path = PROJECT_ROOT / "source" / "source=lw-go-events"
     database_path = integrationevents_path.__str__().split('=')[1]
     mdb_connector = setup_connection(database_path)
-    load_data_from_parquet(integrationevents_path, db_connector=mdb_connector)
+    manifest = IngestManifest(integrationevents_path / "_ingest_manifest.jsonl")
+    load_data_parallel(integrationevents_path, db_connector=mdb_connector, manifest=manifest)
     return None
 
 
-def setup_connection(db: str) -> MARIADB:
+def setup_connection(db: str) -> StorageBackend:
     """
-    Sets up the initial connection to the database.
+    Sets up the initial connection to the database, on the backend selected in the config.
     :param db: The database name.
     :return: None.
     """
 
     db_config = PROJECT_ROOT / "config" / "mariadb.yaml"
-    mdb = establish_connection_mariadb(str(db_config), database=db)
+    mdb = establish_connection(str(db_config), database=db)
     print(f"Connected to database: '{db}'") if mdb.test_connection() else print("error")
     return mdb
 
 
-def load_data_from_parquet(path: Path, db_connector: MARIADB) -> None:
+def iter_source_files(path: Path, manifest: Optional[IngestManifest] = None) -> Iterator[Tuple[str, Path]]:
     """
-
-    :param path:
-    :param db_connector:
-    :return:
+    Walks the table=<name>/<day> folders and yields every parquet file with its table.
+    :param path: The root of the event dump.
+    :param manifest: If given, day folders that the manifest marks as complete are not listed.
+    :return: An iterator of (table, source path).
     """
     for folder in [f for f in path.iterdir() if f.is_dir()]:
         table = folder.__str__().split('=')[-1]
         for day in [f for f in folder.iterdir() if f.is_dir()]:
+            if manifest is not None and manifest.is_complete(day):
+                continue
             for source_path in [f for f in day.iterdir() if f.is_file() and ".snappy.parquet" in f.__str__()]:
-                event = pd.read_parquet(source_path, engine="pyarrow")
-                json_struct = json.loads(event.to_json(orient="records"))
-                event = pd.json_normalize(json_struct)
-                while any(len(i) > 63 for i in event.columns):
-                    event.columns = list(map(lambda x: ".".join(x.split('.')[1:]) if "." in x else x, event.columns))
+                yield table, source_path
+
+
+def read_and_transform(table: str, source_path: Path) -> Tuple[str, Path, pd.DataFrame, float]:
+    """
+    Reads one parquet file and flattens it on the Arrow schema.
+    Runs in the worker processes of load_data_parallel.
+    :param table: The table the file belongs to.
+    :param source_path: The parquet file.
+    :return: A tuple of table, source path, the transformed event and the seconds it took.
+    """
+    start = time.perf_counter()
+    event = flatten_event_table(pq.read_table(source_path))
+    return table, source_path, event, time.perf_counter() - start
+
+
+def load_data_from_parquet(path: Path, db_connector: StorageBackend, manifest: Optional[IngestManifest] = None) -> None:
+    """
+    Loads every parquet file of an event dump into the database, one file at a time.
+    :param path: The root of the event dump.
+    :param db_connector: The database connector.
+    :param manifest: If given, loaded files are skipped and every outcome is recorded.
+    :return: None.
+    """
+    sources = list(iter_source_files(path, manifest))
+    for table, source_path in sources:
+        if manifest is not None and manifest.is_loaded(source_path):
+            continue
+        start = time.perf_counter()
+        try:
+            _, _, event, _ = read_and_transform(table, source_path)
+            db_connector.pd_insert_data(table_name=table, data=event)
+            if manifest is not None:
+                manifest.record(source_path, len(event), LOADED, time.perf_counter() - start)
+        except Exception as e:
+            print(f"Encountered {e} while loading {source_path}")
+            if manifest is not None:
+                manifest.record(source_path, 0, FAILED, time.perf_counter() - start, error=str(e))
+
+    if manifest is not None:
+        manifest.complete_folders(sources)
+    return None
+
+
+class IngestStats(object):
+    """
+    Thread-safe per-table progress of an ingestion run.
+    """
+
+    def __init__(self, files: Dict[str, int]) -> None:
+        self.files = files
+        self.loaded = {table: 0 for table in files}
+        self.failed = {table: 0 for table in files}
+        self.rows = {table: 0 for table in files}
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, table: str, rows: int, failed: bool = False) -> None:
+        """
+        Records a processed file and prints the progress of its table.
+        :param table: The table of the file.
+        :param rows: The number of inserted rows.
+        :param failed: Whether the file failed.
+        :return: None.
+        """
+        with self._lock:
+            if failed:
+                self.failed[table] += 1
+            else:
+                self.loaded[table] += 1
+                self.rows[table] += rows
+            done = self.loaded[table] + self.failed[table]
+            rate = self.rows[table] / (time.perf_counter() - self.start)
+            print(f"{table}: {done}/{self.files[table]} files, {self.rows[table]} rows ({round(rate)} rows/sec)")
+
+    def report(self) -> None:
+        """
+        Prints a summary for every table.
+        :return: None.
+        """
+        elapsed = time.perf_counter() - self.start
+        for table in self.files:
+            print(f"{table}: loaded {self.loaded[table]}, failed {self.failed[table]} of {self.files[table]} files, "
+                  f"{self.rows[table]} rows in {round(elapsed, 2)} seconds")
+        total = sum(self.rows.values())
+        print(f"Total: {total} rows in {round(elapsed, 2)} seconds ({round(total / max(elapsed, 1e-9))} rows/sec)")
+
+
+def load_data_parallel(path: Path, db_connector: StorageBackend, workers: int = None, writers: int = 2,
+                       queue_size: int = 8, manifest: Optional[IngestManifest] = None) -> IngestStats:
+    """
+    Loads every parquet file of an event dump with a pipeline: a process pool reads and transforms the
+    files, and a bounded queue feeds a small set of writer threads that insert into the database.
+    When the writers fall behind, the queue fills up and no new files are read (back-pressure).
+    :param path: The root of the event dump.
+    :param db_connector: The database connector. It is prepared for concurrent writes, e.g. MariaDB pools
+                         one connection per writer.
+    :param workers: The number of reader processes. Defaults to the number of cores.
+    :param writers: The number of writer threads.
+    :param queue_size: The maximum number of transformed files waiting for a writer.
+    :param manifest: If given, loaded files are skipped, failed files are retried and every outcome is recorded.
+    :return: The IngestStats of the run.
+    """
+    workers = workers or os.cpu_count() or 1
+    listed = list(iter_source_files(path, manifest))
+    sources = [s for s in listed if manifest is None or not manifest.is_loaded(s[1])]
+    stats = IngestStats(dict(Counter(table for table, _ in sources)))
+    transformed = queue.Queue(maxsize=queue_size)
+    db_connector.prepare_concurrent_writes()
+    # The first insert into a table creates it, so the first inserts of a table must not run concurrently
+    first_writes = {table: threading.Lock() for table in stats.files}
+    created = set()
+
+    def insert(table: str, event: pd.DataFrame) -> None:
+        if table in created:
+            db_connector.pd_insert_data(table_name=table, data=event)
+            return
+        with first_writes[table]:
+            db_connector.pd_insert_data(table_name=table, data=event)
+            created.add(table)
+
+    def write() -> None:
+        while True:
+            item = transformed.get()
+            if item is None:
+                break
+            table, source_path, event, read_time = item
+            start = time.perf_counter()
+            try:
+                insert(table, event)
+                stats.record(table, len(event))
+                if manifest is not None:
+                    manifest.record(source_path, len(event), LOADED, read_time + time.perf_counter() - start)
+            except Exception as e:
+                print(f"Encountered {e} while inserting {source_path}")
+                stats.record(table, 0, failed=True)
+                if manifest is not None:
+                    manifest.record(source_path, 0, FAILED, read_time + time.perf_counter() - start, error=str(e))
+
+    threads = [threading.Thread(target=write, daemon=True) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending, remaining = {}, iter(sources)
+        while True:
+            # Keep every worker busy, but do not read further ahead than the queue can absorb
+            while len(pending) < workers:
+                source = next(remaining, None)
+                if source is None:
+                    break
+                pending[executor.submit(read_and_transform, *source)] = source
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                table, source_path = pending.pop(future)
                 try:
-                    event.drop(columns=event.columns[event.applymap(type).eq(list).any()], inplace=True)
-                    db_connector.pd_insert_data(table_name=table, data=event)
+                    transformed.put(future.result())
                 except Exception as e:
-                    print(f"Encountered {e}")
-                    pass
+                    print(f"Encountered {e} while reading {source_path}")
+                    stats.record(table, 0, failed=True)
+                    if manifest is not None:
+                        manifest.record(source_path, 0, FAILED, 0.0, error=str(e))
 
-    return None
+    for _ in threads:
+        transformed.put(None)
+    for thread in threads:
+        thread.join()
+    if manifest is not None:
+        manifest.complete_folders(listed)
+    stats.report()
+    return stats
 
 
 if __name__ == '__main__':
@@ -0,0 +1,127 @@
+"""
+File manifest for checkpointed, incremental ingestion.
+Every processed source file is appended to a JSON-lines manifest with its path, size, mtime, row count,
+status and load time. As the manifest is append-only and written after every file, a crashed run can
+resume where it stopped. Day folders whose files are all loaded are recorded with their mtime, so a
+later run skips them without listing their files, unless files were added to them since.
+"""
+# Global imports
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Tuple
+
+LOADED = 'loaded'
+FAILED = 'failed'
+
+
+class IngestManifest(object):
+    """
+    Append-only manifest of the files and folders that have been ingested.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.files: Dict[str, dict] = {}
+        self.folders: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            self._read()
+
+    def _read(self) -> None:
+        """
+        Reads the entries of the manifest. A run that crashed while appending can leave a truncated last
+        line, which is dropped with a warning, so its file is loaded again. Malformed lines elsewhere raise.
+        :return: None.
+        """
+        with open(self.path, 'rb') as stream:
+            lines = stream.readlines()
+        valid_bytes = 0
+        for number, line in enumerate(lines, 1):
+            if line.strip():
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    if number < len(lines):
+                        raise
+                    print(f"Warning: skipping the truncated last line of {self.path}: {line[:80]!r}")
+                    # Later entries are appended after the last valid line, not onto the truncated one
+                    with open(self.path, 'r+b') as stream:
+                        stream.truncate(valid_bytes)
+                    return
+                if 'folder' in entry:
+                    self.folders[entry['folder']] = entry['mtime']
+                else:
+                    self.files[entry['path']] = entry
+            valid_bytes += len(line)
+
+    def is_loaded(self, source_path: Path) -> bool:
+        """
+        Tests whether a file was loaded and has not changed since.
+        :param source_path: The source file.
+        :return: True if the file can be skipped.
+        """
+        entry = self.files.get(str(source_path))
+        if entry is None or entry['status'] != LOADED:
+            return False
+        stat = source_path.stat()
+        return entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime
+
+    def is_complete(self, folder: Path) -> bool:
+        """
+        Tests whether every file in a folder was loaded and no file was added or removed since.
+        :param folder: The day folder.
+        :return: True if the folder can be skipped without listing it.
+        """
+        return self.folders.get(str(folder)) == folder.stat().st_mtime
+
+    def record(self, source_path: Path, rows: int, status: str, load_time: float, error: str = None) -> None:
+        """
+        Appends the outcome of a file to the manifest.
+        :param source_path: The source file.
+        :param rows: The number of inserted rows.
+        :param status: LOADED or FAILED.
+        :param load_time: The seconds it took to load the file.
+        :param error: The error message of a failed file.
+        :return: None.
+        """
+        stat = source_path.stat()
+        entry = {'path': str(source_path),
+                 'size': stat.st_size,
+                 'mtime': stat.st_mtime,
+                 'rows': rows,
+                 'status': status,
+                 'load_time': round(load_time, 4),
+                 'loaded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                 'error': error}
+        self._append(entry)
+        self.files[entry['path']] = entry
+
+    def complete_folders(self, sources: Iterable[Tuple[str, Path]]) -> None:
+        """
+        Marks the folders whose files are all loaded as complete.
+        :param sources: The (table, source path) pairs that were part of the run.
+        :return: None.
+        """
+        folders: Dict[Path, bool] = {}
+        for _, source_path in sources:
+            folders[source_path.parent] = folders.get(source_path.parent, True) and self.is_loaded(source_path)
+        for folder, complete in folders.items():
+            if complete:
+                entry = {'folder': str(folder), 'mtime': folder.stat().st_mtime}
+                self._append(entry)
+                self.folders[entry['folder']] = entry['mtime']
+
+    def _append(self, entry: dict) -> None:
+        """
+        Appends an entry as one line and flushes it to disk.
+        :param entry: The entry.
+        :return: None.
+        """
+        with self._lock:
+            with open(self.path, 'a') as stream:
+                stream.write(json.dumps(entry) + '\n')
+                stream.flush()
+                os.fsync(stream.fileno())
@@ -15,6 +15,16 @@ class Pattern(object):
     triple_patterns = []
     trendlines = []
 
+    @classmethod
+    def reset(cls) -> None:
+        """
+        Clears the detected patterns and trendlines in place, so references held elsewhere stay valid.
+        Needed before every backtest that runs in a process which ran one before.
+        :return: None.
+        """
+        for detections in (cls.single_patterns, cls.dual_patterns, cls.triple_patterns, cls.trendlines):
+            detections.clear()
+
     @classmethod
     def eval_single_condition(cls, condition: bool, point: Point, pattern: str) -> bool:
         if condition:
@@ -6,14 +6,21 @@ import logging.config
 import logging.handlers
 import logging
 from string import digits
+from typing import Callable, Iterable, Optional
+
 import pandas as pd
 
+from src.frontend.pattern_arrays import PatternResults, pattern_frame, trendline_frame
 from src.patterns.point import Point
 from src.patterns.pattern import Pattern
 from src.patterns.singlepattern import SinglePatterns
 from src.patterns.dualpattern import DualPatterns
 from src.patterns.triplepattern import TriplePatterns
 from src.utils.log_utils import shutdown_and_move_logfiles
+from src.simulate.result_cache import ResultCache
+from src.simulate.snapshot import (SNAPSHOT_WINDOW, capture, load_snapshot, merge_results, restore, save_snapshot,
+                                   trim)
+from src.utils.memory_utils import MemoryTracker
 
 
 class BTConfig(object):
@@ -86,7 +93,7 @@ class BTConfig(object):
 
 class StartBT(BTConfig):
 
-    def __init__(self, bt_params: str, df: pd.DataFrame) -> None:
+    def __init__(self, bt_params: str, df: Optional[pd.DataFrame] = None) -> None:
         # TODO: Here, we want to start optimize data structures wrt. AL-19
         super().__init__(bt_params)
         self.single_patterns = SinglePatterns()
@@ -94,22 +101,169 @@ class StartBT(BTConfig):
         self.triple_patterns = TriplePatterns()
         self.patterns = Pattern()
         self.data = df
-        self.metadata = {
+        self.bars_processed = 0
+        self.results: Optional[PatternResults] = None
+        self.cache_key: Optional[str] = None
+        self.metadata = {} if df is None else {
             'start_day': self.data.DT.min().strftime('%m/%d/%Y'),
             'end_day': self.data.DT.max().strftime('%m/%d/%Y'),
             'days': self.data.DT.dt.normalize().nunique()
             }
 
-    def execute(self) -> None:
+    def execute(self, memory: Optional[MemoryTracker] = None) -> None:
         """
-        Executes the backtest
+        Executes the backtest and sets self.results to the detections as columns.
+        With a 'cache' section in the config, the results of the same data and detector config are loaded
+        from the ResultCache instead. The Pattern lists are then left empty, use self.results.
+        :param memory: An optional memory tracker. If not given, one is set up from the 'memory' config section.
         :return: None
         """
-        print(f"Running simulation over {self.metadata.get('days')} "
+        cache = ResultCache.from_config(self.return_value('cache'))
+        if cache is not None:
+            self.cache_key = cache.pattern_key(self.data, self.return_value('detector'))
+            self.results = cache.load_patterns(self.cache_key)
+        if self.results is not None:
+            print(f"Loaded cached patterns of {len(self.data)} bars between {self.metadata.get('start_day')}"
+                  f" and {self.metadata.get('end_day')}")
+        else:
+            print(f"Running simulation over {self.metadata.get('days')} "
+                  f"days between {self.metadata.get('start_day')}"
+                  f" and {self.metadata.get('end_day')}")
+            memory = memory or MemoryTracker.from_config(self.return_value('memory'))
+            memory.start()
+            memory.checkpoint('execute:start', len(self.data), data=self.data)
+
+            self._process_frame(self.data, memory)
+
+            memory.checkpoint('execute:end', len(self.data),
+                              data=self.data,
+                              single_patterns=Pattern.single_patterns,
+                              dual_patterns=Pattern.dual_patterns,
+                              triple_patterns=Pattern.triple_patterns,
+                              trendlines=Pattern.trendlines)
+
+            self.results = PatternResults(pattern_frame(self.data, self.patterns), trendline_frame(self.patterns))
+            if cache is not None:
+                cache.store_patterns(self.cache_key, self.results)
+
+        # Clean up
+        shutdown_and_move_logfiles(self.return_value("log_path"))
+
+    def execute_resumable(self, snapshot_dir: str, memory: Optional[MemoryTracker] = None) -> None:
+        """
+        Executes the backtest from the detector snapshot in snapshot_dir and writes a new snapshot.
+        Only the bars after the last bar of the snapshot are processed, so self.data may hold all bars
+        or just the appended ones. Without a snapshot, all bars are processed. self.results covers all
+        bars, equal to a single run over the complete data.
+        :param snapshot_dir: The snapshot directory.
+        :param memory: An optional memory tracker. If not given, one is set up from the 'memory' config section.
+        :return: None
+        """
+        memory = memory or MemoryTracker.from_config(self.return_value('memory'))
+        memory.start()
+        snapshot = load_snapshot(snapshot_dir)
+        if snapshot is None:
+            Pattern.reset()
+            new_bars = self.data
+        else:
+            restore(snapshot)
+            self.bars_processed = snapshot.bars_processed
+            new_bars = self.data[self.data.DT > snapshot.last_dt]
+        print(f"Resuming after {self.bars_processed} bars, processing {len(new_bars)} new bars")
+
+        self._process_frame(new_bars, memory)
+
+        if snapshot is None:
+            self.results = PatternResults(pattern_frame(new_bars, self.patterns), trendline_frame(self.patterns))
+        else:
+            self.results = merge_results(snapshot, new_bars.DT)
+        save_snapshot(capture(self.bars_processed, self.results), snapshot_dir)
+        memory.checkpoint('execute_resumable:end', len(new_bars),
+                          single_patterns=Pattern.single_patterns,
+                          dual_patterns=Pattern.dual_patterns,
+                          triple_patterns=Pattern.triple_patterns)
+
+        # Clean up
+        shutdown_and_move_logfiles(self.return_value("log_path"))
+
+    def execute_chunks(self, chunks: Iterable[pd.DataFrame], sink: Callable[[pd.DataFrame, PatternResults], None],
+                       memory: Optional[MemoryTracker] = None) -> None:
+        """
+        Executes the backtest over a stream of chunks, e.g. from MARIADB.stream_bt_data, with a footprint
+        that does not grow with the date range.
+        The detector state lives in the Pattern lists and the running bar index, so it is carried across
+        chunk boundaries. After every chunk the rows of the bars the detectors can no longer change are
+        passed to the sink and the Pattern lists are trimmed to the tail of a snapshot. The bars of the
+        tail are held back until the next chunk, so the rows passed to the sink add up to a single run
+        over the concatenated data. self.results is not set.
+        :param chunks: An iterable of DataFrames with the columns from get_bt_data, in time order.
+        :param sink: Called with the final bars and their PatternResults, aligned by position.
+        :param memory: An optional memory tracker. If not given, one is set up from the 'memory' config section.
+        :return: None
+        """
+        memory = memory or MemoryTracker.from_config(self.return_value('memory'))
+        memory.start()
+        start_day, end_day, days = None, None, 0
+        pending = None
+
+        def emit(bars: pd.DataFrame) -> None:
+            bars = bars.reset_index(drop=True)
+            sink(bars, PatternResults(pattern_frame(bars, self.patterns), trendline_frame(self.patterns)))
+            # Trendlines are final once detected
+            Pattern.trendlines.clear()
+
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+            start_day = start_day or chunk.DT.iloc[0]
+            # The chunks are in time order, so a chunk can only share its first day with the previous one
+            chunk_days = chunk.DT.dt.normalize()
+            days += chunk_days.nunique() - int(end_day is not None and end_day.normalize() == chunk_days.iloc[0])
+            end_day = chunk.DT.iloc[-1]
+            self._process_frame(chunk, memory)
+            bars = chunk if pending is None else pd.concat([pending, chunk], ignore_index=True)
+            tail_start = Pattern.single_patterns[-SNAPSHOT_WINDOW].ts \
+                if len(Pattern.single_patterns) >= SNAPSHOT_WINDOW else bars.DT.iloc[0]
+            final = bars.DT < tail_start
+            if final.any():
+                emit(bars[final])
+            pending = bars[~final]
+            trim()
+            memory.checkpoint(f'execute_chunks:bar {self.bars_processed}', self.bars_processed, chunk=chunk,
+                              single_patterns=Pattern.single_patterns)
+        if pending is not None and not pending.empty:
+            emit(pending)
+
+        if start_day is not None:
+            self.metadata = {'start_day': start_day.strftime('%m/%d/%Y'),
+                             'end_day': end_day.strftime('%m/%d/%Y'),
+                             'days': days}
+        print(f"Simulated {self.bars_processed} bars over {self.metadata.get('days')} "
               f"days between {self.metadata.get('start_day')}"
               f" and {self.metadata.get('end_day')}")
 
-        for index, (_, row) in enumerate(self.data.iterrows()):
+        memory.checkpoint('execute_chunks:end', self.bars_processed,
+                          single_patterns=Pattern.single_patterns,
+                          dual_patterns=Pattern.dual_patterns,
+                          triple_patterns=Pattern.triple_patterns,
+                          trendlines=Pattern.trendlines)
+
+        # Clean up
+        shutdown_and_move_logfiles(self.return_value("log_path"))
+
+    def _process_frame(self, df: pd.DataFrame, memory: MemoryTracker) -> None:
+        """
+        Runs the detectors over the rows of a frame. The bar index continues from previous frames.
+        :param df: The data to process.
+        :param memory: The memory tracker used for budget checks.
+        :return: None
+        """
+        for _, row in df.iterrows():
+            index = self.bars_processed
+            self.bars_processed += 1
+            if index % memory.check_every == 0:
+                memory.check_budget(f'execute:bar {index}')
+
             point = Point(row.OPEN, row.CLOSE, row.HIGH, row.LOW, row.DT)
 
             # Find local extrema for the last n points
@@ -128,6 +282,3 @@ class StartBT(BTConfig):
                 self.triple_patterns.all_triple_patterns()
 
             # Find trendlines
-
-        # Clean up
-        shutdown_and_move_logfiles(self.return_value("log_path"))
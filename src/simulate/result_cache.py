@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of backtest results.
+The pattern stage is keyed by a hash of the candles and the detector config, the trade stage by the
+pattern key and the strategy config, so a new strategy on the same data reuses the detected patterns
+and only recomputes the trades. Every entry is a directory of Parquet files; the least recently used
+entries are evicted once the cache exceeds its size limit.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+import pandas as pd
+
+from src.frontend.pattern_arrays import PatternResults
+
+# Part of every key, bump it when the detectors change so stale patterns are not reused
+CACHE_VERSION = 1
+KEY_COLUMNS = ['DT', 'OPEN', 'HIGH', 'LOW', 'CLOSE']
+
+
+def config_digest(*parts) -> str:
+    """
+    Hashes JSON-serializable parts into a hex digest.
+    :param parts: The parts, e.g. config sections.
+    :return: The SHA-256 hex digest.
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def data_digest(df: pd.DataFrame) -> str:
+    """
+    Hashes the candles with pandas.util.hash_pandas_object, independent of the index.
+    :param df: The data with the KEY_COLUMNS.
+    :return: The SHA-256 hex digest.
+    """
+    hashes = pd.util.hash_pandas_object(df[KEY_COLUMNS], index=False).to_numpy()
+    return hashlib.sha256(hashes.tobytes()).hexdigest()
+
+
+class ResultCache(object):
+
+    def __init__(self, directory: str, max_bytes: int = 1024 ** 3) -> None:
+        """
+        :param directory: The cache directory
+        :param max_bytes: The size above which the least recently used entries are evicted
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls, conf: Optional[dict]) -> Optional['ResultCache']:
+        """
+        Creates the cache from the 'cache' section of the backtest config.
+        :param conf: The section with dir and the optional max_mb, or None
+        :return: The ResultCache, or None if no cache is configured
+        """
+        if not conf or not conf.get('dir'):
+            return None
+        return cls(conf['dir'], int(float(conf.get('max_mb', 1024)) * 1024 ** 2))
+
+    @staticmethod
+    def pattern_key(df: pd.DataFrame, detector_config: Optional[dict] = None) -> str:
+        return config_digest(CACHE_VERSION, data_digest(df), detector_config)
+
+    @staticmethod
+    def trade_key(pattern_key: str, strategy_config: dict) -> str:
+        return config_digest(CACHE_VERSION, pattern_key, strategy_config)
+
+    def load_patterns(self, key: str) -> Optional[PatternResults]:
+        """
+        Loads the pattern stage of a key.
+        :param key: The pattern key.
+        :return: The PatternResults, or None on a miss.
+        """
+        entry = self._lookup('patterns', key)
+        if entry is None:
+            return None
+        return PatternResults(pd.read_parquet(entry / 'patterns.parquet'), pd.read_parquet(entry / 'trendlines.parquet'))
+
+    def store_patterns(self, key: str, results: PatternResults) -> None:
+        """
+        Stores the pattern stage of a key.
+        :param key: The pattern key.
+        :param results: The per-bar patterns and the trendlines.
+        :return: None.
+        """
+        self._store('patterns', key, {'patterns.parquet': results.patterns.reset_index(drop=True),
+                                      'trendlines.parquet': results.trendlines})
+
+    def load_trades(self, key: str) -> Optional[Tuple[pd.DataFrame, dict]]:
+        """
+        Loads the trade stage of a key.
+        :param key: The trade key.
+        :return: The trades and the metrics, or None on a miss.
+        """
+        entry = self._lookup('trades', key)
+        if entry is None:
+            return None
+        with open(entry / 'metrics.json') as stream:
+            return pd.read_parquet(entry / 'trades.parquet'), json.load(stream)
+
+    def store_trades(self, key: str, trades: pd.DataFrame, metrics: dict) -> None:
+        """
+        Stores the trade stage of a key.
+        :param key: The trade key.
+        :param trades: The trades.
+        :param metrics: The JSON-serializable metrics.
+        :return: None.
+        """
+        self._store('trades', key, {'trades.parquet': trades, 'metrics.json': metrics})
+
+    def size(self) -> int:
+        return sum(path.stat().st_size for path in self.directory.glob('*/*/*') if path.is_file())
+
+    def evict(self, keep: Optional[Path] = None) -> int:
+        """
+        Removes the least recently used entries until the cache fits max_bytes.
+        :param keep: An entry that is never removed, e.g. the one just stored.
+        :return: The number of removed entries.
+        """
+        entries = []
+        for entry in self.directory.glob('*/*'):
+            if entry.is_dir() and not entry.name.startswith('.') and entry != keep:
+                entries.append((entry.stat().st_mtime, self._entry_size(entry), entry))
+        total = sum(size for _, size, _ in entries) + (self._entry_size(keep) if keep is not None else 0)
+        removed = 0
+        for _, size, entry in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def _lookup(self, stage: str, key: str) -> Optional[Path]:
+        """
+        Finds an entry and marks it as recently used.
+        """
+        entry = self.directory / stage / key
+        if not entry.is_dir():
+            self.misses += 1
+            return None
+        os.utime(entry, (time.time(), time.time()))
+        self.hits += 1
+        return entry
+
+    def _store(self, stage: str, key: str, files: dict) -> None:
+        """
+        Writes the files of an entry to a temporary directory and moves it in place, so readers never
+        see a partial entry, then evicts older entries. Entries larger than max_bytes are not stored.
+        """
+        stage_dir = self.directory / stage
+        stage_dir.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(prefix='.tmp-', dir=stage_dir))
+        for name, content in files.items():
+            if name.endswith('.parquet'):
+                content.to_parquet(tmp / name, index=False)
+            else:
+                with open(tmp / name, 'w') as stream:
+                    json.dump(content, stream)
+        size = self._entry_size(tmp)
+        if size > self.max_bytes:
+            print(f"Not caching {stage} entry {key[:12]}: {round(size / 1024 ** 2, 2)} MB exceeds the cache size "
+                  f"of {round(self.max_bytes / 1024 ** 2, 2)} MB")
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        try:
+            os.replace(tmp, stage_dir / key)
+        except OSError:
+            # Another process stored the same key first
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict(keep=stage_dir / key)
+
+    @staticmethod
+    def _entry_size(entry: Path) -> int:
+        return sum(f.stat().st_size for f in entry.iterdir())
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Snapshots of the detector state, to resume a backtest when new bars are appended.
+The detectors only look at the last entries of Pattern.single_patterns: mark_local_extrema(10) reads the
+last 12, the dual and triple detectors the last 2 and 3. Points further back are final, so a snapshot
+holds the per-bar results so far, the tail of single_patterns with the identity of its Points (a Point
+appears once per single pattern it matched) and the running bar index. After a restore only the new
+bars are processed, and the rows of the tail bars are recomputed, as new bars may still mark them.
+"""
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+import pandas as pd
+
+from src.frontend.pattern_arrays import PatternResults, pattern_frame, trendline_frame
+from src.patterns.pattern import Pattern
+from src.patterns.point import Point
+
+SNAPSHOT_WINDOW = 12
+SNAPSHOT_VERSION = 1
+POINT_FLAGS = ['bullish', 'bearish', 'minima', 'maxima']
+POINT_LABELS = ['single_pattern', 'dual_pattern', 'triple_pattern']
+
+
+class DetectorSnapshot(NamedTuple):
+    bars_processed: int
+    tail: List[Point]
+    dual: List[Point]
+    triple: List[Point]
+    results: PatternResults
+
+    @property
+    def last_dt(self) -> Optional[pd.Timestamp]:
+        return self.tail[-1].ts if self.tail else None
+
+    @property
+    def tail_points(self) -> List[Point]:
+        """
+        The distinct Points of the tail in bar order.
+        """
+        return list({id(point): point for point in self.tail}.values())
+
+
+def capture(bars_processed: int, results: PatternResults, window: int = SNAPSHOT_WINDOW) -> DetectorSnapshot:
+    """
+    Captures the detector state from the Pattern lists.
+    :param bars_processed: The number of bars processed so far.
+    :param results: The per-bar results of all processed bars.
+    :param window: The number of single_patterns entries the detectors can still read.
+    :return: The DetectorSnapshot.
+    """
+    tail = Pattern.single_patterns[-window:]
+    ids = {id(point) for point in tail}
+    return DetectorSnapshot(bars_processed, list(tail),
+                            [point for point in Pattern.dual_patterns if id(point) in ids],
+                            [point for point in Pattern.triple_patterns if id(point) in ids],
+                            results)
+
+
+def restore(snapshot: DetectorSnapshot) -> None:
+    """
+    Replaces the Pattern lists with the tail of a snapshot.
+    :param snapshot: The DetectorSnapshot.
+    :return: None.
+    """
+    Pattern.reset()
+    Pattern.single_patterns.extend(snapshot.tail)
+    Pattern.dual_patterns.extend(snapshot.dual)
+    Pattern.triple_patterns.extend(snapshot.triple)
+
+
+def trim(window: int = SNAPSHOT_WINDOW) -> None:
+    """
+    Drops the Points the detectors can no longer read from the Pattern lists, keeping the tail of a snapshot.
+    Rows of the dropped Points must be read from the lists before.
+    :param window: The number of single_patterns entries the detectors can still read.
+    :return: None.
+    """
+    restore(capture(0, PatternResults(pd.DataFrame(), pd.DataFrame()), window))
+
+
+def merge_results(snapshot: DetectorSnapshot, new_dts: pd.Series) -> PatternResults:
+    """
+    Combines the final rows of a snapshot with the rows of its tail bars and the new bars, read from
+    the Pattern lists after the new bars were processed.
+    :param snapshot: The restored DetectorSnapshot.
+    :param new_dts: The timestamps of the new bars.
+    :return: The PatternResults of all bars.
+    """
+    tail_dts = pd.Series([point.ts for point in snapshot.tail_points], dtype='datetime64[ns]')
+    recent = pd.DataFrame({'DT': pd.concat([tail_dts, new_dts.astype('datetime64[ns]')], ignore_index=True)})
+    final = snapshot.results.patterns.iloc[:len(snapshot.results.patterns) - len(tail_dts)]
+    patterns = pd.concat([final, pattern_frame(recent, Pattern)], ignore_index=True)
+    trendlines = pd.concat([snapshot.results.trendlines, trendline_frame(Pattern)], ignore_index=True)
+    return PatternResults(patterns, trendlines)
+
+
+def save_snapshot(snapshot: DetectorSnapshot, directory: Path) -> None:
+    """
+    Writes a snapshot as state.json, points.parquet and the results as Parquet. The files are written to a
+    temporary sibling directory that is moved in place, so readers never see a partial snapshot.
+    :param snapshot: The DetectorSnapshot.
+    :param directory: The snapshot directory.
+    :return: None.
+    """
+    directory = Path(directory)
+    directory.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix='.tmp-', dir=directory.parent))
+    points = snapshot.tail_points
+    position = {id(point): i for i, point in enumerate(points)}
+    dual, triple = {id(point) for point in snapshot.dual}, {id(point) for point in snapshot.triple}
+    frame = pd.DataFrame({'DT': pd.Series([point.ts for point in points], dtype='datetime64[ns]'),
+                          'OPEN': [point.open for point in points],
+                          'CLOSE': [point.close for point in points],
+                          'HIGH': [point.high for point in points],
+                          'LOW': [point.low for point in points],
+                          **{flag.upper(): [getattr(point, flag) for point in points] for flag in POINT_FLAGS},
+                          **{label.upper(): [getattr(point, label) for point in points] for label in POINT_LABELS},
+                          'IN_DUAL': [id(point) in dual for point in points],
+                          'IN_TRIPLE': [id(point) in triple for point in points]})
+    frame.to_parquet(tmp / 'points.parquet', index=False)
+    snapshot.results.patterns.to_parquet(tmp / 'patterns.parquet', index=False)
+    snapshot.results.trendlines.to_parquet(tmp / 'trendlines.parquet', index=False)
+    with open(tmp / 'state.json', 'w') as stream:
+        json.dump({'version': SNAPSHOT_VERSION,
+                   'bars_processed': snapshot.bars_processed,
+                   'last_dt': str(snapshot.last_dt) if snapshot.last_dt is not None else None,
+                   'tail': [position[id(point)] for point in snapshot.tail]}, stream)
+    # A directory can only replace an empty one, so the previous snapshot is moved aside first.
+    # Readers in between find no state.json and start from scratch
+    previous = None
+    if directory.exists():
+        previous = Path(tempfile.mkdtemp(prefix='.old-', dir=directory.parent)) / directory.name
+        os.replace(directory, previous)
+    os.replace(tmp, directory)
+    if previous is not None:
+        shutil.rmtree(previous.parent, ignore_errors=True)
+
+
+def load_snapshot(directory: Path) -> Optional[DetectorSnapshot]:
+    """
+    Reads a snapshot written by save_snapshot.
+    :param directory: The snapshot directory.
+    :return: The DetectorSnapshot, or None if there is no complete snapshot of this version.
+    """
+    directory = Path(directory)
+    if not (directory / 'state.json').exists():
+        return None
+    with open(directory / 'state.json') as stream:
+        state = json.load(stream)
+    if state.get('version') != SNAPSHOT_VERSION:
+        return None
+    frame = pd.read_parquet(directory / 'points.parquet')
+    points = []
+    for row in frame.itertuples(index=False):
+        point = Point(row.OPEN, row.CLOSE, row.HIGH, row.LOW, row.DT)
+        for flag in POINT_FLAGS:
+            setattr(point, flag, bool(getattr(row, flag.upper())))
+        for label in POINT_LABELS:
+            value = getattr(row, label.upper())
+            setattr(point, label, None if pd.isna(value) else value)
+        points.append(point)
+    results = PatternResults(pd.read_parquet(directory / 'patterns.parquet'),
+                             pd.read_parquet(directory / 'trendlines.parquet'))
+    return DetectorSnapshot(state['bars_processed'], [points[i] for i in state['tail']],
+                            [point for point, member in zip(points, frame.IN_DUAL) if member],
+                            [point for point, member in zip(points, frame.IN_TRIPLE) if member],
+                            results)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+A simple pattern-driven trading strategy on top of the detected patterns.
+A position is opened at the close of a bar whose strongest pattern reaches the configured level, in the
+direction of the pattern or else of the signal of the bar, and closed at the close of the bar hold_bars
+later. One position is held at a time and the commission is paid on entry and exit.
+"""
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from src.frontend.lod import strongest_patterns
+
+TRADE_COLUMNS = ['ENTRY_DT', 'EXIT_DT', 'SIDE', 'ENTRY_PRICE', 'EXIT_PRICE', 'PATTERN', 'RETURN']
+SIDES = {'Bullish': 1, 'Bearish': -1}
+
+
+class PatternStrategy(object):
+
+    def __init__(self, hold_bars: int = 10, min_level: int = 2, commission: float = 0.0) -> None:
+        """
+        :param hold_bars: The number of bars a position is held
+        :param min_level: The weakest pattern that opens a position: 1 single, 2 dual, 3 triple
+        :param commission: The commission per trade side, stated as a fraction of the position
+        """
+        self.hold_bars = hold_bars
+        self.min_level = min_level
+        self.commission = commission
+
+    @classmethod
+    def from_config(cls, bt_params: dict) -> 'PatternStrategy':
+        """
+        Creates the strategy from the optional 'strategy' section and the commission of the backtest config.
+        :param bt_params: The backtest configuration, as loaded from the YAML file
+        :return: The PatternStrategy
+        """
+        conf = bt_params.get('strategy') or {}
+        return cls(hold_bars=int(conf.get('hold_bars', 10)),
+                   min_level=int(conf.get('min_level', 2)),
+                   commission=float(conf.get('commission', bt_params.get('backtest', {}).get('commission', 0.0))))
+
+    def to_dict(self) -> dict:
+        return {'hold_bars': self.hold_bars, 'min_level': self.min_level, 'commission': self.commission}
+
+    def trades(self, df: pd.DataFrame, patterns: pd.DataFrame) -> pd.DataFrame:
+        """
+        Simulates the trades over the bars.
+        :param df: The data with DT and CLOSE columns
+        :param patterns: The per-bar columns as returned by pattern_frame, aligned with df
+        :return: A DataFrame with the TRADE_COLUMNS, one row per closed trade
+        """
+        strongest = strongest_patterns(patterns)
+        # Patterns named Bullish or Bearish give the direction, otherwise the candle of the bar does
+        named = strongest.PATTERN.str.split(' ', n=1).str[0].map(SIDES)
+        sides = named.fillna(patterns.SIGNAL.map(SIDES)).fillna(0).to_numpy(dtype=np.int8)
+        candidates = np.flatnonzero((strongest.LEVEL.to_numpy() >= self.min_level) & (sides != 0))
+        entries, free_from = [], 0
+        for position in candidates:
+            if position < free_from:
+                continue
+            if position + self.hold_bars >= len(df):
+                break
+            entries.append(position)
+            free_from = position + self.hold_bars
+        entries = np.asarray(entries, dtype=np.int64)
+        exits = entries + self.hold_bars
+        closes, side = df.CLOSE.to_numpy(dtype=np.float64), sides[entries].astype(np.float64)
+        return pd.DataFrame({'ENTRY_DT': df.DT.to_numpy()[entries],
+                             'EXIT_DT': df.DT.to_numpy()[exits],
+                             'SIDE': side.astype(np.int8),
+                             'ENTRY_PRICE': closes[entries],
+                             'EXIT_PRICE': closes[exits],
+                             'PATTERN': strongest.PATTERN.to_numpy()[entries],
+                             'RETURN': side * (closes[exits] / closes[entries] - 1) - 2 * self.commission},
+                            columns=TRADE_COLUMNS)
+
+
+def trade_metrics(trades: pd.DataFrame, start_capital: float) -> Dict[str, float]:
+    """
+    Summarizes the trades of a run, reinvesting the full balance in every trade.
+    :param trades: The trades as returned by PatternStrategy.trades
+    :param start_capital: The starting balance
+    :return: A dictionary with the number of trades, win rate, mean and total return, maximum drawdown and final balance
+    """
+    returns = trades.RETURN.to_numpy(dtype=np.float64)
+    equity = start_capital * np.cumprod(1 + returns)
+    peaks = np.maximum.accumulate(np.r_[start_capital, equity])
+    drawdowns = 1 - np.r_[start_capital, equity] / peaks
+    return {'trades': len(trades),
+            'win_rate': float((returns > 0).mean()) if len(returns) else 0.0,
+            'mean_return': float(returns.mean()) if len(returns) else 0.0,
+            'total_return': float(equity[-1] / start_capital - 1) if len(returns) else 0.0,
+            'max_drawdown': float(drawdowns.max()),
+            'final_balance': float(equity[-1]) if len(returns) else float(start_capital)}
@@ -2,11 +2,27 @@
 """
 
 """
+import copy
+import os
+from typing import NamedTuple, Optional
+
 import yaml
 from pandas import DataFrame
 from src.simulate.backtest import BTConfig, StartBT
 
 
+class BacktestJob(NamedTuple):
+    pair: str
+    time_frame: Optional[str] = None
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        parts = [self.pair, self.time_frame or 'bars', self.start_date, self.end_date]
+        return '_'.join(str(part).replace('/', '') for part in parts if part)
+
+
 def setup_parameters(config: str) -> BTConfig:
     """
     setups the corresponding class that holds variables for the back testing
@@ -28,3 +44,49 @@ def setup_parameters_inheritance(config: str, df: DataFrame) -> StartBT:
     """
     with open(config) as stream:
         return StartBT(yaml.safe_load(stream), df)
+
+
+def resample_bars(df: DataFrame, rule: str) -> DataFrame:
+    """
+    Aggregates bars to a coarser time frame. Periods without bars are dropped.
+    :param df: The data with DT, OPEN, HIGH, LOW, CLOSE and VOL columns
+    :param rule: A pandas offset alias, e.g. '15min', '1h' or '1D'
+    :return: The resampled bars with the same columns
+    """
+    bars = df.resample(rule, on='DT').agg({'OPEN': 'first', 'HIGH': 'max', 'LOW': 'min', 'CLOSE': 'last', 'VOL': 'sum'})
+    return bars.dropna(subset=['OPEN']).reset_index()[['DT', 'OPEN', 'HIGH', 'LOW', 'CLOSE', 'VOL']]
+
+
+def job_parameters(bt_params: dict, job: BacktestJob) -> dict:
+    """
+    Narrows the backtest configuration to the pair and date range of a job
+    :param bt_params: The backtest configuration, as loaded from the YAML file
+    :param job: The job
+    :return: A copy of the configuration with the pair, the dates and a log directory of the job
+    """
+    params = copy.deepcopy(bt_params)
+    # Every run archives the files in its log directory, so concurrent jobs must not share one
+    if params.get('log_path'):
+        params['log_path'] = os.path.join(params['log_path'], 'jobs', job.name)
+        os.makedirs(params['log_path'], exist_ok=True)
+    conf = params.setdefault('backtest', {})
+    conf['pairs'] = [job.pair]
+    conf['start_date'] = job.start_date or conf.get('start_date')
+    conf['end_date'] = job.end_date or conf.get('end_date')
+    return params
+
+
+def load_job_data(bt_params: dict, job: BacktestJob, database: str = '') -> DataFrame:
+    """
+    Loads the bars of a job from the storage backend configured by db_path, resampled to its time frame
+    :param bt_params: The backtest configuration of the job, see job_parameters
+    :param job: The job
+    :param database: The name of the database
+    :return: The bars
+    """
+    from src.db.db_utility import establish_connection
+
+    conf = bt_params['backtest']
+    data = establish_connection(bt_params.get('db_path'), database=database).get_bt_data(conf['start_date'],
+                                                                                          conf['end_date'], job.pair)
+    return resample_bars(data, job.time_frame) if job.time_frame else data
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Summarizes the import time of modules, based on python -X importtime.
+Every module is imported in a fresh interpreter, so nothing is cached from earlier imports.
+Usage: python -m src.utils.import_time main src.db.db_utility [--top 15]
+"""
+import argparse
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, NamedTuple
+
+
+class ImportRecord(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def measure(module: str, python: str = sys.executable) -> List[ImportRecord]:
+    """
+    Imports a module in a fresh interpreter with -X importtime.
+    :param module: The dotted module path.
+    :param python: The interpreter to use.
+    :return: One ImportRecord per imported module, in the order of the report.
+    """
+    completed = subprocess.run([python, '-X', 'importtime', '-c', f'import {module}'], capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr.splitlines()[-1]}")
+    records = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # The nesting of an import is given by two spaces per level in front of its name
+        depth = (len(name) - len(name.lstrip())) // 2
+        records.append(ImportRecord(name.strip(), int(self_us), int(cumulative_us), depth))
+    return records
+
+
+def by_package(records: List[ImportRecord]) -> Dict[str, int]:
+    """
+    Sums the self time of the records per top-level package.
+    :param records: The records of one measurement.
+    :return: A dictionary from package to self time in us, slowest first.
+    """
+    totals = defaultdict(int)
+    for record in records:
+        totals[record.module.split('.')[0]] += record.self_us
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def summarize(module: str, records: List[ImportRecord], top: int = 15) -> None:
+    """
+    Prints the total import time, the slowest packages and the slowest modules by cumulative time.
+    :param module: The measured module.
+    :param records: The records of the measurement.
+    :param top: The number of entries per list.
+    :return: None.
+    """
+    # Top-level imports are the ones of depth 1, their cumulative times add up to the total
+    total = sum(record.cumulative_us for record in records if record.depth == 1)
+    print(f"import {module}: {total / 1000:.1f} ms, {len(records)} modules")
+    print("  slowest packages (self time):")
+    for package, self_us in list(by_package(records).items())[:top]:
+        print(f"    {package:<40} {self_us / 1000:8.1f} ms")
+    print("  slowest imports (cumulative time):")
+    for record in sorted(records, key=lambda r: r.cumulative_us, reverse=True)[:top]:
+        print(f"    {record.module:<40} {record.cumulative_us / 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Summarizes python -X importtime per module.")
+    parser.add_argument('modules', nargs='+', help="The dotted module paths to import.")
+    parser.add_argument('--top', type=int, default=15, help="The number of entries per list.")
+    args = parser.parse_args()
+    for name in args.modules:
+        summarize(name, measure(name), args.top)
@@ -84,7 +84,8 @@ def rename_and_move_file(log_path: str, files: List[str]) -> None:
     now = datetime.now()
     dt_string = now.strftime("%d-%m-%Y-%H:%M")
     folder = os.path.join(log_path, "archive/run_" + dt_string)
-    os.makedirs(os.path.join(log_path, folder))
+    # Runs that end within the same minute share the archive folder
+    os.makedirs(folder, exist_ok=True)
     for file in files:
         os.rename(os.path.join(log_path, file), os.path.join(folder, file))
 
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+"""
+This module implements memory accounting for back testing runs.
+Snapshots are taken with 'tracemalloc' at stage boundaries, and the size of the
+main structures (DataFrame, Point lists, pattern lists and hover strings) is
+reported in total and per bar. An optional peak-RSS budget aborts the run with a
+diagnostic before the machine starts swapping.
+"""
+
+import resource
+import sys
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+
+class MemoryBudgetExceeded(MemoryError):
+    """
+    Raised when the peak resident set size of the process exceeds the configured budget.
+    """
+
+
+def peak_rss_bytes() -> int:
+    """
+    Returns the peak resident set size of the current process.
+    ru_maxrss is reported in kilobytes on Linux and in bytes on macOS.
+    :return: The peak RSS in bytes.
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+
+def sizeof_structure(obj: Any) -> int:
+    """
+    Approximates the deep size of the structures we keep around during a backtest.
+    DataFrames and Series are measured by pandas, lists are measured by their container plus
+    every unique element. Point objects are measured including their attribute values.
+    :param obj: The structure to measure.
+    :return: The approximate size in bytes.
+    """
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=True, deep=True))
+    if isinstance(obj, (list, tuple)):
+        seen = set()
+        total = sys.getsizeof(obj)
+        for element in obj:
+            if id(element) in seen:
+                continue
+            seen.add(id(element))
+            total += sys.getsizeof(element)
+            if hasattr(element, '__dict__'):
+                total += sys.getsizeof(element.__dict__)
+                total += sum(sys.getsizeof(v) for v in element.__dict__.values())
+        return total
+    return sys.getsizeof(obj)
+
+
+class MemoryTracker(object):
+    """
+    Collects memory checkpoints over the stages of a run.
+    The tracker is configured from the 'memory' section of the backtest configuration:
+        memory:
+          report: True        # take tracemalloc snapshots and print a report
+          top_n: 10           # number of allocation sites to report per checkpoint
+          budget_mb: 8192     # abort when the peak RSS exceeds this amount
+          check_every: 10000  # bars between budget checks inside the backtest loop
+    """
+
+    def __init__(self, enabled: bool = False, budget_mb: Optional[float] = None, top_n: int = 10,
+                 check_every: int = 10000) -> None:
+        self.enabled = enabled
+        self.budget = int(budget_mb * 1024 ** 2) if budget_mb else None
+        self.top_n = top_n
+        self.check_every = check_every
+        self.checkpoints: List[Dict[str, Any]] = []
+
+    @classmethod
+    def from_config(cls, conf: Optional[dict]) -> 'MemoryTracker':
+        """
+        Creates a tracker from the 'memory' section of the configuration.
+        :param conf: The memory section, or None if memory accounting is not configured.
+        :return: A MemoryTracker. It is disabled and without budget if no section is given.
+        """
+        conf = conf or {}
+        return cls(enabled=bool(conf.get('report', False)),
+                   budget_mb=conf.get('budget_mb'),
+                   top_n=conf.get('top_n', 10),
+                   check_every=conf.get('check_every', 10000))
+
+    def start(self) -> None:
+        """
+        Starts tracing allocations if the report is enabled.
+        :return: None.
+        """
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def check_budget(self, stage: str) -> None:
+        """
+        Compares the peak RSS against the budget and aborts if it is exceeded.
+        :param stage: The stage the check is made from, used in the diagnostic.
+        :return: None.
+        """
+        if self.budget is None:
+            return
+        peak = peak_rss_bytes()
+        if peak > self.budget:
+            raise MemoryBudgetExceeded(f"Peak RSS of {peak / 1024 ** 2:.1f} MB exceeds the budget of "
+                                       f"{self.budget / 1024 ** 2:.1f} MB at stage '{stage}'.\n" + self.report())
+
+    def checkpoint(self, stage: str, bars: int, **structures: Any) -> None:
+        """
+        Records a checkpoint at a stage boundary.
+        :param stage: The name of the stage.
+        :param bars: The number of bars processed at this stage, used for the per-bar sizes.
+        :param structures: The named structures to measure, e.g. data=df or hover_text=texts.
+        :return: None.
+        """
+        if self.enabled:
+            sizes = {name: sizeof_structure(obj) for name, obj in structures.items()}
+            sites = []
+            if tracemalloc.is_tracing():
+                stats = tracemalloc.take_snapshot().statistics('lineno')
+                sites = [(str(stat.traceback), stat.size, stat.count) for stat in stats[:self.top_n]]
+            self.checkpoints.append({'stage': stage,
+                                     'bars': bars,
+                                     'peak_rss': peak_rss_bytes(),
+                                     'traced': tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else None,
+                                     'sizes': sizes,
+                                     'sites': sites})
+        self.check_budget(stage)
+
+    def report(self) -> str:
+        """
+        Formats the recorded checkpoints.
+        :return: The report as a string.
+        """
+        lines = []
+        for cp in self.checkpoints:
+            lines.append(f"[{cp['stage']}] bars: {cp['bars']}, peak RSS: {cp['peak_rss'] / 1024 ** 2:.1f} MB")
+            if cp['traced'] is not None:
+                current, peak = cp['traced']
+                lines.append(f"  traced: {current / 1024 ** 2:.1f} MB (peak {peak / 1024 ** 2:.1f} MB)")
+            for name, size in cp['sizes'].items():
+                per_bar = size / cp['bars'] if cp['bars'] else 0.0
+                lines.append(f"  {name}: {size / 1024 ** 2:.2f} MB ({per_bar:.1f} bytes/bar)")
+            for site, size, count in cp['sites']:
+                lines.append(f"    {site}: {size / 1024:.1f} KB in {count} blocks")
+        return '\n'.join(lines)
+
+    def print_report(self) -> None:
+        """
+        Prints the report if memory accounting is enabled.
+        :return: None.
+        """
+        if self.enabled:
+            print(self.report())
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+
+from src.patterns.pattern import Pattern
+
+
+def make_bars(n: int, start: str = '2022-01-01', seed: int = 0) -> pd.DataFrame:
+    """
+    Builds a random walk of one-minute bars.
+    """
+    rng = np.random.default_rng(seed)
+    close = 1.1 + np.cumsum(rng.normal(0, 0.0002, n))
+    open_ = np.r_[close[0], close[:-1]]
+    spread = np.abs(rng.normal(0, 0.0002, n))
+    return pd.DataFrame({'DT': pd.date_range(start, periods=n, freq='min'),
+                         'OPEN': open_,
+                         'HIGH': np.maximum(open_, close) + spread,
+                         'LOW': np.minimum(open_, close) - spread,
+                         'CLOSE': close,
+                         'VOL': np.ones(n)})
+
+
+@pytest.fixture
+def bt_params(tmp_path) -> dict:
+    log_config = tmp_path / 'logging.yaml'
+    log_config.write_text(yaml.safe_dump({'version': 1, 'disable_existing_loggers': False}))
+    (tmp_path / 'logs').mkdir()
+    return {'log_config_path': str(log_config),
+            'log_path': str(tmp_path / 'logs'),
+            'memory': {'report': False},
+            'backtest': {'start_date': '20220101', 'end_date': '20220102', 'pairs': ['EURUSD'],
+                         'currency': 'USD', 'start_capital': 1000, 'commission': 0.001, 'time_frame': 'M'}}
+
+
+@pytest.fixture(autouse=True)
+def reset_patterns():
+    # The detections are kept on the Pattern class, so every test starts without them
+    Pattern.reset()
+    yield
+    Pattern.reset()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+import asyncio
+import time
+from collections import Counter
+
+import pandas as pd
+from aiohttp import web
+
+from src.db.io_duckdb import DUCKDB
+from src.fetch_data.async_fetcher import AsyncFetcher, Symbol, TokenBucket
+
+
+def payload(start: str, n: int) -> dict:
+    times = pd.date_range(start, periods=n, freq='min')
+    return {'Time Series FX (1min)': {f"{ts:%Y-%m-%d %H:%M:%S}": {'1. open': '1.1', '2. high': '1.2', '3. low': '1.0',
+                                                                   '4. close': '1.1'} for ts in times}}
+
+
+async def serve(handler) -> (web.AppRunner, str):
+    app = web.Application()
+    app.router.add_get('/query', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f'http://{host}:{port}/query'
+
+
+def test_token_bucket_limits_the_rate():
+    async def take(n: int) -> float:
+        bucket = TokenBucket(rate=20, capacity=2)
+        start = time.monotonic()
+        await asyncio.gather(*(bucket.acquire() for _ in range(n)))
+        return time.monotonic() - start
+
+    assert asyncio.run(take(2)) < 0.05
+    # The burst is free, the remaining 4 tokens are refilled at 20 per second
+    assert asyncio.run(take(6)) >= 0.19
+
+
+def test_refresh_retries_and_upserts_the_new_bars(tmp_path):
+    db = DUCKDB({'dbinfo': {'backend': 'duckdb', 'db_dir': str(tmp_path)}}, initial_database='fx')
+    requests = Counter()
+
+    async def handler(request: web.Request) -> web.Response:
+        symbol = request.query['from_symbol']
+        requests[symbol] += 1
+        if symbol == 'EUR' and requests[symbol] == 1:
+            return web.json_response({}, status=429)
+        if symbol == 'XXX':
+            return web.json_response({'Error Message': 'Invalid API call'})
+        return web.json_response(payload('2022-01-01 00:00', 30 * requests[symbol]))
+
+    async def refresh(symbols) -> AsyncFetcher:
+        runner, url = await serve(handler)
+        fetcher = AsyncFetcher('key', base_url=url, rate=100, burst=10, backoff=0.01)
+        try:
+            await fetcher.run(symbols, lambda symbol, bars: db.upsert_bars(bars, symbol.table), backend=db)
+        finally:
+            await runner.cleanup()
+        return fetcher
+
+    fetcher = asyncio.run(refresh([Symbol('fx', 'EUR', 'USD'), Symbol('fx', 'XXX', 'USD')]))
+    assert requests == {'EUR': 2, 'XXX': 1}
+    assert {symbol.table: error for symbol, error in fetcher.failed.items()} == {'XXXUSD': 'Invalid API call'}
+    # The latencies cover the answered requests, not the rate limited one
+    assert fetcher.report()['requests'] == 2
+    assert len(db.get_bt_data('20220101', '20220102', 'EURUSD')) == 60
+
+    # The second refresh upserts the bars after the last stored DT
+    asyncio.run(refresh([Symbol('fx', 'EUR', 'USD')]))
+    df = db.get_bt_data('20220101', '20220102', 'EURUSD')
+    assert len(df) == 90 and df.DT.is_unique
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+import pandas as pd
+
+from src.patterns.pattern import Pattern
+from src.simulate.backtest import StartBT
+from src.simulate.snapshot import SNAPSHOT_WINDOW
+
+from conftest import make_bars
+
+
+def run(bt_params: dict, df: pd.DataFrame):
+    Pattern.reset()
+    backtest = StartBT(bt_params, df)
+    backtest.execute()
+    return backtest.results
+
+
+def test_execute_chunks_matches_execute(bt_params):
+    df = make_bars(1500)
+    expected = run(bt_params, df)
+
+    Pattern.reset()
+    emitted, sizes = [], []
+
+    def sink(bars, results):
+        emitted.append((bars, results))
+        sizes.append(len(Pattern.single_patterns))
+
+    backtest = StartBT(bt_params)
+    backtest.execute_chunks((df.iloc[i:i + 200] for i in range(0, len(df), 200)), sink)
+
+    bars = pd.concat([b for b, _ in emitted], ignore_index=True)
+    patterns = pd.concat([r.patterns for _, r in emitted], ignore_index=True)
+    pd.testing.assert_series_equal(bars.DT, df.DT)
+    pd.testing.assert_frame_equal(patterns, expected.patterns.reset_index(drop=True))
+    assert backtest.metadata['days'] == df.DT.dt.normalize().nunique()
+    # The Pattern lists hold at most the tail and one chunk, whatever the date range
+    assert max(sizes) <= SNAPSHOT_WINDOW + 200 * 4
+    assert len(Pattern.single_patterns) == SNAPSHOT_WINDOW
+
+
+def test_execute_resumable_matches_execute(bt_params, tmp_path):
+    df = make_bars(900)
+    expected = run(bt_params, df)
+
+    Pattern.reset()
+    first = StartBT(bt_params, df.iloc[:600])
+    first.execute_resumable(str(tmp_path / 'snapshot'))
+    Pattern.reset()
+    resumed = StartBT(bt_params, df)
+    resumed.execute_resumable(str(tmp_path / 'snapshot'))
+
+    assert resumed.bars_processed == len(df)
+    pd.testing.assert_frame_equal(resumed.results.patterns.reset_index(drop=True),
+                                  expected.patterns.reset_index(drop=True))
+    pd.testing.assert_frame_equal(resumed.results.trendlines, expected.trendlines)
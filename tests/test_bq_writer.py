@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+import json
+import threading
+import time
+
+import pandas as pd
+
+from src.db.bq_writer import BufferedBQWriter
+
+
+class FakeClient(object):
+    """
+    Records the batches of insert_rows_json and rejects the rows with an id in reject, as BigQuery
+    reports row errors by index.
+    """
+
+    def __init__(self, reject=()) -> None:
+        self.reject = set(reject)
+        self.batches = []
+        self.columns = set()
+        self.lock = threading.Lock()
+
+    def insert_rows_json(self, table_uri, rows):
+        with self.lock:
+            self.batches.append([row['id'] for row in rows])
+            self.columns.update(*rows)
+        return [{'index': i, 'errors': ['invalid']} for i, row in enumerate(rows) if row['id'] in self.reject]
+
+
+def frame(n: int, width: int = 60) -> pd.DataFrame:
+    return pd.DataFrame({'id': range(n), 'text': ['x' * width] * n})
+
+
+def test_splits_on_max_rows():
+    client = FakeClient()
+    with BufferedBQWriter(client, 'project.fx.events', max_rows=10, flush_interval=60) as writer:
+        writer.add_dataframe(frame(25))
+    assert [len(batch) for batch in client.batches] == [10, 10, 5]
+    assert sum(client.batches, []) == list(range(25))
+    assert writer.stats()['rows'] == 25 and writer.stats()['failed_rows'] == 0
+
+
+def test_splits_on_max_bytes():
+    row_size = len(json.dumps({'id': 0, 'text': 'x' * 60}))
+    client = FakeClient()
+    with BufferedBQWriter(client, 'project.fx.events', max_rows=100, max_bytes=3 * row_size + 5,
+                          flush_interval=60) as writer:
+        writer.add_dataframe(frame(8))
+    assert [len(batch) for batch in client.batches] == [3, 3, 2]
+
+    # A single row above max_bytes is sent alone
+    client = FakeClient()
+    with BufferedBQWriter(client, 'project.fx.events', max_bytes=10, flush_interval=60) as writer:
+        writer.add_dataframe(frame(2))
+    assert client.batches == [[0], [1]]
+
+
+def test_schema_columns_and_interval_flush():
+    client = FakeClient()
+    writer = BufferedBQWriter(client, 'project.fx.events', schema_names=['id'], flush_interval=0.05)
+    writer.add_row({'id': 0})
+    writer.add_dataframe(frame(2).assign(id=[1, 2]))
+    # Flushed by the background thread without reaching a threshold
+    deadline = time.monotonic() + 5
+    while sum(map(len, client.batches)) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sum(client.batches, []) == [0, 1, 2] and client.columns == {'id'}
+    writer.close()
+
+
+def test_retries_rejected_rows():
+    class FlakyClient(FakeClient):
+        def insert_rows_json(self, table_uri, rows):
+            errors = super().insert_rows_json(table_uri, rows)
+            # Row 3 is accepted on the second attempt
+            self.reject.discard(3)
+            return errors
+
+    client = FlakyClient(reject={3})
+    with BufferedBQWriter(client, 'project.fx.events', flush_interval=60, backoff=0) as writer:
+        writer.add_dataframe(frame(5))
+    assert client.batches == [[0, 1, 2, 3, 4], [3]]
+    assert writer.failed_rows == []
+
+    client = FakeClient(reject={1})
+    with BufferedBQWriter(client, 'project.fx.events', flush_interval=60, max_retries=2, backoff=0) as writer:
+        writer.add_dataframe(frame(3))
+    assert client.batches == [[0, 1, 2], [1], [1]]
+    assert [row['id'] for row in writer.failed_rows] == [1]
+    assert writer.stats()['failed_rows'] == 1
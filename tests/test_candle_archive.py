@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+import numpy as np
+import pandas as pd
+
+from src.db.candle_archive import CandleArchive, write_archive
+
+from conftest import make_bars
+
+
+def test_range_matches_a_frame_filter(tmp_path):
+    df = make_bars(1000)
+    write_archive(df.sample(frac=1, random_state=0), tmp_path)
+    archive = CandleArchive(tmp_path)
+    assert len(archive) == 1000 and isinstance(archive.columns['CLOSE'], np.memmap)
+
+    start, end = df.DT.iloc[100], df.DT.iloc[349]
+    # The columns are stored in the order of get_bt_data
+    expected = df[(df.DT >= start) & (df.DT <= end)].reset_index(drop=True)[list(archive.columns)]
+    pd.testing.assert_frame_equal(archive.to_frame(start, end), expected, check_dtype=False)
+    # Bounds between bars select the bars inside
+    assert archive.bounds(start - pd.Timedelta(seconds=30), end + pd.Timedelta(seconds=30)) == (100, 350)
+    assert archive.bounds(df.DT.iloc[-1] + pd.Timedelta(days=1)) == (1000, 1000)
+
+    chunks = list(archive.iter_chunks(start, end, chunk_size=100))
+    assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), expected, check_dtype=False)
+
+
+def test_float32_and_empty_archives(tmp_path):
+    df = make_bars(10)
+    write_archive(df, tmp_path / 'f32', float_dtype='float32')
+    archive = CandleArchive(tmp_path / 'f32')
+    assert archive.columns['OPEN'].dtype == np.float32
+    np.testing.assert_allclose(archive.to_frame().CLOSE, df.CLOSE, rtol=1e-6)
+
+    write_archive(df.iloc[:0], tmp_path / 'empty')
+    empty = CandleArchive(tmp_path / 'empty')
+    assert len(empty) == 0 and empty.to_frame().empty and list(empty.iter_chunks()) == []
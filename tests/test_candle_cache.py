@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from src.db.candle_cache import CandleCache, merge_intervals, missing_intervals, month_partitions
+
+from conftest import make_bars
+
+
+def dt(day: int, hour: int = 0) -> datetime:
+    return datetime(2022, 1, day, hour)
+
+
+def test_missing_intervals():
+    assert missing_intervals(dt(1), dt(10), []) == [(dt(1), dt(10))]
+    assert missing_intervals(dt(1), dt(10), [(dt(1), dt(10))]) == []
+    assert missing_intervals(dt(2), dt(5), [(dt(1), dt(10))]) == []
+    assert missing_intervals(dt(1), dt(10), [(dt(3), dt(4)), (dt(6), dt(7))]) == \
+        [(dt(1), dt(3)), (dt(4), dt(6)), (dt(7), dt(10))]
+    # Intervals outside the range are ignored
+    assert missing_intervals(dt(5), dt(6), [(dt(1), dt(2)), (dt(8), dt(9))]) == [(dt(5), dt(6))]
+    assert missing_intervals(dt(1), dt(10), [(dt(1), dt(5))]) == [(dt(5), dt(10))]
+
+
+def test_merge_intervals_and_month_partitions():
+    assert merge_intervals([(dt(5), dt(6)), (dt(1), dt(3)), (dt(3), dt(4))]) == [(dt(1), dt(4)), (dt(5), dt(6))]
+    parts = list(month_partitions(datetime(2021, 12, 30), datetime(2022, 2, 2)))
+    assert [(year, month) for year, month, _, _ in parts] == [(2021, 12), (2022, 1), (2022, 2)]
+    assert parts[1][2:] == (datetime(2022, 1, 1), datetime(2022, 2, 1) - timedelta(microseconds=1))
+
+
+def test_get_fetches_only_the_missing_ranges(tmp_path):
+    bars = make_bars(3 * 24 * 60)
+    fetched = []
+
+    def fetch(pair, start, end):
+        fetched.append((start, end))
+        return bars[(bars.DT >= start) & (bars.DT <= end)]
+
+    cache = CandleCache(str(tmp_path))
+    first = cache.get('EURUSD', dt(1), dt(2), fetch)
+    second = cache.get('EURUSD', dt(1, 12), dt(3), fetch)
+
+    assert fetched == [(dt(1), dt(2)), (dt(2), dt(3))]
+    pd.testing.assert_frame_equal(first, bars[bars.DT <= dt(2)].reset_index(drop=True))
+    pd.testing.assert_frame_equal(second, bars[(bars.DT >= dt(1, 12)) & (bars.DT <= dt(3))].reset_index(drop=True))
+    assert cache.get('EURUSD', dt(1), dt(3), fetch).DT.is_unique
+    assert len(fetched) == 2 and cache.stats()['hits'] == 1
+
+
+def test_recent_rows_stay_uncovered(tmp_path):
+    now = datetime.now().replace(second=0, microsecond=0)
+    fetched = []
+
+    def fetch(pair, start, end):
+        fetched.append((start, end))
+        return pd.DataFrame({'DT': pd.date_range(start, end, freq='min')})
+
+    cache = CandleCache(str(tmp_path), lag=timedelta(hours=1))
+    cache.get('EURUSD', now - timedelta(minutes=30), now, fetch)
+    first = list(fetched)
+    cache.get('EURUSD', now - timedelta(minutes=30), now, fetch)
+    assert fetched[len(first):] == first
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+import json
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from src.frontend.chart_server import ChartServer
+from src.patterns.pattern import Pattern
+from src.simulate.backtest import StartBT
+
+from conftest import make_bars
+
+
+@pytest.fixture
+def server(bt_params, tmp_path):
+    df = make_bars(3000)
+    StartBT(bt_params, df).execute()
+    server = ChartServer.from_backtest(df, Pattern, cache_dir=tmp_path / 'charts', port=0)
+    server.start()
+    yield df, server
+    server.shutdown()
+
+
+def get(server: ChartServer, path: str) -> bytes:
+    with urllib.request.urlopen(server.url.rstrip('/') + path) as response:
+        return response.read()
+
+
+def test_range_serves_the_fitting_level(server):
+    df, server = server
+    assert b'/range' in get(server, '/')
+
+    window = json.loads(get(server, '/range?target=1000'))
+    assert window['bars_per_candle'] == 4 and len(window['candles']['DT']) == 750
+    assert len(window['patterns']['DT']) > 0
+
+    window = json.loads(get(server, '/range?start=2022-01-01%2010:00&end=2022-01-01%2012:00&target=500'))
+    assert window['bars_per_candle'] == 1 and len(window['candles']['DT']) == 121
+    assert window['candles']['DT'][0].startswith('2022-01-01 10:00')
+
+    with pytest.raises(urllib.error.HTTPError) as error:
+        get(server, '/range?start=garbage')
+    assert error.value.code == 400
+    assert '/range' in json.loads(get(server, '/stats'))
+    # A latency is recorded after its response is sent
+    deadline = time.monotonic() + 5
+    while server.stats()['/range']['requests'] < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert server.stats()['/range']['requests'] == 3
+
+
+def test_reuses_the_cached_pyramid(server, tmp_path):
+    df, server = server
+    Pattern.reset()
+    # The pyramid is loaded from the cache, so the detections of the backtest are kept
+    cached = ChartServer.from_backtest(df, Pattern, cache_dir=tmp_path / 'charts', port=0)
+    try:
+        assert [len(level) for level in cached.pyramid.levels] == [len(level) for level in server.pyramid.levels]
+        assert (cached.pyramid.levels[0].LEVEL > 0).any()
+    finally:
+        cached.httpd.server_close()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+
+from src.cli import main, run_backtest_job
+from src.db.io_duckdb import DUCKDB
+from src.utils.backtest_utils import BacktestJob
+
+from conftest import make_bars
+
+
+@pytest.fixture
+def duckdb_params(tmp_path, bt_params) -> dict:
+    db = DUCKDB({'dbinfo': {'backend': 'duckdb', 'db_dir': str(tmp_path)}}, initial_database='fx')
+    db.pd_insert_data(make_bars(4000).assign(BUY=np.nan, SELL=np.nan), 'EURUSD')
+    db.close()
+    db_path = tmp_path / 'duckdb.yaml'
+    # Every pool worker opens the database file, which DuckDB only allows read-only
+    db_path.write_text(yaml.safe_dump({'dbinfo': {'backend': 'duckdb', 'db_dir': str(tmp_path), 'read_only': True}}))
+    bt_params['db_path'] = str(db_path)
+    bt_params['backtest'].update(start_date='20220101', end_date='20220104')
+    return bt_params
+
+
+def test_backtest_jobs_back_to_back(tmp_path, duckdb_params):
+    # Both jobs end within the same minute, so they archive their logs at the same time
+    first = run_backtest_job(duckdb_params, BacktestJob('EURUSD'), str(tmp_path / 'out'), database='fx')
+    second = run_backtest_job(duckdb_params, BacktestJob('EURUSD', '5min'), str(tmp_path / 'out'), database='fx')
+
+    assert first['error'] == '' and second['error'] == ''
+    assert first['bars'] == 4000 and second['bars'] == 800
+    bars = pd.read_parquet(tmp_path / 'out' / 'EURUSD_5min' / 'bars.parquet')
+    assert len(bars) == 800 and (bars.DT.diff().dropna() == pd.Timedelta(minutes=5)).all()
+    assert (tmp_path / 'out' / 'EURUSD_5min' / 'trades.parquet').exists()
+
+
+def test_backtest_command_writes_metrics(tmp_path, duckdb_params):
+    config = tmp_path / 'backtest.yaml'
+    config.write_text(yaml.safe_dump(duckdb_params))
+
+    main(['backtest', '--config', str(config), '--time-frames', '5min', '15min', '--database', 'fx',
+          '--processes', '2', '--out', str(tmp_path / 'results')])
+
+    metrics = pd.read_parquet(tmp_path / 'results' / 'metrics.parquet')
+    assert metrics.job.tolist() == ['EURUSD_15min', 'EURUSD_5min']
+    assert metrics.bars.tolist() == [267, 800]
+    assert {'pair', 'time_frame', 'start_date', 'end_date', 'trades', 'win_rate', 'total_return', 'max_drawdown',
+            'final_balance', 'error', 'seconds'} <= set(metrics.columns)
+    assert (metrics.error == '').all()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+import sqlite3
+
+import pandas as pd
+import pytest
+
+mariadb = pytest.importorskip('mariadb')
+
+from src.db import connection_pool  # noqa: E402
+from src.db.io_mariadb import MARIADB  # noqa: E402
+
+
+class FakeConnection(object):
+    """
+    Wraps the shared sqlite3 database of a FakePool with the ping of a mariadb connection.
+    """
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def ping(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class FakePool(object):
+
+    def __init__(self, pool_name: str, pool_size: int, **_) -> None:
+        self.pool_size = pool_size
+        self.database = sqlite3.connect(':memory:', check_same_thread=False)
+
+    def get_connection(self) -> FakeConnection:
+        return FakeConnection(self.database)
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def db_info(monkeypatch):
+    monkeypatch.setattr(connection_pool.mariadb, 'ConnectionPool', FakePool)
+    yield {'dbinfo': {'dbUID': 'user', 'dbaddr': 'localhost', 'port': 3306, 'dbpwd': '', 'pool_size': 2,
+                      'pool_timeout': 0.1}}
+    connection_pool.close_pools()
+
+
+def test_more_instances_than_connections(db_info):
+    instances = [MARIADB(db_info, initial_database='fx') for _ in range(5)]
+    assert instances[0].run_simple_query('CREATE TABLE T (A TEXT)')
+    for i, db in enumerate(instances):
+        db.insert_data('INSERT INTO T VALUES (?)', pd.DataFrame({'A': [i]}), ['A'])
+    with instances[-1].connection() as connection:
+        assert connection.execute('SELECT COUNT(*) FROM T').fetchone()[0] == 5
+    assert instances[0].pool_stats()['in_use'] == 0
+
+
+def test_checkout_beyond_the_bound_times_out(db_info):
+    pool = MARIADB(db_info, initial_database='fx')._get_pool()
+    with pool.connection(), pool.connection():
+        with pytest.raises(connection_pool.PoolTimeout):
+            pool.get_connection()
+    assert pool.stats()['waits'] == 1 and pool.stats()['in_use'] == 0
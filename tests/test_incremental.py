@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+import numpy as np
+import pandas as pd
+
+from src.db.io_duckdb import DUCKDB
+from src.fetch_data.async_fetcher import parse_bars
+from src.fetch_data.incremental import bars_since, choose_outputsize
+
+
+def payload(start: str, n: int) -> dict:
+    times = pd.date_range(start, periods=n, freq='min')
+    return {'Meta Data': {},
+            'Time Series FX (1min)': {f"{ts:%Y-%m-%d %H:%M:%S}": {'1. open': '1.1', '2. high': '1.2', '3. low': '1.0',
+                                                                   '4. close': f"{1.1 + i / 1000}"}
+                                      for i, ts in enumerate(times)}}
+
+
+def test_fetched_bars_can_be_backtested(tmp_path):
+    db = DUCKDB({'dbinfo': {'backend': 'duckdb', 'db_dir': str(tmp_path)}}, initial_database='fx')
+    assert db.upsert_bars(parse_bars(payload('2022-01-01 00:00', 60)), 'EURUSD') == 60
+
+    # The refresh overlaps the stored bars from the last stored DT onwards
+    last_dt = db.get_last_timestamp('EURUSD')
+    delta = bars_since(parse_bars(payload('2022-01-01 00:30', 60)), last_dt)
+    db.upsert_bars(delta, 'EURUSD')
+
+    df = db.get_bt_data('20220101', '20220102', 'EURUSD')
+    assert len(df) == 90 and df.DT.is_unique and df.DT.is_monotonic_increasing
+    assert df.BUY.isna().all() and df.SELL.isna().all()
+    assert np.isclose(df.CLOSE.iloc[-1], 1.1 + 59 / 1000)
+
+
+def test_choose_outputsize():
+    now = pd.Timestamp('2022-01-01 12:00')
+    assert choose_outputsize(None, '1min', now=now) == 'full'
+    assert choose_outputsize(now - pd.Timedelta(minutes=30), '1min', now=now) == 'compact'
+    assert choose_outputsize(now - pd.Timedelta(hours=3), '1min', now=now) == 'full'
+    assert choose_outputsize(now - pd.Timedelta(hours=3), '5min', now=now) == 'compact'
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+import numpy as np
+import pandas as pd
+
+from src.frontend.lod import LODPyramid, strongest_patterns
+from src.frontend.pattern_arrays import pattern_frame
+from src.patterns.pattern import Pattern
+from src.simulate.backtest import StartBT
+
+from conftest import make_bars
+
+
+def direct(df: pd.DataFrame, bars: int) -> pd.DataFrame:
+    """
+    Aggregates every block of bars directly from the level 0 data.
+    """
+    strongest = strongest_patterns(pattern_frame(df, Pattern))
+    data = df.reset_index(drop=True).assign(LEVEL=strongest.LEVEL.to_numpy(), PATTERN=strongest.PATTERN.to_numpy())
+    groups = data.groupby(np.arange(len(data)) // bars)
+    # The strongest pattern of a block, the earliest on ties
+    winner = data.loc[groups.LEVEL.idxmax()]
+    return pd.DataFrame({'DT': groups.DT.first(),
+                         'OPEN': groups.OPEN.first(),
+                         'HIGH': groups.HIGH.max(),
+                         'LOW': groups.LOW.min(),
+                         'CLOSE': groups.CLOSE.last(),
+                         'VOL': groups.VOL.sum(),
+                         'BARS': groups.size(),
+                         'LEVEL': winner.LEVEL.to_numpy(),
+                         'PATTERN': winner.PATTERN.to_numpy(),
+                         'PATTERN_DT': winner.DT.to_numpy()}).reset_index(drop=True)
+
+
+def test_levels_match_a_direct_aggregation(bt_params):
+    df = make_bars(2100)
+    StartBT(bt_params, df).execute()
+    pyramid = LODPyramid.build(df, Pattern, factor=4, min_candles=100)
+
+    assert [len(level) for level in pyramid.levels] == [2100, 525, 132, 33]
+    assert (pyramid.levels[0].LEVEL > 0).any()
+    for k, level in enumerate(pyramid.levels[1:], 1):
+        pd.testing.assert_frame_equal(level, direct(df, 4 ** k), check_dtype=False)
+
+
+def test_window_picks_the_finest_fitting_level(bt_params, tmp_path):
+    df = make_bars(2100)
+    StartBT(bt_params, df).execute()
+    pyramid = LODPyramid.build(df, Pattern, factor=4, min_candles=100)
+
+    assert len(pyramid.window(target_candles=3000)) == 2100
+    assert pyramid.window(target_candles=600).BARS.iloc[0] == 4
+    start, end = df.DT.iloc[1000], df.DT.iloc[1199]
+    window = pyramid.window(start, end, target_candles=200)
+    assert len(window) == 200 and window.DT.iloc[0] == start
+    # The candle covering the start of the window is included
+    assert pyramid.window(df.DT.iloc[1002], end, target_candles=60).DT.iloc[0] == df.DT.iloc[1000]
+
+    pyramid.to_parquet(tmp_path / 'lod')
+    loaded = LODPyramid.from_parquet(tmp_path / 'lod')
+    for level, stored in zip(pyramid.levels, loaded.levels):
+        pd.testing.assert_frame_equal(level, stored)
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+import pytest
+
+from main import plot_results
+from src.simulate.backtest import BTConfig, StartBT
+from src.utils.memory_utils import MemoryTracker
+
+from conftest import make_bars
+
+
+@pytest.mark.parametrize('compact_hover, target_candles', [(False, None), (True, None), (True, 100)])
+def test_plot_results_records_the_hover_structure(bt_params, compact_hover, target_candles):
+    bt_params.update(memory={'report': True}, compact_hover=compact_hover, target_candles=target_candles,
+                     overlays=True)
+    df = make_bars(300)
+    backtest = StartBT(bt_params, df)
+    backtest.execute()
+    memory = MemoryTracker.from_config(bt_params['memory'])
+
+    fig = plot_results(BTConfig(bt_params), df, backtest.results, memory)
+
+    assert fig.data[0].type == 'candlestick'
+    assert len(fig.data[0].x) == len(df) if target_candles is None else len(fig.data[0].x) <= len(df)
+    assert memory.checkpoints[-1]['stage'] == 'main:plot'
+    assert memory.checkpoints[-1]['sizes']['hover'] > 0
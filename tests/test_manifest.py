@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+import json
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.load_data.event_to_mariadb import load_data_parallel
+from src.load_data.manifest import FAILED, LOADED, IngestManifest
+
+
+class FakeBackend(object):
+    def __init__(self) -> None:
+        self.inserted = []
+
+    def prepare_concurrent_writes(self) -> None:
+        pass
+
+    def pd_insert_data(self, table_name, data) -> None:
+        self.inserted.append((table_name, len(data)))
+
+
+def write_dump(root, tables=('orders', 'payments'), days=('day=1', 'day=2'), files=2, rows=20):
+    for table in tables:
+        for day in days:
+            folder = root / f'table={table}' / day
+            folder.mkdir(parents=True)
+            for k in range(files):
+                pq.write_table(pa.table({'id': list(range(rows)),
+                                         'payload': [{'amount': i * 1.5, 'user': {'name': f'u{i}'}} for i in range(rows)]}),
+                               folder / f'part-{k}.snappy.parquet')
+
+
+def test_resume_after_a_partial_run(tmp_path):
+    write_dump(tmp_path)
+    broken = tmp_path / 'table=orders' / 'day=2' / 'part-1.snappy.parquet'
+    broken.write_bytes(b'not a parquet file')
+    path = tmp_path / '_manifest.jsonl'
+
+    backend = FakeBackend()
+    load_data_parallel(tmp_path, backend, workers=2, manifest=IngestManifest(path))
+    assert len(backend.inserted) == 7
+    manifest = IngestManifest(path)
+    assert manifest.files[str(broken)]['status'] == FAILED and not manifest.is_loaded(broken)
+    assert sum(entry['status'] == LOADED for entry in manifest.files.values()) == 7
+    # Only the folder with the failed file is listed again
+    assert not manifest.is_complete(broken.parent)
+    assert len(manifest.folders) == 3
+
+    pq.write_table(pa.table({'id': [1, 2, 3], 'payload': [{'amount': 1.0, 'user': {'name': 'u'}}] * 3}), broken)
+    backend = FakeBackend()
+    load_data_parallel(tmp_path, backend, workers=2, manifest=IngestManifest(path))
+    assert backend.inserted == [('orders', 3)]
+    manifest = IngestManifest(path)
+    assert manifest.is_loaded(broken) and manifest.is_complete(broken.parent)
+
+    backend = FakeBackend()
+    load_data_parallel(tmp_path, backend, workers=2, manifest=IngestManifest(path))
+    assert backend.inserted == []
+
+
+def test_changed_and_added_files_are_loaded_again(tmp_path):
+    write_dump(tmp_path, tables=('orders',), days=('day=1',))
+    path = tmp_path / '_manifest.jsonl'
+    load_data_parallel(tmp_path, FakeBackend(), workers=1, manifest=IngestManifest(path))
+
+    source = tmp_path / 'table=orders' / 'day=1' / 'part-0.snappy.parquet'
+    pq.write_table(pa.table({'id': [1], 'payload': [{'amount': 1.0, 'user': {'name': 'u'}}]}), source)
+    assert not IngestManifest(path).is_loaded(source)
+
+    # A new file changes the mtime of its folder, so the folder is listed again
+    added = source.parent / 'part-9.snappy.parquet'
+    pq.write_table(pa.table({'id': [1, 2], 'payload': [{'amount': 1.0, 'user': {'name': 'u'}}] * 2}), added)
+    backend = FakeBackend()
+    load_data_parallel(tmp_path, backend, workers=1, manifest=IngestManifest(path))
+    assert sorted(backend.inserted) == [('orders', 1), ('orders', 2)]
+
+
+def test_truncated_last_line_is_dropped(tmp_path):
+    source = tmp_path / 'part-0.snappy.parquet'
+    source.write_bytes(b'data')
+    path = tmp_path / '_manifest.jsonl'
+    IngestManifest(path).record(source, 10, LOADED, 0.1)
+    with open(path, 'a') as stream:
+        stream.write('{"path": "' + str(tmp_path / 'part-1'))
+
+    manifest = IngestManifest(path)
+    assert manifest.is_loaded(source) and len(manifest.files) == 1
+    # The next entry is appended after the last valid line
+    manifest.record(source, 10, LOADED, 0.1)
+    with open(path) as stream:
+        assert [json.loads(line)['path'] for line in stream] == [str(source)] * 2
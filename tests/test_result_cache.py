@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import os
+import time
+
+import pandas as pd
+
+from src.frontend.pattern_arrays import PatternResults
+from src.simulate.result_cache import ResultCache
+
+from conftest import make_bars
+
+
+def results(n: int) -> PatternResults:
+    return PatternResults(pd.DataFrame({'SINGLE_PATTERN': ['Doji'] * n}),
+                          pd.DataFrame({'KIND': ['uptrend'], 'SLOPE': [0.5]}))
+
+
+def test_hit_on_same_data_and_config(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    df = make_bars(100)
+    key = cache.pattern_key(df, {'window': 10})
+    assert cache.load_patterns(key) is None
+    cache.store_patterns(key, results(100))
+
+    assert cache.pattern_key(df.copy(), {'window': 10}) == key
+    assert cache.pattern_key(df, {'window': 11}) != key
+    assert cache.pattern_key(make_bars(100, seed=1), {'window': 10}) != key
+    pd.testing.assert_frame_equal(cache.load_patterns(key).patterns, results(100).patterns)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_evicts_the_least_recently_used_entry(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.store_patterns('a', results(100))
+    cache.store_patterns('b', results(100))
+    entry_size = cache.size() // 2
+    # Entries are ordered by modification time, which a hit refreshes
+    os.utime(tmp_path / 'patterns' / 'a', (time.time() - 60, time.time() - 60))
+    os.utime(tmp_path / 'patterns' / 'b', (time.time() - 30, time.time() - 30))
+    assert cache.load_patterns('a') is not None
+
+    cache.max_bytes = 2 * entry_size + entry_size // 2
+    cache.store_patterns('c', results(100))
+
+    assert cache.load_patterns('b') is None
+    assert cache.load_patterns('a') is not None and cache.load_patterns('c') is not None
+
+
+def test_entry_above_the_size_limit_is_not_stored(tmp_path, capsys):
+    cache = ResultCache(str(tmp_path), max_bytes=10)
+    cache.store_patterns('small', results(1))
+    assert cache.load_patterns('small') is None
+    assert "Not caching patterns entry small" in capsys.readouterr().out
+
+    cache.max_bytes = 10 ** 6
+    cache.store_patterns('large', results(10000))
+    assert cache.load_patterns('large') is not None
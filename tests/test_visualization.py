@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+import plotly.graph_objects as go
+
+from src.frontend.visualization import build_and_create_plot, show_plot
+from src.simulate.backtest import StartBT
+
+from conftest import make_bars
+
+
+def test_show_plot_reports_the_payload(bt_params, monkeypatch, capsys):
+    df = make_bars(200)
+    backtest = StartBT(bt_params, df)
+    backtest.execute()
+    shown = []
+    monkeypatch.setattr(go.Figure, 'show', lambda fig, **kwargs: shown.append(kwargs))
+
+    show_plot(build_and_create_plot(df=df, pattern=backtest.results, compact=True))
+
+    assert len(shown) == 1 and 'post_script' in shown[0]
+    assert "Rendered 200 candles: figure" in capsys.readouterr().out